@@ -13,15 +13,321 @@
 // creating an instance of the display driver
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, OLED_RESET);
 
+// Reads one entry of a PROGMEM table. The headers declare each table with the smallest
+// type that holds its values, so there is one overload per type.
+inline uint32_t readTable(const uint8_t *entry) { return pgm_read_byte(entry); }
+inline uint32_t readTable(const uint16_t *entry) { return pgm_read_word(entry); }
+inline uint32_t readTable(const uint32_t *entry) { return pgm_read_dword(entry); }
+
+#if !defined(GLYPH_COMPOSED)
+#if defined(GLYPH_SEGMENTS) && defined(pgm_get_far_address)
+// Large atlases are split into several glyph_bitmaps segments, which may lie above the
+// first 64 KB of flash (e.g. on a Mega 2560) where near pointers cannot reach: read glyph
+// bytes through 32-bit far addresses instead
+typedef uint_farptr_t glyph_address_t;
+#define readGlyphByte(address) pgm_read_byte_far(address)
+#define copyGlyph(dst, address, size) memcpy_PF(dst, address, size)
+#define segmentAddress(segment) pgm_get_far_address(segment)
+#else
+typedef const uint8_t *glyph_address_t;
+#define readGlyphByte(address) pgm_read_byte(address)
+#define copyGlyph(dst, address, size) memcpy_P(dst, address, size)
+#define segmentAddress(segment) (segment)
+#endif
+
+#if !defined(GLYPH_TILES)
+// Address of byte `offset` of the glyph bitmaps (offsets count as if the segments were
+// one array; each segment holds whole glyphs)
+glyph_address_t glyphAddress(uint32_t offset)
+{
+#if defined(GLYPH_SEGMENTS)
+  const glyph_address_t segments[GLYPH_SEGMENTS] = { GLYPH_SEGMENT_ARRAYS(segmentAddress) };
+  uint8_t segment = GLYPH_SEGMENTS - 1;
+  while (offset < readTable(&glyph_segment_starts[segment])) segment--;
+  return segments[segment] + (offset - readTable(&glyph_segment_starts[segment]));
+#else
+  return glyph_bitmaps + offset;
+#endif
+}
+#endif
+#endif
+
+#if defined(GLYPH_USES_RLE)
+// Decodes a row-delta + RLE glyph: control bytes below 128 are followed by control + 1
+// literal bytes, others by one byte repeated control - 126 times. Each row is then XORed
+// with the decoded row above it.
+void decodeRowDeltaRle(glyph_address_t src, uint8_t *dst, int bytes_per_row, int bytes_per_bitmap)
+{
+  int out = 0;
+  while (out < bytes_per_bitmap)
+  {
+    uint8_t control = readGlyphByte(src++);
+    if (control < 128)
+    {
+      for (uint8_t n = control + 1; n > 0; n--) dst[out++] = readGlyphByte(src++);
+    }
+    else
+    {
+      uint8_t value = readGlyphByte(src++);
+      for (uint8_t n = control - 126; n > 0; n--) dst[out++] = value;
+    }
+  }
+  for (int i = bytes_per_row; i < bytes_per_bitmap; i++) dst[i] ^= dst[i - bytes_per_row];
+}
+#endif
+
+#if defined(GLYPH_USES_LZ)
+// Decodes an LZ glyph: control bytes below 128 are followed by control + 1 literal bytes,
+// others by (distance - 1), and copy control - 125 bytes from `distance` bytes back.
+void decodeLz(glyph_address_t src, uint8_t *dst, int bytes_per_bitmap)
+{
+  int out = 0;
+  while (out < bytes_per_bitmap)
+  {
+    uint8_t control = readGlyphByte(src++);
+    if (control < 128)
+    {
+      for (uint8_t n = control + 1; n > 0; n--) dst[out++] = readGlyphByte(src++);
+    }
+    else
+    {
+      uint8_t distance = readGlyphByte(src++) + 1;
+      for (uint8_t n = control - 125; n > 0; n--, out++) dst[out] = dst[out - distance]; // byte by byte: matches may overlap
+    }
+  }
+}
+#endif
+
+#if defined(GLYPH_USES_DELTA)
+// Applies a sparse XOR delta to dst, which already holds the reference glyph: after a
+// count byte, each (skip, value) pair XORs `value` into the byte `skip` bytes past the
+// one after the previous pair
+void applyXorDelta(glyph_address_t src, uint8_t *dst)
+{
+  int out = 0;
+  for (uint8_t pairs = readGlyphByte(src++); pairs > 0; pairs--)
+  {
+    out += readGlyphByte(src++);
+    dst[out++] ^= readGlyphByte(src++);
+  }
+}
+#endif
+
+#if defined(GLYPH_BIT_PACKED)
+// Unpacks a bit-packed glyph (`rows` rows of `width` bits stored back to back, MSB first,
+// from bit `bit` of glyph_bitmaps) into byte-aligned rows for drawBitmap
+void unpackBitGlyph(uint32_t bit, uint8_t *dst, int width, int bytes_per_row, int rows)
+{
+  // Count bits from the glyph's first byte, so the segment is only looked up once
+  glyph_address_t base = glyphAddress(bit >> 3);
+  bit &= 7;
+  for (int row = 0; row < rows; row++)
+  {
+    uint8_t *out = dst + row * bytes_per_row;
+    for (int b = 0; b < bytes_per_row; b++)
+    {
+      // Each output byte straddles at most two bytes of the bitstream
+      uint32_t pos = bit + b * 8;
+      glyph_address_t src = base + (pos >> 3);
+      uint8_t shift = pos & 7;
+      uint8_t value = readGlyphByte(src) << shift;
+      if (shift) value |= readGlyphByte(src + 1) >> (8 - shift);
+      out[b] = value;
+    }
+    // Clear the bits that belong to the next row
+    if (width & 7) out[bytes_per_row - 1] &= 0xFF << (8 - (width & 7));
+    bit += width;
+  }
+}
+#endif
+
+#if defined(GLYPH_PAGE_MAJOR) || defined(GLYPH_TILES)
+// ORs a page-major glyph (`pages` pages of `width` column bytes, LSB on top, the SSD1306's
+// own layout) from PROGMEM straight into the display buffer with its top-left corner at
+// (x, y). At a page-aligned y each glyph byte lands in exactly one buffer byte; otherwise
+// it is split across two vertically adjacent pages.
+void blitPageGlyph(glyph_address_t bitmap, int x, int y, int width, int pages)
+{
+  uint8_t *buffer = display.getBuffer();
+  uint8_t shift = y & 7;          // row of y within its page
+  int first_page = (y - shift) / 8;
+
+  // Clip the columns to the screen once, rather than per byte
+  int first_column = x < 0 ? -x : 0;
+  int end_column = SCREEN_WIDTH - x < width ? SCREEN_WIDTH - x : width;
+
+  for (int p = 0; p < pages; p++)
+  {
+    int page = first_page + p;
+    glyph_address_t src = bitmap + p * width;
+    int offset = page * SCREEN_WIDTH + x; // buffer index of the glyph's column 0 in this page
+    bool top_visible = page >= 0 && page < SCREEN_HEIGHT / 8;
+    bool bottom_visible = shift && page + 1 >= 0 && page + 1 < SCREEN_HEIGHT / 8;
+    for (int c = first_column; c < end_column; c++)
+    {
+      uint8_t bits = readGlyphByte(src + c);
+      if (top_visible) buffer[offset + c] |= bits << shift;
+      if (bottom_visible) buffer[offset + SCREEN_WIDTH + c] |= bits >> (8 - shift);
+    }
+  }
+}
+#endif
+
+#if defined(GLYPH_COMPOSED)
+// Draws a composed glyph with the top-left corner of its cell at (x, y) and returns its
+// advance. The glyph is made of component glyphs (bases, vowels, tone marks) stored once
+// in component_bitmaps, each ORed onto the display at its offset inside the cell.
+int drawGlyph(uint16_t glyph_index, int x, int y)
+{
+  uint32_t first = readTable(&composition_starts[glyph_index]);
+  uint32_t end = readTable(&composition_starts[glyph_index + 1]);
+
+  for (uint32_t i = first; i < end; i++)
+  {
+    int component = readTable(&composition_components[i]);
+    int x_offset = (int8_t)pgm_read_byte(&composition_x_offsets[i]);
+    int y_offset = (int8_t)pgm_read_byte(&composition_y_offsets[i]);
+    int width = readTable(&component_widths[component]); // byte-aligned
+    int rows = readTable(&component_heights[component]);
+    int bytes_per_row = width / 8;
+
+    // Only the component's rows inside the cell are drawn (marks may reach past it)
+    int top = y_offset < 0 ? -y_offset : 0;
+    int bottom = GLYPH_HEIGHT - y_offset < rows ? GLYPH_HEIGHT - y_offset : rows;
+    if (bottom <= top) continue;
+
+    uint8_t component_buffer[bytes_per_row * (bottom - top)];
+    memcpy_P(component_buffer, component_bitmaps + readTable(&component_starts[component]) + top * bytes_per_row,
+             sizeof(component_buffer));
+    // drawBitmap only sets pixels, so overlapping components are ORed together
+    display.drawBitmap(x + x_offset, y + y_offset + top, component_buffer, width, bottom - top, SSD1306_WHITE);
+  }
+
+  return readTable(&unpadded_widths[glyph_index]);
+}
+#elif defined(GLYPH_TILES)
+// Draws a tiled glyph with the top-left corner of its cell at (x, y) and returns its
+// advance. The glyph is a grid of 8x8 tiles from tile_bitmaps, stored page-major, so each
+// tile is ORed straight into the display buffer; blank tiles (id 0) are skipped.
+int drawGlyph(uint16_t glyph_index, int x, int y)
+{
+  int tile_columns = readTable(&glyph_widths[glyph_index]) / 8;
+  uint32_t entry = readTable(&tile_map_starts[glyph_index]);
+
+  for (int row = 0; row < (GLYPH_HEIGHT + 7) / 8; row++)
+  {
+    for (int column = 0; column < tile_columns; column++, entry++)
+    {
+      uint32_t tile = readTable(&tile_map[entry]);
+      if (tile) blitPageGlyph(tile_bitmaps + tile * 8, x + column * 8, y + row * 8, 8, 1);
+    }
+  }
+
+  return readTable(&unpadded_widths[glyph_index]);
+}
+#else
+// Copies a glyph's bitmap from PROGMEM (flash) into glyph_buffer (RAM), decoding it if the
+// header was generated with compression codecs or bit packing
+void loadGlyph(uint16_t glyph_index, uint8_t *glyph_buffer, int bytes_per_row, int bytes_per_bitmap)
+{
+#if defined(GLYPH_BIT_PACKED)
+  // bitmap_starts holds bit offsets and glyph_widths the true (unpadded) widths
+  unpackBitGlyph(readTable(&bitmap_starts[glyph_index]), glyph_buffer,
+                 readTable(&glyph_widths[glyph_index]), bytes_per_row, bytes_per_bitmap / bytes_per_row);
+#else
+  glyph_address_t bitmap = glyphAddress(readTable(&bitmap_starts[glyph_index])); // Fetch start byte offset from PROGMEM
+
+#if defined(GLYPH_CODECS)
+  switch (pgm_read_byte(&glyph_codecs[glyph_index]))
+  {
+#if defined(GLYPH_USES_RLE)
+    case GLYPH_CODEC_RLE:
+      decodeRowDeltaRle(bitmap, glyph_buffer, bytes_per_row, bytes_per_bitmap);
+      return;
+#endif
+#if defined(GLYPH_USES_LZ)
+    case GLYPH_CODEC_LZ:
+      decodeLz(bitmap, glyph_buffer, bytes_per_bitmap);
+      return;
+#endif
+#if defined(GLYPH_USES_DELTA)
+    case GLYPH_CODEC_DELTA:
+      // Load the reference glyph (same size, never delta-coded itself), then flip the bytes that differ
+      loadGlyph(((uint16_t)readGlyphByte(bitmap) << 8) | readGlyphByte(bitmap + 1), glyph_buffer, bytes_per_row, bytes_per_bitmap);
+      applyXorDelta(bitmap + 2, glyph_buffer);
+      return;
+#endif
+  }
+#endif
+
+  // Raw bitmap: copy it as-is
+  copyGlyph(glyph_buffer, bitmap, bytes_per_bitmap);
+#endif
+}
+
+// Draws one glyph with the top-left corner of its cell at (x, y) and returns its advance
+// (unpadded width), i.e. how far to move x for the next glyph
+int drawGlyph(uint16_t glyph_index, int x, int y)
+{
+  int glyph_width_byte_aligned = readTable(&glyph_widths[glyph_index]); // Fetch byte-alighned width from PROGMEM
+  int glyph_rows = GLYPH_HEIGHT;
+
+#if defined(GLYPH_BOXES)
+  // Only the glyph's ink box is stored: draw it at its offset inside the cell
+  glyph_rows = readTable(&glyph_heights[glyph_index]);
+  x += readTable(&x_offsets[glyph_index]);
+  y += readTable(&y_offsets[glyph_index]);
+#endif
+
+#if defined(GLYPH_PAGE_MAJOR)
+  // glyph_widths holds true widths: OR the glyph's pages straight into the display buffer
+  blitPageGlyph(glyphAddress(readTable(&bitmap_starts[glyph_index])), x, y, glyph_width_byte_aligned, (glyph_rows + 7) / 8);
+#else
+  // Calculate bytes per row and total bytes for this specific bitmap
+  int BYTES_PER_ROW = (glyph_width_byte_aligned + 7) / 8;
+  int BYTES_PER_BITMAP = BYTES_PER_ROW * glyph_rows;
+
+  if (BYTES_PER_BITMAP > 0) // Blank glyphs have an empty box
+  {
+    // Create a buffer in RAM to hold the bitmap data (needs to be large enough for the widest glyph)
+    uint8_t glyph_buffer[BYTES_PER_BITMAP];
+    // Copy (or decode) the bitmap data from PROGMEM (flash) to RAM (glyph_buffer)
+    loadGlyph(glyph_index, glyph_buffer, BYTES_PER_ROW, BYTES_PER_BITMAP);
+
+    // Draw the bitmap on the display
+    // Use glyph_width_byte_aligned for drawBitmap as it's the actual pixel width of the stored bitmap.
+    display.drawBitmap(x, y, glyph_buffer, glyph_width_byte_aligned, glyph_rows, SSD1306_WHITE);
+  }
+#endif
+
+  return readTable(&unpadded_widths[glyph_index]); // Fetch unpadded width (for visual spacing) from PROGMEM
+}
+#endif
+
+// Reads the next glyph index of a phrase from PROGMEM and moves `phrase` past it. Indices are
+// one byte, except that with more than 256 clusters the rarest are an escape byte
+// (PHRASE_ESCAPE_FIRST or above, selecting a page of 256) followed by a low byte.
+// Indices go up to 65280, so they are unsigned: int is only 16 bits on AVR.
+uint16_t readGlyphIndex(const uint8_t *&phrase)
+{
+  uint8_t code = pgm_read_byte(phrase++);
+#if defined(PHRASE_ESCAPE_FIRST)
+  if (code >= PHRASE_ESCAPE_FIRST)
+    return PHRASE_ESCAPE_FIRST + ((uint16_t)(code - PHRASE_ESCAPE_FIRST) << 8) + pgm_read_byte(phrase++);
+#endif
+  return code;
+}
+
 // Function to scroll and display a phrase
-void scrollPhrase(const uint8_t *lao_phrase, uint8_t len_phrase)
+void scrollPhrase(const uint8_t *lao_phrase, int len_phrase)
 {
   // Calculate the total unpadded width of the phrase for determining scroll end
   int total_unpadded_scroll_width = 0;
+  const uint8_t *p = lao_phrase;
   for (int i = 0; i < len_phrase; i++)
   {
-    int glyph_index = pgm_read_byte(lao_phrase + i); // Use pgm_read_byte to fetch from PROGMEM
-    total_unpadded_scroll_width += pgm_read_word(&unpadded_widths[glyph_index]);
+    uint16_t glyph_index = readGlyphIndex(p); // Fetch (and decode) the index from PROGMEM
+    total_unpadded_scroll_width += readTable(&unpadded_widths[glyph_index]);
   }
 
   int scroll_offset = -SCREEN_WIDTH; // Start first character off-screen to the right
@@ -35,27 +341,12 @@ void scrollPhrase(const uint8_t *lao_phrase, uint8_t len_phrase)
     int y = (SCREEN_HEIGHT - GLYPH_HEIGHT) / 2; // Y position (vertically centered)
 
     // Loop through each glyph in the phrase
+    const uint8_t *p = lao_phrase;
     for (int i = 0; i < len_phrase; i++)
     {
-      int glyph_index = pgm_read_byte(lao_phrase + i);                          // Get the index of the current glyph
-      int bitmap_start = pgm_read_word(&bitmap_starts[glyph_index]);           // Fetch start byte offset from PROGMEM
-      int glyph_width_byte_aligned = pgm_read_word(&glyph_widths[glyph_index]); // Fetch byte-alighned width from PROGMEM
-      int glyph_width_unpadded = pgm_read_word(&unpadded_widths[glyph_index]);  // Fetch unpadded width (for visual spacing) from PROGMEM
-      
-      // Calculate bytes per row and total bytes for this specific bitmap
-      int BYTES_PER_ROW = (glyph_width_byte_aligned + 7) / 8;
-      int BYTES_PER_BITMAP = BYTES_PER_ROW * GLYPH_HEIGHT;
-
-      // Create a buffer in RAM to hold the bitmap data (needs to be large enough for the widest glyph)
-      uint8_t glyph_buffer[BYTES_PER_BITMAP];
-      // Copy the bitmap data from PROGMEM (flash) to RAM (glyph_buffer)
-      memcpy_P(glyph_buffer, glyph_bitmaps + bitmap_start, BYTES_PER_BITMAP);
-
-      // Draw the bitmap on the display
-      // Use glyph_width_byte_aligned for drawBitmap as it's the actual pixel width of the stored bitmap.
-      display.drawBitmap(x, y, glyph_buffer, glyph_width_byte_aligned, GLYPH_HEIGHT, SSD1306_WHITE);
+      uint16_t glyph_index = readGlyphIndex(p); // Get the index of the current glyph
       //Advance by unpadded width to make the characters appear tightly adjacent
-      x += glyph_width_unpadded;
+      x += drawGlyph(glyph_index, x, y);
     }
 
     display.display();   // Update the OLED with the new frame
@@ -65,35 +356,19 @@ void scrollPhrase(const uint8_t *lao_phrase, uint8_t len_phrase)
 }
 
 // Function to display a static phrase
-void staticPhrase(const uint8_t *lao_phrase, uint8_t len_phrase)
+void staticPhrase(const uint8_t *lao_phrase, int len_phrase)
 {
   display.clearDisplay(); // Clear the display for the phrase
   int x = 0;
   int y = (SCREEN_HEIGHT - GLYPH_HEIGHT) / 2;
 
+  const uint8_t *p = lao_phrase;
   for (int i = 0; i < len_phrase; i++)
   {
-    int glyph_index = pgm_read_byte(lao_phrase + i);
-    int bitmap_start = pgm_read_word(&bitmap_starts[glyph_index]);
-    int glyph_width_byte_aligned = pgm_read_word(&glyph_widths[glyph_index]);
-    int glyph_width_unpadded = pgm_read_word(&unpadded_widths[glyph_index]);
-
-    // Calculate bytes per row and total bytes for this specific bitmap
-    int BYTES_PER_ROW = (glyph_width_byte_aligned + 7) / 8;
-    int BYTES_PER_BITMAP = BYTES_PER_ROW * GLYPH_HEIGHT;
-
-     // Create a buffer in RAM to hold the bitmap data (needs to be large enough for the widest glyph)
-    uint8_t glyph_buffer[BYTES_PER_BITMAP];
-
-    // Copy the bitmap data from PROGMEM (flash) to RAM (glyph_buffer)
-    memcpy_P(glyph_buffer, glyph_bitmaps + bitmap_start, BYTES_PER_BITMAP);
-
-    // Draw the bitmap on the display
-    // Use glyph_width_byte_aligned for drawBitmap as it's the actual pixel width of the stored bitmap.
-    display.drawBitmap(x, y, glyph_buffer, glyph_width_byte_aligned, GLYPH_HEIGHT, SSD1306_WHITE);
+    uint16_t glyph_index = readGlyphIndex(p);
 
     //Advance by unpadded width to make the characters appear tightly adjacent
-    x += glyph_width_unpadded;
+    x += drawGlyph(glyph_index, x, y);
   }
 
   display.display(); // Update the OLED with the new frame
@@ -104,8 +379,8 @@ void displayPhraseByIndex(int input)
 {
   if (input >= 1 && input <= num_phrases)
   {
-    uint8_t start = pgm_read_byte(&phrase_starts[input - 1]);           // Get the phrase start in array
-    uint8_t len_phrase = pgm_read_byte(&phrase_lengths[input - 1]);     // Get the length of the chosen phrase
+    uint32_t start = readTable(&phrase_starts[input - 1]);              // Get the phrase start in array
+    int len_phrase = readTable(&phrase_lengths[input - 1]);             // Get the length of the chosen phrase
     const uint8_t *lao_phrase = all_phrases + start;                    // Get the chosen phrase data
     scrollPhrase(lao_phrase, len_phrase);                               // Static phrase function also available (uncomment out to test)
     // staticPhrase(lao_phrase, len_phrase);
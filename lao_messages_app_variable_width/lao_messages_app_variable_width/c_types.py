@@ -0,0 +1,36 @@
+"""
+C Integer Types for the Generated Headers.
+
+Every table in the generated headers is declared with the smallest unsigned type that
+holds all of its values, so small atlases and phrase lists stay small and large ones do
+not overflow their tables. The sketch reads the tables through `readTable()`, which is
+overloaded for each of these types, so it does not need to know which one was chosen.
+"""
+
+# (C type, largest value, bytes per value), smallest first
+C_UINT_TYPES = (
+    ("uint8_t", 0xFF, 1),
+    ("uint16_t", 0xFFFF, 2),
+    ("uint32_t", 0xFFFFFFFF, 4),
+)
+
+
+def smallest_uint_type(max_value):
+    """
+    Smallest unsigned C type holding every value from 0 to `max_value`.
+
+    Args:
+        max_value (int): Largest value of the table (0 for an empty table).
+
+    Returns:
+        tuple: (C type, bytes per value).
+
+    Raises:
+        ValueError: If `max_value` is negative or does not fit in 32 bits.
+    """
+    if max_value < 0:
+        raise ValueError(f"Negative value {max_value} does not fit in an unsigned table")
+    for ctype, largest, size in C_UINT_TYPES:
+        if max_value <= largest:
+            return ctype, size
+    raise ValueError(f"Value {max_value} does not fit in uint32_t")
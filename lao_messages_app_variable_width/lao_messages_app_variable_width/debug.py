@@ -2,47 +2,59 @@
 Debugging Utilities for Grapheme Cluster Bitmap Rendering.
 
 This module contains utility functions for:
-1. Displaying monochrome bitmap data as ASCII art in the terminal.
-2. Printing grapheme cluster lists and their corresponding index mappings for inspection.
+1. Displaying monochrome bitmap data as ASCII art in the terminal (including previews
+   of near-duplicate glyph merges).
+2. Emulating how the Arduino sketch draws a phrase on the OLED (including its
+   page-major blit into the SSD1306 display buffer).
+3. Printing grapheme cluster lists and their corresponding index mappings for inspection
+   (and checking the Lao segmenter against the `grapheme` package).
+4. Checking that cached glyph records match fresh renders, with and without phrases.
 
 Useful for verifying the correctness of font rendering and character indexing
 when preparing data for embedded text display systems.
 """
 
 import os
+import tempfile
+import time
 from math import ceil
 
-import os
-from math import ceil
+import grapheme
+import numpy as np
 
-import os
-from math import ceil
-
-import os
-from math import ceil
+from lao_messages_app_variable_width.font_context import get_font_context
+from lao_messages_app_variable_width.generate_bitmaps import BACKENDS, render_cluster_bitmap, render_clusters, pack_bitmap
+from lao_messages_app_variable_width.glyph_cache import GlyphCache
+from lao_messages_app_variable_width.glyph_atlas import GlyphAtlas, glyph_pages
+from lao_messages_app_variable_width.glyph_codecs import CODECS, DeltaReferences, compress_glyph, decode_glyph, delta_reference
+from lao_messages_app_variable_width.lao_segmenter import LAO_CHAR_CLASSES, segment_clusters
 
-def display_bitmap_row(data, GLYPH_HEIGHT, glyph_widths, bitmap_offsets, unpadded_widths):
+def display_bitmap_row(atlas):
     """
     Displays multiple monochrome bitmaps side by side as ASCII art.
     If the glyphs don't fit on a single line, they are displayed in a grid
     that adapts to the terminal width.
 
     Args:
-        data (list[int] or bytes): Packed binary image data (1-bit per pixel),
-            glyphs stored row-by-row consecutively.
-        GLYPH_HEIGHT (int): Height (in pixels) of each glyph (fixed).
-        glyph_widths (list[int]): List of glyph widths (in pixels) for each glyph (these are the byte-aligned widths).
-        bitmap_offsets (list[int]): Start index (in bytes) of each glyph in `data`.
-        unpadded_widths (list[int]): List of the *true pixel widths* of each glyph's content
-                                      (before byte-alignment padding).
+        atlas (GlyphAtlas): Packed glyphs (1-bit per pixel, stored row-by-row) with their
+            byte-aligned widths, start offsets and *true pixel widths* (`unpadded_widths`,
+            the width of each glyph's content before byte-alignment padding).
 
     Each glyph occupies ceil(width / 8) bytes per row and GLYPH_HEIGHT rows total.
+    Tables from a bit-packed or page-major header can be shown by converting them first
+    with `GlyphAtlas.from_bit_packed` / `GlyphAtlas.from_page_major`, and a generated atlas
+    file with `glyph_atlas_file.read_atlas_file` (zero-copy). Glyphs of a boxed atlas are shown at their offsets
+    inside their cells.
     """
+    atlas = atlas.cells()
     terminal_width = os.get_terminal_size().columns
     GLYPH_SPACING = 0 # No extra space between bitmaps
 
+    data = atlas.data
+    GLYPH_HEIGHT = atlas.glyph_height
+
     # Prepare a list of (offset, byte_aligned_width, unpadded_width) for easier iteration
-    glyphs_info = list(zip(bitmap_offsets, glyph_widths, unpadded_widths))
+    glyphs_info = list(zip(atlas.starts, atlas.widths, atlas.unpadded_widths))
 
     if not glyphs_info:
         return
@@ -124,19 +136,427 @@ def display_bitmap_row(data, GLYPH_HEIGHT, glyph_widths, bitmap_offsets, unpadde
             print() # Add a blank line between grid rows for better separation
 
 
+def draw_glyph(frame, atlas, glyph_index, x, y):
+    """
+    Draws one glyph into a framebuffer exactly as the sketch's drawGlyph() does.
+
+    Args:
+        frame (numpy.ndarray): (screen height, screen width) boolean framebuffer; drawn pixels
+            are set (ORed in) and anything off-screen is clipped, like Adafruit_GFX does.
+        atlas (GlyphAtlas): Glyphs, either full cells or boxed (drawn at their offsets).
+        glyph_index (int): Glyph to draw.
+        x (int): Left edge of the glyph's cell.
+        y (int): Top edge of the glyph's cell.
+
+    Returns:
+        int: The glyph's advance (unpadded width).
+    """
+    rows = atlas.glyph_rows(glyph_index)
+    width = atlas.widths[glyph_index]
+    if atlas.rows is not None:
+        x += atlas.x_offsets[glyph_index]
+        y += atlas.y_offsets[glyph_index]
+
+    if width and rows:
+        with atlas.glyph(glyph_index) as view:
+            pixels = np.unpackbits(np.frombuffer(view, dtype=np.uint8).reshape(rows, width // 8), axis=1).astype(bool)
+        # Clip the glyph to the screen
+        screen_height, screen_width = frame.shape
+        top, left = max(y, 0), max(x, 0)
+        bottom, right = min(y + rows, screen_height), min(x + width, screen_width)
+        if top < bottom and left < right:
+            frame[top:bottom, left:right] |= pixels[top - y:bottom - y, left - x:right - x]
+
+    return atlas.unpadded_widths[glyph_index]
+
+
+def emulate_phrase(atlas, glyph_indices, x=0, screen_width=128, screen_height=64):
+    """
+    Emulates the sketch's staticPhrase(): draws a phrase into an OLED-sized framebuffer.
+
+    Glyphs are vertically centred and advance by their unpadded widths, so the result
+    is what the display would show (scrollPhrase frames are the same with x < 0).
+
+    Args:
+        atlas (GlyphAtlas): Glyphs to draw from.
+        glyph_indices (list[int]): The phrase, as indices into the atlas.
+        x (int): Left edge of the first glyph (negative while scrolling).
+        screen_width (int): Display width in pixels.
+        screen_height (int): Display height in pixels.
+
+    Returns:
+        numpy.ndarray: (screen_height, screen_width) boolean framebuffer, True = lit pixel.
+    """
+    frame = np.zeros((screen_height, screen_width), dtype=bool)
+    y = (screen_height - atlas.glyph_height) // 2
+    for glyph_index in glyph_indices:
+        x += draw_glyph(frame, atlas, glyph_index, x, y)
+    return frame
+
+
+def display_frame(frame):
+    """Prints an emulated framebuffer as ASCII art, framed so the screen edges are visible."""
+    print("+" + "-" * frame.shape[1] + "+")
+    for row in frame:
+        print("|" + "".join("█" if lit else " " for lit in row) + "|")
+    print("+" + "-" * frame.shape[1] + "+")
+
+
+def blit_page_glyph(buffer, page_bytes, x, y, width, pages, screen_width=128, screen_height=64):
+    """
+    Reference implementation of the sketch's blitPageGlyph(): ORs a page-major glyph into a
+    display buffer in the SSD1306's own layout.
+
+    Args:
+        buffer (bytearray): Display buffer like `display.getBuffer()`: screen_height / 8 pages
+            of screen_width column bytes, least significant bit on top.
+        page_bytes (bytes-like): The glyph's pages (see `glyph_atlas.glyph_pages`).
+        x (int): Left edge of the glyph.
+        y (int): Top edge of the glyph; at a multiple of 8 every byte lands in one buffer
+            byte, otherwise it is split across two pages.
+        width (int): Column bytes per page (the glyph's true width).
+        pages (int): Number of pages of the glyph.
+        screen_width (int): Display width in pixels.
+        screen_height (int): Display height in pixels.
+    """
+    shift = y % 8  # Floors like the sketch's y & 7, also for negative y
+    first_page = (y - shift) // 8
+    screen_pages = screen_height // 8
+    columns = range(max(0, -x), min(width, screen_width - x))
+    for p in range(pages):
+        page = first_page + p
+        offset = page * screen_width + x
+        for c in columns:
+            bits = page_bytes[p * width + c]
+            if 0 <= page < screen_pages:
+                buffer[offset + c] |= (bits << shift) & 0xFF
+            if shift and 0 <= page + 1 < screen_pages:
+                buffer[offset + screen_width + c] |= bits >> (8 - shift)
+
+
+def page_buffer_to_frame(buffer, screen_width=128, screen_height=64):
+    """Unpacks an SSD1306-layout display buffer into a framebuffer like `emulate_phrase` returns."""
+    pages = np.frombuffer(bytes(buffer), dtype=np.uint8).reshape(screen_height // 8, screen_width, 1)
+    pixels = np.unpackbits(pages, axis=2, bitorder="little").transpose(0, 2, 1)
+    return pixels.reshape(screen_height, screen_width).astype(bool)
+
+
+def check_page_blit(atlas, positions=None, screen_width=128, screen_height=64):
+    """
+    Checks that blitting page-major glyphs gives exactly the pixels drawBitmap gives.
+
+    Every glyph is converted with `glyph_pages`, drawn at each position with
+    `blit_page_glyph` and compared with `draw_glyph` drawing the atlas's own glyph.
+
+    Args:
+        atlas (GlyphAtlas): Glyphs to check, full cells or boxed.
+        positions (list[tuple] | None): (x, y) cell positions to draw at. By default a
+            page-aligned one, unaligned ones and ones clipped at every screen edge.
+        screen_width (int): Display width in pixels.
+        screen_height (int): Display height in pixels.
+
+    Returns:
+        int: Number of (glyph, position) pairs that differ.
+    """
+    if positions is None:
+        positions = [(0, 0), (3, 17), (-5, 24), (screen_width - 6, screen_height - atlas.glyph_height // 2),
+                     (2, -5)]
+
+    mismatches = 0
+    for index in range(len(atlas)):
+        rows = atlas.glyph_rows(index)
+        with atlas.glyph(index) as view:
+            page_bytes, width = glyph_pages(view, atlas.widths[index], rows)
+        x_offset = atlas.x_offsets[index] if atlas.rows is not None else 0
+        y_offset = atlas.y_offsets[index] if atlas.rows is not None else 0
+
+        for x, y in positions:
+            expected = np.zeros((screen_height, screen_width), dtype=bool)
+            draw_glyph(expected, atlas, index, x, y)
+            buffer = bytearray(screen_width * screen_height // 8)
+            blit_page_glyph(buffer, page_bytes, x + x_offset, y + y_offset, width, (rows + 7) // 8,
+                            screen_width, screen_height)
+            if not np.array_equal(page_buffer_to_frame(buffer, screen_width, screen_height), expected):
+                mismatches += 1
+
+    print(f"Page-major blit: {mismatches} mismatches in {len(atlas) * len(positions)} glyph draws")
+    return mismatches
+
+
+def check_segmenter(strings=None):
+    """
+    Checks that `lao_segmenter.segment_clusters` splits strings exactly like `grapheme.graphemes`.
+
+    Besides any given strings, checks every Lao block character alone and in every ordered
+    pair with each other and with a few characters around the fast path (ASCII, a
+    combining mark and joiner from outside the block, CR/LF), every Lao letter followed by
+    up to two marks (a superset of Experimentation/bitmaps/all_character_combos.py), and
+    those combinations joined into space-separated phrases.
+
+    Args:
+        strings (list[str] | None): Extra strings to check, e.g. `input_list`.
+
+    Returns:
+        int: Number of strings segmented differently.
+    """
+    letters = [chr(code_point) for code_point, is_mark in LAO_CHAR_CLASSES.items()
+               if 0x0E80 <= code_point <= 0x0EFF and not is_mark]
+    marks = [chr(code_point) for code_point, is_mark in LAO_CHAR_CLASSES.items() if is_mark]
+    block = [chr(code_point) for code_point in range(0x0E80, 0x0F00)]
+    neighbours = [" ", "a", "1", ".", "\u0301", "\u200d", "\r", "\n"]
+
+    cases = list(strings or [])
+    cases += block
+    cases += [first + second for first in block + neighbours for second in block + neighbours]
+    combos = [letter + first + second for letter in letters for first in [""] + marks for second in [""] + marks]
+    cases += combos
+    cases += [" ".join(combos[start:start + 8]) for start in range(0, len(combos), 8)]
+
+    mismatches = 0
+    for s in cases:
+        if segment_clusters(s) != list(grapheme.graphemes(s)):
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"Segmenter mismatch on {s!r}: {segment_clusters(s)} != {list(grapheme.graphemes(s))}")
+
+    print(f"Lao segmenter: {mismatches} mismatches in {len(cases)} strings")
+    return mismatches
+
+
+def check_phrase_cache(phrase_sets=None, GLYPH_HEIGHT=30, font_path="./font_files/NotoSansLao-Regular.ttf",
+                       render_mode="resize"):
+    """
+    Checks that cached glyph records are byte-identical to uncached renders in phrase mode.
+
+    The clusters of all phrase sets are rendered once per set (None: cluster mode), in
+    order, through one fresh `GlyphCache`, so later sets hit records cached by earlier
+    ones, and compared with the same set rendered without a cache. The default sets
+    shape "ວຸ" in two different contexts and then on its own.
+
+    Args:
+        phrase_sets (list[list[str] | None] | None): Phrases to render the clusters with, per run.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+        render_mode (str): One of `generate_bitmaps.RENDER_MODES`.
+
+    Returns:
+        int: Number of clusters whose cached record differs from a fresh render.
+    """
+    if phrase_sets is None:
+        phrase_sets = [["ກວຸ"], ["ວຸາ"], None]
+    char_list = list(dict.fromkeys(cluster for phrases in phrase_sets for phrase in phrases or []
+                                   for cluster in segment_clusters(phrase)))
+
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as directory, GlyphCache(os.path.join(directory, "glyphs.sqlite3")) as cache:
+        for phrases in phrase_sets:
+            cached = render_clusters(char_list, GLYPH_HEIGHT, font_path, render_mode=render_mode, cache=cache,
+                                     show_progress=False, phrases=phrases)
+            fresh = render_clusters(char_list, GLYPH_HEIGHT, font_path, render_mode=render_mode,
+                                    show_progress=False, phrases=phrases)
+            for char, cached_record, fresh_record in zip(char_list, cached, fresh):
+                if cached_record != fresh_record:
+                    mismatches += 1
+                    print(f"Cached record of {char!r} differs from a fresh render (phrases: {phrases})")
+
+    print(f"Phrase cache: {mismatches} mismatches in {len(phrase_sets) * len(char_list)} cluster renders")
+    return mismatches
+
+
+def display_clusters(char_list, GLYPH_HEIGHT, font_path="./font_files/NotoSansLao-Regular.ttf"):
+    """
+    Renders grapheme clusters and displays them side by side without writing a header.
+
+    Uses the shared FontContext, so repeated previews in one session reuse the
+    already-open font instead of reloading it.
+
+    Args:
+        char_list (list[str]): Grapheme clusters to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+    """
+    font_context = get_font_context(font_path)
+
+    atlas = GlyphAtlas(GLYPH_HEIGHT)
+    for char in char_list:
+        byte_array, final_width, unpadded_width = pack_bitmap(render_cluster_bitmap(char, GLYPH_HEIGHT, font_context), GLYPH_HEIGHT)
+        atlas.append(byte_array, final_width, unpadded_width, char)
+
+    display_bitmap_row(atlas)
+
+
+def preview_merges(atlas, merges):
+    """
+    Shows every near-duplicate merge before it is applied.
+
+    For each kept glyph, prints the clusters merged into it with their pixel distances,
+    then displays the kept glyph followed by the original bitmaps of the merged ones, so
+    a too-generous threshold is easy to spot.
+
+    Args:
+        atlas (GlyphAtlas): The atlas the merges were found in, not yet merged.
+        merges (list[tuple]): (kept index, [(merged index, distance), ...]) entries, as
+            returned by `GlyphAtlas.near_duplicates`.
+    """
+    # Show boxed glyphs at their offsets, like display_bitmap_row does
+    cells = atlas.cells() if atlas.rows is not None else atlas
+    for kept, near in merges:
+        merged = ", ".join(f"{cells.clusters[index]!r} ({distance} px)" for index, distance in near)
+        print(f"Glyph {kept} {cells.clusters[kept]!r} <- {merged}")
+
+        preview = GlyphAtlas(cells.glyph_height)
+        for index in [kept] + [index for index, _ in near]:
+            preview.append(bytes(cells.glyph(index)), cells.widths[index], cells.unpadded_widths[index],
+                           cells.clusters[index])
+        display_bitmap_row(preview)
+        print()
+
+
+def benchmark_backends(char_list, GLYPH_HEIGHT, font_path="./font_files/NotoSansLao-Regular.ttf", backends=None):
+    """
+    Times each raster backend over `char_list` and checks that they agree byte for byte.
+
+    Args:
+        char_list (list[str]): Grapheme clusters to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+        backends (list[str] | None): Backend names to compare (default: all of `BACKENDS`).
+
+    Returns:
+        dict[str, float]: Seconds taken by each backend.
+    """
+    font_context = get_font_context(font_path)
+    backends = list(backends or BACKENDS)
+
+    timings = {}
+    outputs = {}
+    for name in backends:
+        render = BACKENDS[name]
+        start = time.perf_counter()
+        outputs[name] = [render(char, GLYPH_HEIGHT, font_context) for char in char_list]
+        timings[name] = time.perf_counter() - start
+
+    reference = backends[0]
+    for name in backends:
+        identical = all(
+            bytes(a[0]) == bytes(b[0]) and a[1:] == b[1:]
+            for a, b in zip(outputs[reference], outputs[name])
+        )
+        print(f"{name:>8}: {timings[name]:.3f} s for {len(char_list)} clusters"
+              f" ({'identical to' if identical else 'DIFFERS from'} {reference})")
+
+    return timings
+
+
+def _lz_copied_bytes(payload, size):
+    # Output bytes an LZ glyph copies from earlier output rather than reading from flash
+    copied = 0
+    produced = 0
+    src = 0
+    while produced < size:
+        control = payload[src]
+        if control < 128:
+            produced += control + 1
+            src += control + 2
+        else:
+            copied += control - 125
+            produced += control - 125
+            src += 2
+    return copied
+
+
+def benchmark_codecs(atlas, codec_sets=None):
+    """
+    Compares glyph compression settings: flash used versus the cost of decoding on the device.
+
+    Each distinct bitmap of `atlas` is compressed with every setting (smallest codec per
+    glyph, as the header writer does) and decoded again to check the round trip. Decode
+    cost is reported two ways: host time of the Python decoders (which mirror the sketch's)
+    and an estimate of the device's work, counted as flash bytes read plus RAM bytes
+    written (plus the RAM re-reads of the RLE codec's XOR pass and of LZ match copies).
+    A "delta" glyph also costs the decoding of its reference.
+
+    Args:
+        atlas (GlyphAtlas): Glyphs to compress, e.g. from `generate_bitmaps_for_chars`.
+        codec_sets (list[tuple[str]] | None): Settings to compare (default: raw only,
+            each codec alone, and all codecs).
+
+    Returns:
+        dict[tuple, dict]: For each setting: flash bytes (bitmaps plus the glyph_codecs[]
+        table), bytes saved against raw, host decode seconds and estimated device work.
+    """
+    if codec_sets is None:
+        codec_sets = [("raw",)] + [("raw", codec) for codec in CODECS if codec != "raw"] + [CODECS]
+
+    # Shared bitmaps are stored (and compressed) once
+    glyphs = {}
+    for index in range(len(atlas)):
+        width = atlas.widths[index]
+        glyphs.setdefault(atlas.starts[index], (bytes(atlas.glyph(index)), width // 8))
+
+    raw_flash = sum(len(data) for data, _ in glyphs.values())
+    results = {}
+    for codecs in codec_sets:
+        # Delta references are picked as the header writer picks them, in glyph order
+        references = DeltaReferences() if "delta" in codecs else None
+        encoded = []
+        for glyph_index, (data, bytes_per_row) in enumerate(glyphs.values()):
+            reference = references.closest(data, bytes_per_row) if references is not None else None
+            codec, payload = compress_glyph(data, bytes_per_row, codecs, reference)
+            if codec != "delta" and references is not None:
+                references.add(glyph_index, data, bytes_per_row)
+            encoded.append(((codec, payload), data, bytes_per_row))
+        # Any codec besides raw needs the one-byte-per-glyph glyph_codecs[] table
+        flash = sum(len(payload) for (_, payload), _, _ in encoded) + (len(atlas) if set(codecs) != {"raw"} else 0)
+
+        device_work = 0
+        start = time.perf_counter()
+        round_trip_ok = True
+        decoded = []
+        work = []
+        for (codec, payload), data, bytes_per_row in encoded:
+            reference = None
+            glyph_work = len(payload) + len(data)
+            if codec == "rle":
+                glyph_work += len(data) - bytes_per_row
+            elif codec == "lz":
+                glyph_work += _lz_copied_bytes(payload, len(data))
+            elif codec == "delta":
+                reference_index = delta_reference(payload)
+                reference = decoded[reference_index]
+                glyph_work += work[reference_index]
+            decoded.append(decode_glyph(codec, payload, len(data), bytes_per_row, reference))
+            round_trip_ok &= decoded[-1] == data
+            work.append(glyph_work)
+            device_work += glyph_work
+        host_seconds = time.perf_counter() - start
+
+        results[codecs] = {
+            "flash_bytes": flash,
+            "bytes_saved": raw_flash - flash,
+            "host_decode_seconds": host_seconds,
+            "device_work": device_work,
+        }
+        print(f"{'+'.join(codecs):>16}: {flash:7d} bytes of flash ({raw_flash - flash:+7d} vs raw),"
+              f" decode {host_seconds * 1000:7.1f} ms on host, ~{device_work / max(1, len(glyphs)):6.1f}"
+              f" flash/RAM byte accesses per glyph{'' if round_trip_ok else ' (ROUND TRIP FAILED)'}")
+
+    return results
+
+
 def print_char_and_index_lists(char_list, index_list):
     """
     Prints the character list and index list in a readable format.
 
     Args:
         char_list (list[str]): List of grapheme clusters.
-        index_list (list[list[int]]): List of index lists for each input string.
+        index_list (PhraseIndex | list[list[int]]): Index list for each input string.
     """
     print("Character List:")
     print('[' + ' '.join(char_list) + ']')
     print("\nIndex List:")
     for i, indices in enumerate(index_list):
-        print(f"String {i}: {indices}")
+        print(f"String {i}: {list(indices)}")
 
 import math
 
@@ -0,0 +1,256 @@
+"""
+Shared Font State for HarfBuzz Shaping and FreeType Rasterization.
+
+Opening a font means reading the TTF, building a HarfBuzz Blob/Face/Font and
+loading a FreeType face. This module does that once per (font path, size) pair
+and hands the same `FontContext` to the bitmap generator, the visualizer and the
+debugging helpers, so the cost is paid once per process instead of once per glyph.
+
+Shaping results are memoized on the context, so a cluster is shaped at most once per
+process no matter how many times it is rendered or previewed. Rendered component
+glyphs are memoized too: Lao clusters reuse a few dozen consonants, vowels and tone
+marks, so clusters are composited from cached FreeType bitmaps instead of asking
+FreeType to render the same base or mark again for every combination.
+"""
+
+import bisect
+import hashlib
+import io
+import os
+from collections import namedtuple
+
+import freetype
+import numpy as np
+import uharfbuzz as hb
+
+# Default FreeType character size (26.6 fixed point) used by the render-then-resize pipeline
+DEFAULT_CHAR_SIZE = 72 * 64
+
+# Open contexts, keyed by (absolute font path, char size, glyph height)
+_font_contexts = {}
+
+# Compact, immutable copies of HarfBuzz glyph infos/positions (same attribute names),
+# so memoized shaping results can be shared safely between callers
+GlyphInfo = namedtuple("GlyphInfo", ["codepoint", "cluster"])
+GlyphPosition = namedtuple("GlyphPosition", ["x_advance", "y_advance", "x_offset", "y_offset"])
+
+# A FreeType glyph rendering: bitmap bytes (rows * pitch), size and bearings (bitmap_left/top)
+RenderedGlyph = namedtuple("RenderedGlyph", ["buffer", "width", "rows", "pitch", "left", "top"])
+
+# Default load flags of the render-then-resize pipeline (8-bit anti-aliased coverage)
+RENDER_FLAGS_GRAY = freetype.FT_LOAD_RENDER | freetype.FT_LOAD_TARGET_NORMAL
+# Load flags for 1-bit rendering
+RENDER_FLAGS_MONO = freetype.FT_LOAD_RENDER | freetype.FT_LOAD_TARGET_MONO
+
+
+class FontContext:
+    """
+    Long-lived HarfBuzz font and FreeType face for one (font path, size) pair.
+
+    The size is either a FreeType character size (`char_size`, used by the
+    render-then-resize pipeline) or a target `glyph_height` in pixels. In the latter
+    case the em is scaled so the font's ascender-to-descender span fits in
+    `glyph_height` rows, and HarfBuzz positions are in 26.6 pixels like FreeType's.
+
+    Attributes:
+        font_path (str): Path to the TrueType font file.
+        char_size (int): FreeType character size in 26.6 fixed point.
+        glyph_height (int | None): Target bitmap height in pixels, if sized by pixels.
+        pixel_size (int | None): Pixels per em when sized by `glyph_height`.
+        baseline (int | None): Baseline row (from the top) when sized by `glyph_height`.
+        font_data (bytes): Raw contents of the font file.
+        shape_calls (int): Number of HarfBuzz shape calls made (memo hits excluded).
+        glyph_renders (int): Number of FreeType glyph loads made (memo hits excluded).
+        font_hash (str): SHA-256 hex digest of `font_data`, identifying the font in caches.
+        hb_font (uharfbuzz.Font): HarfBuzz font used for shaping.
+        face (freetype.Face): FreeType face used for rendering, already sized.
+    """
+
+    def __init__(self, font_path, char_size=DEFAULT_CHAR_SIZE, glyph_height=None):
+        with open(font_path, "rb") as f:
+            self.font_data = f.read()
+        self.font_hash = hashlib.sha256(self.font_data).hexdigest()
+
+        self.font_path = font_path
+        self.char_size = char_size
+        self.glyph_height = glyph_height
+        self.pixel_size = None
+        self.baseline = None
+
+        # Shaping memo: text -> (infos, positions), plus the texts that came from phrase shaping
+        self._shapes = {}
+        self._phrase_shaped = set()
+        self.shape_calls = 0
+
+        # Component glyph memos: glyph index -> advance, (glyph index, flags) -> RenderedGlyph,
+        # glyph index -> unpacked 1-bit array
+        self._advances = {}
+        self._renders = {}
+        self._mono_inks = {}
+        self.glyph_renders = 0
+
+        # Initialize HarfBuzz
+        self.hb_font = hb.Font(hb.Face(hb.Blob(self.font_data)))
+
+        # Initialize FreeType straight from memory (no temporary copy of the font on disk)
+        self.face = freetype.Face(io.BytesIO(self.font_data))
+        if glyph_height is None:
+            self.face.set_char_size(char_size)
+        else:
+            # Fit the font's ascender..descender span into glyph_height pixel rows
+            face = self.face
+            self.pixel_size = max(1, glyph_height * face.units_per_EM // (face.ascender - face.descender))
+            face.set_pixel_sizes(0, self.pixel_size)
+            self.baseline = round(face.ascender * self.pixel_size / face.units_per_EM)
+            # Scale HarfBuzz so positions come out in 26.6 pixels, matching FreeType
+            self.hb_font.scale = (self.pixel_size * 64, self.pixel_size * 64)
+
+    def shape(self, text):
+        """
+        Shapes `text` with HarfBuzz, memoized per context.
+
+        Args:
+            text (str): Grapheme cluster or string to shape.
+
+        Returns:
+            tuple: (glyph_infos, glyph_positions) as tuples of `GlyphInfo` / `GlyphPosition`.
+        """
+        shaped = self._shapes.get(text)
+        if shaped is None:
+            shaped = self._run_harfbuzz(text)
+            self._shapes[text] = shaped
+        return shaped
+
+    def shape_phrase(self, clusters):
+        """
+        Shapes a whole phrase in one HarfBuzz call and splits the glyph run per grapheme cluster.
+
+        HarfBuzz cluster ids are codepoint offsets into the phrase, so each glyph is assigned
+        to the grapheme cluster that contains its cluster id. Glyphs therefore keep the
+        contextual forms and mark positions chosen for the phrase as a whole. Each slice is
+        memoized under its cluster text, replacing any isolated shaping of it (among phrases
+        the first occurrence wins), so later `shape()` calls return the in-context glyphs.
+
+        Args:
+            clusters (list[str]): The phrase, already split into grapheme clusters.
+
+        Returns:
+            list[tuple]: One (glyph_infos, glyph_positions) pair per cluster.
+        """
+        # Codepoint offset at which each grapheme cluster starts
+        starts = []
+        offset = 0
+        for cluster in clusters:
+            starts.append(offset)
+            offset += len(cluster)
+
+        infos, positions = self._run_harfbuzz("".join(clusters))
+
+        runs = [([], []) for _ in clusters]
+        for info, pos in zip(infos, positions):
+            run_infos, run_positions = runs[bisect.bisect_right(starts, info.cluster) - 1]
+            run_infos.append(info)
+            run_positions.append(pos)
+
+        shaped = []
+        for cluster, (run_infos, run_positions) in zip(clusters, runs):
+            result = (tuple(run_infos), tuple(run_positions))
+            if run_infos and cluster not in self._phrase_shaped:
+                self._shapes[cluster] = result
+                self._phrase_shaped.add(cluster)
+            shaped.append(result)
+        return shaped
+
+    def glyph_advance(self, glyph_index):
+        """
+        Horizontal advance of a glyph in 26.6 pixels (FT_LOAD_DEFAULT metrics), memoized.
+
+        Raises:
+            freetype.FT_Exception: If FreeType cannot load the glyph.
+        """
+        advance = self._advances.get(glyph_index)
+        if advance is None:
+            self.face.load_glyph(glyph_index, freetype.FT_LOAD_DEFAULT)
+            self.glyph_renders += 1
+            advance = self.face.glyph.metrics.horiAdvance
+            self._advances[glyph_index] = advance
+        return advance
+
+    def render_glyph(self, glyph_index, load_flags=RENDER_FLAGS_GRAY):
+        """
+        Renders one glyph with FreeType, memoized by (glyph index, load flags).
+
+        Args:
+            glyph_index (int): Glyph id from shaping.
+            load_flags (int): FreeType load flags (`RENDER_FLAGS_GRAY` or `RENDER_FLAGS_MONO`).
+
+        Returns:
+            RenderedGlyph: The bitmap bytes, size and bearings.
+
+        Raises:
+            freetype.FT_Exception: If FreeType cannot load the glyph.
+        """
+        key = (glyph_index, load_flags)
+        rendered = self._renders.get(key)
+        if rendered is None:
+            self.face.load_glyph(glyph_index, load_flags)
+            self.glyph_renders += 1
+            glyph = self.face.glyph
+            bitmap = glyph.bitmap
+            rendered = RenderedGlyph(bytes(bitmap.buffer), bitmap.width, bitmap.rows, bitmap.pitch,
+                                     glyph.bitmap_left, glyph.bitmap_top)
+            self._renders[key] = rendered
+        return rendered
+
+    def mono_glyph(self, glyph_index):
+        """
+        1-bit rendering of a glyph unpacked to a boolean array, memoized.
+
+        Returns:
+            tuple: (ink, left, top) where `ink` is a (rows, width) array (True = ink), or
+            None for ink when the glyph has an empty bitmap.
+        """
+        mono = self._mono_inks.get(glyph_index)
+        if mono is None:
+            rendered = self.render_glyph(glyph_index, RENDER_FLAGS_MONO)
+            ink = None
+            if rendered.width > 0 and rendered.rows > 0:
+                # Unpack the 1-bit rows (pitch bytes each) and drop the padding bits
+                rows = np.frombuffer(rendered.buffer, dtype=np.uint8).reshape(rendered.rows, rendered.pitch)
+                ink = np.unpackbits(rows, axis=1)[:, :rendered.width].astype(bool)
+            mono = (ink, rendered.left, rendered.top)
+            self._mono_inks[glyph_index] = mono
+        return mono
+
+    def _run_harfbuzz(self, text):
+        buf = hb.Buffer()
+        # Codepoints rather than UTF-8, so cluster ids are codepoint offsets
+        buf.add_codepoints([ord(c) for c in text])
+        buf.guess_segment_properties()
+        hb.shape(self.hb_font, buf)
+        self.shape_calls += 1
+
+        infos = tuple(GlyphInfo(info.codepoint, info.cluster) for info in buf.glyph_infos)
+        positions = tuple(GlyphPosition(pos.x_advance, pos.y_advance, pos.x_offset, pos.y_offset)
+                          for pos in buf.glyph_positions)
+        return infos, positions
+
+
+def get_font_context(font_path, char_size=DEFAULT_CHAR_SIZE, glyph_height=None):
+    """
+    Returns the shared `FontContext` for a font and size, creating it on first use.
+
+    Args:
+        font_path (str): Path to a TrueType font file (.ttf).
+        char_size (int): FreeType character size in 26.6 fixed point.
+        glyph_height (int | None): If given, size the face for this bitmap height in pixels instead.
+
+    Returns:
+        FontContext: The context for this (font path, size) pair.
+    """
+    key = (os.path.abspath(font_path), char_size, glyph_height)
+    context = _font_contexts.get(key)
+    if context is None:
+        context = FontContext(font_path, char_size, glyph_height)
+        _font_contexts[key] = context
+    return context
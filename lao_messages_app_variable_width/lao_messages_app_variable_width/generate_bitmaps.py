@@ -1,235 +1,1071 @@
 from PIL import Image
-import freetype
-import uharfbuzz as hb
 from tqdm import tqdm
 import os
-import tempfile
 import sys # Keep sys import for error printing
+import contextlib
 import math
+import shutil
+import tempfile
+from array import array
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+from lao_messages_app_variable_width.c_types import smallest_uint_type
+from lao_messages_app_variable_width.font_context import RENDER_FLAGS_GRAY, FontContext, get_font_context
+from lao_messages_app_variable_width.glyph_atlas import GlyphAtlas, crop_glyph, glyph_bits, glyph_box, glyph_content_key, glyph_pages
+from lao_messages_app_variable_width.glyph_atlas_file import atlas_path_for_header, write_atlas_file
+from lao_messages_app_variable_width.glyph_cache import make_cache_key
+from lao_messages_app_variable_width.glyph_codecs import CODEC_IDS, CODECS, DeltaReferences, compress_glyph, decode_glyph
+from lao_messages_app_variable_width.glyph_composition import GlyphComposition
+from lao_messages_app_variable_width.glyph_tiles import GlyphTiles
+from lao_messages_app_variable_width.preprocess_strings import decompose_string_to_clusters
 
-def generate_bitmaps_for_chars(char_list, GLYPH_HEIGHT = 30, font_path="./font_files/NotoSansLao-Regular.ttf", output_header="./arduino_code/glyph_bitmaps.h"):
+def layout_cluster(char, GLYPH_HEIGHT, font_context):
     """
-    Generates GLYPH_WIDTH x GLYPH_HEIGHT black-and-white bitmap images for each grapheme cluster in `char_list`,
-    and exports the packed binary data as a C++ header file for use in embedded systems.
+    Shapes one grapheme cluster and renders its glyphs with FreeType, without compositing them.
+
+    Component glyphs come from the FontContext's render cache, so each distinct base or
+    mark is rendered by FreeType only once per process.
+
+    This is the part of the pipeline shared by every raster backend: it decides the size
+    of the 100-pixel-tall working canvas and where each rendered glyph lands on it.
 
     Args:
-        char_list (list[str]): List of grapheme clusters or strings (e.g., letters, syllables, or words).
-        font_path (str): Path to a TrueType font file (.ttf) that supports the input characters.
-        output_header (str): Output file path for the generated C++ header.
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap (used for the fallback canvas).
+        font_context (FontContext): Shared HarfBuzz font and FreeType face.
 
     Returns:
-        list[int]: Flat list of all packed bitmap bytes across all input characters.
-
-    The generated bitmaps are:
-        - GLYPH_WIDTH x GLYPH_HEIGHT pixels
-        - 1-bit monochrome (packed: 8 pixels per byte)
-        - Stored consecutively in a C++ array (`glyph_bitmaps[]`) with `PROGMEM` for AVR targets.
+        tuple:
+            canvas_width (int), canvas_height (int): Size of the working canvas.
+            wh_ratio (float): Width/height ratio used when scaling down to GLYPH_HEIGHT.
+            glyphs (list[tuple]): One (buffer, w, h, x_pos, y_pos) per rendered glyph, where
+                `buffer` holds w*h 8-bit coverage values and (x_pos, y_pos) is its top-left
+                corner on the canvas (possibly outside it).
     """
-    with open(font_path, "rb") as f:
-        font_data = f.read()
-
-    # Initialize HarfBuzz
-    hb_blob = hb.Blob(font_data)
-    hb_face = hb.Face(hb_blob)
-    hb_font = hb.Font(hb_face)
-
-    # Initialize FreeType with temporary font file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".ttf") as tmp_font_file:
-        tmp_font_file.write(font_data)
-        tmp_font_path = tmp_font_file.name
-
-    face = freetype.Face(tmp_font_path)
-    face.set_char_size(72 * 64)
-
-    # List to hold all bytes from all glyphs consecutively
-    all_bytes = []
-    bitmap_widths = []
-    unpadded_widths = []
-
-    # Progress bar for each character
-    for char in tqdm(char_list, desc="Processing characters"):
-        # Shape text using HarfBuzz
-        buf = hb.Buffer()
-        buf.add_str(char)
-        buf.guess_segment_properties()
-        hb.shape(hb_font, buf)
-
-        infos = buf.glyph_infos
-        positions = buf.glyph_positions
-
-        # Find base consonant (first glyph typically)
-        base_idx = 0  # Default to first glyph
-        base_glyph = infos[base_idx].codepoint
-    
-        # Load base glyph metrics
-        # Added try-except for robustness, as discussed in previous interactions
+    # Shape text using HarfBuzz
+    infos, positions = font_context.shape(char)
+
+    # Find base consonant (first glyph typically)
+    base_idx = 0  # Default to first glyph
+    base_glyph = infos[base_idx].codepoint
+
+    # Load base glyph metrics
+    # Added try-except for robustness, as discussed in previous interactions
+    try:
+        base_advance = font_context.glyph_advance(base_glyph)
+    except ValueError as e:
+        print(f"\nERROR: Failed to load base glyph {base_glyph} for character '{char}'. Error: {e}", file=sys.stderr)
+        # Fallback values if base glyph loading fails
+        wh_ratio = 1.0 # Assume square for aspect ratio
+        # Use a larger fallback canvas to avoid crashing
+        canvas_width = canvas_height = GLYPH_HEIGHT * 2
+        x = 0
+        y = GLYPH_HEIGHT # Adjust fallback baseline
+    except Exception as e:
+        print(f"\nUNEXPECTED ERROR: during base glyph loading for {base_glyph} for character '{char}'. Error: {e}", file=sys.stderr)
+        wh_ratio = 1.0
+        canvas_width = canvas_height = GLYPH_HEIGHT * 2
+        x = 0
+        y = GLYPH_HEIGHT
+    else: # Only execute if try block succeeds
+        base_width = base_advance // 64
+
+        # Size the blank canvas
+        # The initial canvas width should be able to contain the entire shaped cluster, not just base_width.
+        # Using base_width as a starting point is okay for simple cases, but complex scripts might need more.
+        # For now, sticking to original request and keeping base_width for initial canvas size.
+        # Zero-advance clusters (e.g. a lone "ຳ") still get a one-column canvas
+        canvas_width = max(1, base_width)
+        canvas_height = 100 # This is an empirical height for rendering before final scaling
+        wh_ratio = canvas_width / canvas_height
+        # CENTERING CALCULATION (Base consonant only)
+        x = 0
+        y = 80  # Empirical baseline position (adjust as needed)
+
+    glyphs = []
+    for info, pos in zip(infos, positions):
+        glyph_index = info.codepoint
+
+        # Skip .notdef glyphs (glyph_index 0)
+        if glyph_index == 0:
+            x += pos.x_advance // 64 # Still advance pen for proper layout
+            continue
+
         try:
-            face.load_glyph(base_glyph, freetype.FT_LOAD_DEFAULT)
+            # Component renders are cached on the context, keyed by glyph index
+            rendered = font_context.render_glyph(glyph_index, RENDER_FLAGS_GRAY)
         except ValueError as e:
-            print(f"\nERROR: Failed to load base glyph {base_glyph} for character '{char}'. Error: {e}", file=sys.stderr)
-            # Fallback values if base glyph loading fails
-            base_width = GLYPH_HEIGHT # Use GLYPH_HEIGHT as a rough estimate
-            wh_ratio = 1.0 # Assume square for aspect ratio
-            # Create a minimal image to avoid crashing
-            image = Image.new("L", (GLYPH_HEIGHT * 2, GLYPH_HEIGHT * 2), 255) # Larger fallback image
-            x = 0
-            y = GLYPH_HEIGHT # Adjust fallback baseline
+            print(f"\nERROR: Failed to load/render glyph {glyph_index} for char '{char}'. Error: {e}", file=sys.stderr)
+            x += pos.x_advance // 64 # Still advance pen for proper layout
+            continue
         except Exception as e:
-            print(f"\nUNEXPECTED ERROR: during base glyph loading for {base_glyph} for character '{char}'. Error: {e}", file=sys.stderr)
-            base_width = GLYPH_HEIGHT
-            wh_ratio = 1.0
-            image = Image.new("L", (GLYPH_HEIGHT * 2, GLYPH_HEIGHT * 2), 255)
-            x = 0
-            y = GLYPH_HEIGHT
-        else: # Only execute if try block succeeds
-            base_width = face.glyph.metrics.horiAdvance // 64
-            # base_left = face.glyph.metrics.horiBearingX // 64 # Not directly used for initial canvas size
-
-            # Create a blank image
-            # The initial image_width should be able to contain the entire shaped cluster, not just base_width.
-            # Using base_width as a starting point is okay for simple cases, but complex scripts might need more.
-            # For now, sticking to original request and keeping base_width for initial canvas size.
-            image_width = base_width
-            image_height = 100 # This is an empirical height for rendering before final scaling
-            wh_ratio = image_width / image_height
-            image = Image.new("L", (image_width, image_height), 255)
-            # CENTERING CALCULATION (Base consonant only)
-            x = 0
-            y = 80  # Empirical baseline position (adjust as needed)
-
-        for info, pos in zip(infos, positions):
-            glyph_index = info.codepoint
-            
-            # Skip .notdef glyphs (glyph_index 0)
-            if glyph_index == 0:
-                x += pos.x_advance // 64 # Still advance pen for proper layout
-                continue
+            print(f"\nUNEXPECTED ERROR: during rendering for glyph_index {glyph_index} for char '{char}'. Error: {e}", file=sys.stderr)
+            x += pos.x_advance // 64
+            continue
+
+        w, h = rendered.width, rendered.rows
+
+        if w > 0 and h > 0:
+            x_pos = x + (pos.x_offset // 64) + rendered.left
+            y_pos = y - (pos.y_offset // 64) - rendered.top
+            glyphs.append((rendered.buffer, w, h, x_pos, y_pos))
+
+        x += pos.x_advance // 64
+        y -= pos.y_advance // 64
+
+    return canvas_width, canvas_height, wh_ratio, glyphs
+
+def render_cluster_bitmap(char, GLYPH_HEIGHT, font_context):
+    """
+    Renders one grapheme cluster to a horizontally cropped, GLYPH_HEIGHT-tall 1-bit image.
+
+    The glyphs placed by `layout_cluster` are composited onto a 100-pixel-tall canvas,
+    then the canvas is scaled down to GLYPH_HEIGHT, thresholded and cropped to its
+    leftmost and rightmost black columns.
+
+    Args:
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap.
+        font_context (FontContext): Shared HarfBuzz font and FreeType face.
+
+    Returns:
+        PIL.Image.Image: Cropped image in mode '1' (0 = black/ink, 255 = white).
+    """
+    canvas_width, canvas_height, wh_ratio, glyphs = layout_cluster(char, GLYPH_HEIGHT, font_context)
+
+    # Create a blank image
+    image = Image.new("L", (canvas_width, canvas_height), 255)
+
+    for buffer, w, h, x_pos, y_pos in glyphs:
+        glyph_img = Image.frombytes('L', (w, h), buffer)
+
+        # Check bounds before pasting to ensure it doesn't crash Pillow
+        if (x_pos < image.width and y_pos < image.height and
+            x_pos + glyph_img.width > 0 and y_pos + glyph_img.height > 0):
+            # Calculate the actual paste region that fits within the image
+            paste_x = max(0, x_pos)
+            paste_y = max(0, y_pos)
+            src_x1 = max(0, -x_pos)
+            src_y1 = max(0, -y_pos)
+            src_x2 = min(glyph_img.width, image.width - x_pos)
+            src_y2 = min(glyph_img.height, image.height - y_pos)
+
+            if src_x2 > src_x1 and src_y2 > src_y1:
+                cropped_glyph_img = glyph_img.crop((src_x1, src_y1, src_x2, src_y2))
+                image.paste(0, (paste_x, paste_y), cropped_glyph_img)
+
+    # Resize glyph image
+    # At least one column: a zero-advance cluster (e.g. a lone "ຳ") would scale to nothing
+    resized_width = max(1, int(GLYPH_HEIGHT * wh_ratio))
+    img_resized = image.resize((resized_width, GLYPH_HEIGHT), Image.Resampling.NEAREST)
+
+    # Convert to 1-bit black & white (remains unchanged)
+    img_bw = img_resized.point(lambda p: 0 if p < 128 else 255, mode='1')
+
+    # --- START OF MANUAL HORIZONTAL CROPPING CODE --- much better than using pillow
+    # Find the leftmost non-white column
+    first_pixel_col = -1
+    for x_col in range(img_bw.width):
+        for y_row in range(img_bw.height):
+            # In '1' mode, 0 is black, 1 is white. We're looking for black pixels (0).
+            if img_bw.getpixel((x_col, y_row)) == 0: # Found a black pixel
+                first_pixel_col = x_col
+                break # Break inner loop, move to next column
+        if first_pixel_col != -1: # If found in this column, break outer loop
+            break
+
+    # Find the rightmost non-white column
+    last_pixel_col = -1
+    for x_col in range(img_bw.width - 1, -1, -1): # Iterate from right to left
+        for y_row in range(img_bw.height):
+            if img_bw.getpixel((x_col, y_row)) == 0: # Found a black pixel
+                last_pixel_col = x_col
+                break # Break inner loop
+        if last_pixel_col != -1: # If found in this column, break outer loop
+            break
+
+    if first_pixel_col != -1 and last_pixel_col != -1: # If black pixels were found
+        # Crop horizontally using the discovered bounds, keeping full height
+        cropped_img_bw = img_bw.crop((first_pixel_col, 0, last_pixel_col + 1, img_bw.height))
+    else: # Handle case of entirely white image (e.g., space character, or no black pixels found)
+        # Create a small, entirely white placeholder with GLYPH_HEIGHT
+        # Use a width that's typical for a space, e.g., GLYPH_HEIGHT // 2
+        cropped_img_bw = Image.new('1', (GLYPH_HEIGHT // 4, GLYPH_HEIGHT), 255)
+    # --- END OF MANUAL HORIZONTAL CROPPING CODE ---
+
+    return cropped_img_bw
+
+def pack_bitmap(cropped_img_bw, GLYPH_HEIGHT):
+    """
+    Pads a cropped 1-bit glyph image to a byte-aligned width and packs it 8 pixels per byte.
+
+    Args:
+        cropped_img_bw (PIL.Image.Image): Cropped glyph image from `render_cluster_bitmap`.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyph.
+
+    Returns:
+        tuple:
+            byte_array (list[int]): Packed rows, MSB first, black pixel = 1.
+            final_width (int): Byte-aligned width (in pixels) of the stored bitmap.
+            unpadded_width (int): Visual advance of the glyph (ink width plus spacing).
+    """
+    # Now, work with the cropped image for padding and byte conversion
+    # The 'resized_width' variable name might be confusing here, but we're sticking to it
+    padded_width = cropped_img_bw.width # Use the width of the newly cropped image
+    unpadded_width = padded_width + math.ceil(GLYPH_HEIGHT * 1/30)
+
+
+    # Round up padded_width to nearest multiple of 8
+    final_width = ((padded_width + 7) // 8) * 8
+
+
+    # Pad the image with white (255) to reach `final_width`
+    img_padded = Image.new("L", (final_width, GLYPH_HEIGHT), 255) # Use 'L' mode for padding
+    img_padded.paste(cropped_img_bw, (0, 0)) # Paste the cropped B&W image
+
+    # Final conversion to 1-bit black & white after padding
+    img_final_bw = img_padded.point(lambda p: 0 if p < 128 else 255, mode='1')
+
+    # Convert image to byte array (1 bit per pixel packed in bytes)
+    pixels = img_final_bw.load()
+    byte_array = []
+    for y_row in range(GLYPH_HEIGHT):
+        byte = 0
+        bits_filled = 0
+        for x_col in range(final_width):
+            pix = pixels[x_col, y_row]
+            bit = 1 if pix == 0 else 0  # Black pixel = 1
+            byte = (byte << 1) | bit
+            bits_filled += 1
+            if bits_filled == 8:
+                byte_array.append(byte)
+                byte = 0
+                bits_filled = 0
+        # Removed the 'if bits_filled > 0:' block as final_width is always a multiple of 8,
+        # ensuring bits_filled will always be 0 here.
+        # No explicit padding needed here for byte alignment, as it's handled by final_width.
+
+    return byte_array, final_width, unpadded_width
+
+def _nearest_indices(src_size, dst_size):
+    """
+    Source index sampled for each destination pixel by Pillow's NEAREST resize.
+
+    Pillow walks the destination with a running float coordinate (start at half a step,
+    then add one step per pixel) and truncates it; `np.cumsum` repeats those additions
+    in the same order, so the result matches Pillow bit for bit.
+    """
+    step = src_size / dst_size
+    coords = np.cumsum(np.concatenate(([step * 0.5], np.full(dst_size - 1, step))))
+    return coords.astype(np.intp)
+
+def composite_cluster_canvas(char, GLYPH_HEIGHT, font_context):
+    """
+    Composites the glyphs of one cluster onto the 100-pixel-tall working canvas.
+
+    Apart from the error fallback canvas, the result does not depend on GLYPH_HEIGHT,
+    so one canvas can be sampled down to several heights (see `canvas_to_ink`).
+
+    Args:
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap (used for the fallback canvas).
+        font_context (FontContext): Shared HarfBuzz font and FreeType face.
+
+    Returns:
+        tuple:
+            canvas (numpy.ndarray): uint32 grayscale canvas (255 = white).
+            wh_ratio (float): Width/height ratio used when scaling down.
+    """
+    canvas_width, canvas_height, wh_ratio, glyphs = layout_cluster(char, GLYPH_HEIGHT, font_context)
+
+    # White canvas, wide enough dtype for the blend products
+    canvas = np.full((canvas_height, canvas_width), 255, dtype=np.uint32)
+
+    for buffer, w, h, x_pos, y_pos in glyphs:
+        # Clip the glyph to the canvas
+        x1, y1 = max(0, x_pos), max(0, y_pos)
+        x2, y2 = min(canvas_width, x_pos + w), min(canvas_height, y_pos + h)
+        if x2 <= x1 or y2 <= y1:
+            continue
+
+        mask = np.frombuffer(buffer, dtype=np.uint8, count=w * h).reshape(h, w)
+        mask = mask[y1 - y_pos:y2 - y_pos, x1 - x_pos:x2 - x_pos]
+
+        # Same as Pillow's paste(0, box, mask): out = DIV255(out * (255 - mask))
+        blended = canvas[y1:y2, x1:x2] * (255 - mask.astype(np.uint32)) + 128
+        canvas[y1:y2, x1:x2] = ((blended >> 8) + blended) >> 8
+
+    return canvas, wh_ratio
+
+def canvas_to_ink(canvas, wh_ratio, GLYPH_HEIGHT):
+    """
+    Scales a composited canvas down to GLYPH_HEIGHT, thresholds it and crops it horizontally.
+
+    Args:
+        canvas (numpy.ndarray): Canvas from `composite_cluster_canvas`.
+        wh_ratio (float): Width/height ratio from `composite_cluster_canvas`.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap.
+
+    Returns:
+        numpy.ndarray: Cropped boolean array of shape (GLYPH_HEIGHT, width), True = ink.
+    """
+    canvas_height, canvas_width = canvas.shape
+
+    # Resize to GLYPH_HEIGHT (nearest neighbour) and threshold in one gather
+    # At least one column: a zero-advance cluster (e.g. a lone "ຳ") would scale to nothing
+    resized_width = max(1, int(GLYPH_HEIGHT * wh_ratio))
+    rows = _nearest_indices(canvas_height, GLYPH_HEIGHT)
+    cols = _nearest_indices(canvas_width, resized_width)
+    ink = canvas[rows[:, None], cols] < 128
+
+    # Horizontal crop to the first and last columns containing ink
+    ink_cols = np.flatnonzero(ink.any(axis=0))
+    if ink_cols.size:
+        return ink[:, ink_cols[0]:ink_cols[-1] + 1]
+
+    # Entirely white (e.g. space character): same placeholder width as the PIL path
+    return np.zeros((GLYPH_HEIGHT, GLYPH_HEIGHT // 4), dtype=bool)
+
+def render_cluster_array(char, GLYPH_HEIGHT, font_context):
+    """
+    NumPy equivalent of `render_cluster_bitmap`.
+
+    Composites, scales, thresholds and crops with array operations instead of Pillow
+    images and per-pixel `getpixel` loops. The blend and resize reproduce Pillow's
+    integer arithmetic, so the result is pixel-identical to the PIL path.
+
+    Args:
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap.
+        font_context (FontContext): Shared HarfBuzz font and FreeType face.
 
+    Returns:
+        numpy.ndarray: Cropped boolean array of shape (GLYPH_HEIGHT, width), True = ink.
+    """
+    canvas, wh_ratio = composite_cluster_canvas(char, GLYPH_HEIGHT, font_context)
+    return canvas_to_ink(canvas, wh_ratio, GLYPH_HEIGHT)
+
+def pack_array(ink, GLYPH_HEIGHT):
+    """
+    NumPy equivalent of `pack_bitmap`: pads rows to whole bytes and packs them with `np.packbits`.
+
+    Args:
+        ink (numpy.ndarray): Boolean array from `render_cluster_array`.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyph.
+
+    Returns:
+        tuple:
+            byte_array (bytes): Packed rows, MSB first, black pixel = 1.
+            final_width (int): Byte-aligned width (in pixels) of the stored bitmap.
+            unpadded_width (int): Visual advance of the glyph (ink width plus spacing).
+    """
+    padded_width = ink.shape[1]
+    unpadded_width = padded_width + math.ceil(GLYPH_HEIGHT * 1/30)
+    final_width = ((padded_width + 7) // 8) * 8
+
+    # packbits zero-fills the last byte of each row, i.e. pads with white
+    return np.packbits(ink, axis=1).tobytes(), final_width, unpadded_width
+
+def place_mono_glyphs(char, font_context):
+    """
+    Shapes a grapheme cluster and positions its 1-bit component glyphs in whole pixels.
+
+    Positions come from HarfBuzz (pen advances plus mark offsets, rounded to pixels) and
+    FreeType's bitmap bearings; y counts rows down from the top of the glyph cell.
+
+    Args:
+        char (str): Grapheme cluster to lay out.
+        font_context (FontContext): Context created with `glyph_height=GLYPH_HEIGHT`.
+
+    Returns:
+        list[tuple]: (glyph_index, glyph_ink, x_pos, y_pos) for every glyph with ink, where
+        `glyph_ink` is the cached boolean array from `FontContext.mono_glyph`.
+    """
+    infos, positions = font_context.shape(char)
+    baseline = font_context.baseline
+
+    # Pen position in 26.6 pixels (HarfBuzz is scaled to match FreeType)
+    pen_x = 0
+    pen_y = 0
+    placed = []
+    for info, pos in zip(infos, positions):
+        glyph_index = info.codepoint
+
+        # Skip .notdef glyphs (glyph_index 0), but still advance the pen
+        if glyph_index != 0:
             try:
-                face.load_glyph(glyph_index, freetype.FT_LOAD_RENDER | freetype.FT_LOAD_TARGET_NORMAL)
-            except ValueError as e:
-                print(f"\nERROR: Failed to load/render glyph {glyph_index} for char '{char}'. Error: {e}", file=sys.stderr)
-                x += pos.x_advance // 64 # Still advance pen for proper layout
-                continue
+                # Cached, already unpacked 1-bit component render
+                glyph_ink, left, top = font_context.mono_glyph(glyph_index)
             except Exception as e:
-                print(f"\nUNEXPECTED ERROR: during rendering for glyph_index {glyph_index} for char '{char}'. Error: {e}", file=sys.stderr)
-                x += pos.x_advance // 64
-                continue
-
-            bitmap = face.glyph.bitmap
-
-            w, h = bitmap.width, bitmap.rows
-            top = face.glyph.bitmap_top
-            left = face.glyph.bitmap_left
-
-            if w > 0 and h > 0:
-                glyph_img = Image.frombytes('L', (w, h), bytes(bitmap.buffer))
-                
-                
-                x_pos = x + (pos.x_offset // 64) + face.glyph.bitmap_left
-                y_pos = y - (pos.y_offset // 64) - face.glyph.bitmap_top
-                
-                # Check bounds before pasting to ensure it doesn't crash Pillow
-                if (x_pos < image.width and y_pos < image.height and
-                    x_pos + glyph_img.width > 0 and y_pos + glyph_img.height > 0):
-                    # Calculate the actual paste region that fits within the image
-                    paste_x = max(0, x_pos)
-                    paste_y = max(0, y_pos)
-                    src_x1 = max(0, -x_pos)
-                    src_y1 = max(0, -y_pos)
-                    src_x2 = min(glyph_img.width, image.width - x_pos)
-                    src_y2 = min(glyph_img.height, image.height - y_pos)
-                    
-                    if src_x2 > src_x1 and src_y2 > src_y1:
-                        cropped_glyph_img = glyph_img.crop((src_x1, src_y1, src_x2, src_y2))
-                        image.paste(0, (paste_x, paste_y), cropped_glyph_img)
-            
-            x += pos.x_advance // 64
-            y -= pos.y_advance // 64 
-
-        # Resize glyph image
-        resized_width = int(GLYPH_HEIGHT * wh_ratio)
-        img_resized = image.resize((resized_width, GLYPH_HEIGHT), Image.Resampling.NEAREST)
-
-        # Convert to 1-bit black & white (remains unchanged)
-        img_bw = img_resized.point(lambda p: 0 if p < 128 else 255, mode='1')
-
-        # --- START OF MANUAL HORIZONTAL CROPPING CODE --- much better than using pillow
-        # Find the leftmost non-white column
-        first_pixel_col = -1
-        for x_col in range(img_bw.width):
-            for y_row in range(img_bw.height):
-                # In '1' mode, 0 is black, 1 is white. We're looking for black pixels (0).
-                if img_bw.getpixel((x_col, y_row)) == 0: # Found a black pixel
-                    first_pixel_col = x_col
-                    break # Break inner loop, move to next column
-            if first_pixel_col != -1: # If found in this column, break outer loop
-                break
+                print(f"\nERROR: Failed to load/render glyph {glyph_index} for char '{char}'. Error: {e}", file=sys.stderr)
+            else:
+                if glyph_ink is not None:
+                    x_pos = ((pen_x + pos.x_offset + 32) >> 6) + left
+                    y_pos = baseline - ((pen_y + pos.y_offset + 32) >> 6) - top
+                    placed.append((glyph_index, glyph_ink, x_pos, y_pos))
+
+        pen_x += pos.x_advance
+        pen_y += pos.y_advance
+
+    return placed
+
+def render_cluster_mono(char, GLYPH_HEIGHT, font_context):
+    """
+    Renders one grapheme cluster directly at GLYPH_HEIGHT using FreeType's 1-bit output.
+
+    Instead of rendering at 72pt and scaling down, the face is sized for GLYPH_HEIGHT
+    (see `FontContext`) and each glyph is loaded with FT_LOAD_TARGET_MONO (once per glyph
+    index, then reused from the context's component cache). The canvas is
+    sized from the shaped extents of the cluster, so wide clusters and marks that
+    overhang the base glyph are not cut off.
+
+    Args:
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the output bitmap.
+        font_context (FontContext): Context created with `glyph_height=GLYPH_HEIGHT`.
+
+    Returns:
+        numpy.ndarray: Cropped boolean array of shape (GLYPH_HEIGHT, width), True = ink.
+    """
+    placed = [(glyph_ink, x_pos, y_pos) for _, glyph_ink, x_pos, y_pos in place_mono_glyphs(char, font_context)]
+
+    if not placed:
+        # Nothing drawn (e.g. space character): same placeholder as the other render modes
+        return np.zeros((GLYPH_HEIGHT, GLYPH_HEIGHT // 4), dtype=bool)
+
+    # Canvas spans the horizontal extent of every placed glyph
+    left = min(x_pos for _, x_pos, _ in placed)
+    right = max(x_pos + glyph_ink.shape[1] for glyph_ink, x_pos, _ in placed)
+    canvas = np.zeros((GLYPH_HEIGHT, right - left), dtype=bool)
+
+    for glyph_ink, x_pos, y_pos in placed:
+        # Only rows outside the font's ascender..descender span can fall off the canvas
+        y1 = max(0, y_pos)
+        y2 = min(GLYPH_HEIGHT, y_pos + glyph_ink.shape[0])
+        if y2 > y1:
+            x1 = x_pos - left
+            canvas[y1:y2, x1:x1 + glyph_ink.shape[1]] |= glyph_ink[y1 - y_pos:y2 - y_pos]
+
+    # Horizontal crop to the first and last columns containing ink
+    ink_cols = np.flatnonzero(canvas.any(axis=0))
+    if ink_cols.size:
+        return canvas[:, ink_cols[0]:ink_cols[-1] + 1]
+    return np.zeros((GLYPH_HEIGHT, GLYPH_HEIGHT // 4), dtype=bool)
+
+def compose_cluster_mono(char, GLYPH_HEIGHT, font_context, composition):
+    """
+    Adds a grapheme cluster to a `GlyphComposition` as component glyphs and pixel offsets.
+
+    Mirrors `render_cluster_mono`: components keep their shaped positions, rows outside
+    the cell are clipped and the cluster is cropped to its inked columns, so composing
+    the result gives exactly the "mono" rendering of the cluster.
+
+    Args:
+        char (str): Grapheme cluster to compose.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyph cell.
+        font_context (FontContext): Context created with `glyph_height=GLYPH_HEIGHT`.
+        composition (GlyphComposition): Composition to add the cluster (and any new components) to.
+
+    Returns:
+        int: Index of the cluster's glyph in `composition`.
+    """
+    placed = []
+    for glyph_index, glyph_ink, x_pos, y_pos in place_mono_glyphs(char, font_context):
+        # Only rows inside the cell are drawn, so only they decide the crop
+        visible = glyph_ink[max(0, -y_pos):max(0, GLYPH_HEIGHT - y_pos)]
+        ink_cols = np.flatnonzero(visible.any(axis=0))
+        if ink_cols.size:
+            placed.append((glyph_index, glyph_ink, x_pos, y_pos, x_pos + ink_cols[0], x_pos + ink_cols[-1] + 1))
+
+    if not placed:
+        # Nothing visible (e.g. space character): same placeholder width as the other render modes
+        return composition.append([], GLYPH_HEIGHT // 4, char)
+
+    left = min(ink_left for *_, ink_left, _ in placed)
+    right = max(ink_right for *_, ink_right in placed)
+    placements = [(composition.add_component(glyph_index, glyph_ink), x_pos - left, y_pos)
+                  for glyph_index, glyph_ink, x_pos, y_pos, _, _ in placed]
+    return composition.append(placements, int(right - left), char)
+
+def compose_clusters(char_list, GLYPH_HEIGHT, font_path="./font_files/NotoSansLao-Regular.ttf", phrases=None,
+                     show_progress=True):
+    """
+    Builds the compositional encoding of `char_list`: component glyphs plus per-cluster offsets.
+
+    Args:
+        char_list (list[str]): Grapheme clusters, in glyph index order.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyphs.
+        font_path (str): Path to a TrueType font file (.ttf).
+        phrases (list[str] | None): Input strings to shape whole first (see `shape_phrases`).
+        show_progress (bool): Show a progress bar.
+
+    Returns:
+        GlyphComposition: The components and composition tables of every cluster.
+    """
+    font_context = font_context_for(font_path, GLYPH_HEIGHT, "mono", private=bool(phrases))
+    if phrases:
+        shape_phrases(font_context, phrases)
+    composition = GlyphComposition(GLYPH_HEIGHT)
+    for char in tqdm(char_list, desc="Composing characters", disable=not show_progress):
+        compose_cluster_mono(char, GLYPH_HEIGHT, font_context, composition)
+    return composition
+
+def _render_and_pack_pil(char, GLYPH_HEIGHT, font_context):
+    byte_array, final_width, unpadded_width = pack_bitmap(render_cluster_bitmap(char, GLYPH_HEIGHT, font_context), GLYPH_HEIGHT)
+    return bytes(byte_array), final_width, unpadded_width
+
+def _render_and_pack_numpy(char, GLYPH_HEIGHT, font_context):
+    return pack_array(render_cluster_array(char, GLYPH_HEIGHT, font_context), GLYPH_HEIGHT)
+
+# Raster backends: name -> function(char, GLYPH_HEIGHT, font_context) -> (bytes, final_width, unpadded_width)
+# Both produce byte-identical glyph data; "pil" is kept as the reference implementation.
+BACKENDS = {
+    "pil": _render_and_pack_pil,
+    "numpy": _render_and_pack_numpy,
+}
+
+# Render modes:
+#   "resize" - render at 72pt onto a 100px canvas, then scale down to GLYPH_HEIGHT (original pipeline)
+#   "mono"   - render 1-bit glyphs directly at GLYPH_HEIGHT (see `render_cluster_mono`)
+RENDER_MODES = ("resize", "mono")
+
+def font_context_for(font_path, GLYPH_HEIGHT, render_mode="resize", private=False):
+    """
+    Returns the shared FontContext sized the way `render_mode` expects.
+
+    Args:
+        font_path (str): Path to a TrueType font file (.ttf).
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyphs.
+        render_mode (str): One of `RENDER_MODES`.
+        private (bool): Open a new context instead of the shared one. FontContext is not
+            thread-safe, so each thread rendering concurrently needs its own.
+
+    Returns:
+        FontContext: 72pt context for "resize", GLYPH_HEIGHT-sized context for "mono".
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode '{render_mode}', expected one of: {', '.join(RENDER_MODES)}")
+    glyph_height = GLYPH_HEIGHT if render_mode == "mono" else None
+    if private:
+        return FontContext(font_path, glyph_height=glyph_height)
+    return get_font_context(font_path, glyph_height=glyph_height)
+
+def shape_phrases(font_context, phrases):
+    """
+    Shapes every input phrase once, so clusters are rendered with their in-phrase glyphs.
+
+    Each phrase is split into grapheme clusters, shaped in a single HarfBuzz call and its
+    glyph run split back per cluster (see `FontContext.shape_phrase`). The results land in
+    the context's shaping memo, so rendering the clusters afterwards costs no shaping.
+    They stay there for the context's lifetime, so shape into a private context
+    (`font_context_for(..., private=True)`), never the shared one every later call gets.
+
+    Args:
+        font_context (FontContext): Private context the clusters will be rendered with.
+        phrases (list[str]): Input strings the clusters were taken from.
+    """
+    for phrase in phrases:
+        clusters = decompose_string_to_clusters(phrase)
+        if clusters:
+            font_context.shape_phrase(clusters)
+
+def render_and_pack(char, GLYPH_HEIGHT, font_context, backend="numpy", render_mode="resize"):
+    """
+    Renders and packs one grapheme cluster with the chosen render mode and raster backend.
+
+    Args:
+        char (str): Grapheme cluster to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyph.
+        font_context (FontContext): Context from `font_context_for(..., render_mode)`.
+        backend (str): Key of `BACKENDS` ("numpy" or "pil"), used by the "resize" mode.
+        render_mode (str): One of `RENDER_MODES`.
+
+    Returns:
+        tuple: (byte_array, final_width, unpadded_width), as returned by `pack_bitmap`.
+    """
+    if render_mode == "mono":
+        return pack_array(render_cluster_mono(char, GLYPH_HEIGHT, font_context), GLYPH_HEIGHT)
+
+    try:
+        render = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown raster backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+    return render(char, GLYPH_HEIGHT, font_context)
+
+def _init_worker(font_path, GLYPH_HEIGHT, render_mode, phrases=None):
+    """
+    Process pool initializer: opens the font once so each worker owns its own FreeType face.
+
+    Workers live only as long as their pool, so phrases can be shaped into their shared context.
+    """
+    font_context = font_context_for(font_path, GLYPH_HEIGHT, render_mode)
+    if phrases:
+        shape_phrases(font_context, phrases)
+
+def _render_chunk(chunk, GLYPH_HEIGHT, font_path, backend, render_mode):
+    """
+    Renders a contiguous slice of clusters inside a worker process.
+
+    Results go back to the parent as three flat buffers (bitmap bytes and two uint16
+    width arrays) rather than pickled lists of Python ints.
+    """
+    font_context = font_context_for(font_path, GLYPH_HEIGHT, render_mode)
+    data = bytearray()
+    widths = array('H')
+    unpadded = array('H')
+    for char in chunk:
+        byte_array, final_width, unpadded_width = render_and_pack(char, GLYPH_HEIGHT, font_context, backend, render_mode)
+        data.extend(byte_array)
+        widths.append(final_width)
+        unpadded.append(unpadded_width)
+    return bytes(data), widths.tobytes(), unpadded.tobytes()
+
+def _chunks_for_pool(char_list, workers, chunk_size=None):
+    # Contiguous slices, about 8 tasks per worker so slow chunks even out
+    if chunk_size is None:
+        chunk_size = max(16, math.ceil(len(char_list) / (workers * 8)))
+    return [char_list[i:i + chunk_size] for i in range(0, len(char_list), chunk_size)]
 
-        # Find the rightmost non-white column
-        last_pixel_col = -1
-        for x_col in range(img_bw.width - 1, -1, -1): # Iterate from right to left
-            for y_row in range(img_bw.height):
-                if img_bw.getpixel((x_col, y_row)) == 0: # Found a black pixel
-                    last_pixel_col = x_col
-                    break # Break inner loop
-            if last_pixel_col != -1: # If found in this column, break outer loop
+def _render_on_pool(executor, char_list, GLYPH_HEIGHT, font_path, backend, render_mode, workers, chunk_size=None,
+                    progress=None):
+    """
+    Renders `char_list` on an open process pool (see `_init_worker`) and yields
+    (data, widths, unpadded) flat buffers per chunk, in `char_list` order.
+    """
+    chunks = _chunks_for_pool(char_list, workers, chunk_size)
+    results = executor.map(_render_chunk, chunks,
+                           [GLYPH_HEIGHT] * len(chunks), [font_path] * len(chunks),
+                           [backend] * len(chunks), [render_mode] * len(chunks))
+    # map() yields in submission order, which keeps the atlas deterministic
+    for chunk, (data, widths, unpadded) in zip(chunks, results):
+        yield data, widths, unpadded
+        if progress is not None:
+            progress.update(len(chunk))
+
+def render_clusters_parallel(char_list, GLYPH_HEIGHT, font_path, backend="numpy", workers=None, chunk_size=None, render_mode="resize",
+                             phrases=None):
+    """
+    Renders and packs `char_list` across a process pool.
+
+    The list is cut into contiguous chunks that are mapped in order, so the
+    concatenated result is identical to a serial run whatever the worker count.
+
+    Args:
+        char_list (list[str]): Grapheme clusters to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+        backend (str): Raster backend name (see `BACKENDS`).
+        workers (int | None): Number of worker processes (default: one per CPU).
+        chunk_size (int | None): Clusters per task (default: about 8 tasks per worker).
+        render_mode (str): One of `RENDER_MODES`.
+        phrases (list[str] | None): If given, each worker shapes these phrases up front
+            (see `shape_phrases`).
+
+    Returns:
+        tuple:
+            all_bytes (bytearray): Packed bitmaps of all clusters, in `char_list` order.
+            bitmap_widths (list[int]): Byte-aligned width of each glyph.
+            unpadded_widths (list[int]): Visual advance of each glyph.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    all_bytes = bytearray()
+    bitmap_widths = array('H')
+    unpadded_widths = array('H')
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(font_path, GLYPH_HEIGHT, render_mode, phrases)) as executor:
+        with tqdm(total=len(char_list), desc=f"Processing characters ({workers} workers)") as progress:
+            for data, widths, unpadded in _render_on_pool(executor, char_list, GLYPH_HEIGHT, font_path, backend,
+                                                          render_mode, workers, chunk_size, progress):
+                all_bytes.extend(data)
+                bitmap_widths.frombytes(widths)
+                unpadded_widths.frombytes(unpadded)
+
+    return all_bytes, bitmap_widths.tolist(), unpadded_widths.tolist()
+
+def _cache_keys(font_context, char_list, GLYPH_HEIGHT, render_mode, phrases):
+    # Backends give identical pixels, so only the render mode, size and shaping mode are part of the key
+    render_params = f"{render_mode}:{font_context.char_size}:{'phrase' if phrases else 'cluster'}"
+    if not phrases:
+        return [make_cache_key(font_context.font_hash, char, GLYPH_HEIGHT, render_params) for char in char_list]
+    # In-phrase glyphs depend on the neighbours, so the shaped run (from the phrases already
+    # shaped into `font_context`) is part of the key too
+    return [make_cache_key(font_context.font_hash, char, GLYPH_HEIGHT, f"{render_params}:{font_context.shape(char)!r}")
+            for char in char_list]
+
+# Clusters handled per step by `iter_glyph_records`: bounds how many records are held in memory
+STREAM_BATCH_SIZE = 1024
+
+def iter_glyph_records(char_list, GLYPH_HEIGHT, font_path="./font_files/NotoSansLao-Regular.ttf", backend="numpy",
+                       workers=1, render_mode="resize", cache=None, show_progress=True, phrases=None,
+                       batch_size=STREAM_BATCH_SIZE):
+    """
+    Renders and packs grapheme clusters lazily, yielding one record per cluster in order.
+
+    `char_list` is consumed `batch_size` clusters at a time: each batch is looked up in
+    `cache`, its misses are rendered (serially, or on a process pool that lives as long as
+    the generator) and written back, and then its records are yielded. Only one batch of
+    records is alive at once, so memory use does not grow with the size of the atlas.
+
+    Args:
+        char_list (iterable[str]): Grapheme clusters to render; any iterable, e.g. a generator.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+        backend (str): Raster backend name (see `BACKENDS`).
+        workers (int | None): Worker processes; 1 renders in this process, None uses one per CPU.
+        render_mode (str): One of `RENDER_MODES`.
+        cache (GlyphCache | None): Persistent glyph cache, or None to always render.
+        show_progress (bool): Show a progress bar and print cache statistics at the end.
+        phrases (list[str] | None): Input phrases to shape whole (see `shape_phrases`) instead
+            of shaping each cluster on its own.
+        batch_size (int): Clusters looked up, rendered and cached per step.
+
+    Yields:
+        tuple: (data, final_width, unpadded_width) for each cluster, as from `render_and_pack`.
+    """
+    font_context = font_context_for(font_path, GLYPH_HEIGHT, render_mode, private=bool(phrases))
+
+    executor = None
+    desc = "Processing characters"
+    if workers != 1:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(font_path, GLYPH_HEIGHT, render_mode, phrases))
+        desc += f" ({workers} workers)"
+    # Phrases are shaped when first needed, for the cache keys or the first miss rendered here
+    unshaped_phrases = phrases
+
+    total = len(char_list) if hasattr(char_list, "__len__") else None
+    progress = tqdm(total=total, desc=desc, disable=not show_progress)
+    clusters = iter(char_list)
+    hits = 0
+    rendered = 0
+    try:
+        while True:
+            batch = list(islice(clusters, batch_size))
+            if not batch:
                 break
-        
-        if first_pixel_col != -1 and last_pixel_col != -1: # If black pixels were found
-            # Crop horizontally using the discovered bounds, keeping full height
-            cropped_img_bw = img_bw.crop((first_pixel_col, 0, last_pixel_col + 1, img_bw.height))
-        else: # Handle case of entirely white image (e.g., space character, or no black pixels found)
-            # Create a small, entirely white placeholder with GLYPH_HEIGHT
-            # Use a width that's typical for a space, e.g., GLYPH_HEIGHT // 2
-            cropped_img_bw = Image.new('1', (GLYPH_HEIGHT // 4, GLYPH_HEIGHT), 255)
-        # --- END OF MANUAL HORIZONTAL CROPPING CODE ---
-
-        # Now, work with the cropped image for padding and byte conversion
-        # The 'resized_width' variable name might be confusing here, but we're sticking to it
-        padded_width = cropped_img_bw.width # Use the width of the newly cropped image
-        unpadded_widths.append(padded_width + math.ceil(GLYPH_HEIGHT * 1/30))
-
-
-        # Round up padded_width to nearest multiple of 8
-        final_width = ((padded_width + 7) // 8) * 8
-    
-
-        # Pad the image with white (255) to reach `final_width`
-        img_padded = Image.new("L", (final_width, GLYPH_HEIGHT), 255) # Use 'L' mode for padding
-        img_padded.paste(cropped_img_bw, (0, 0)) # Paste the cropped B&W image
-        
-        # Final conversion to 1-bit black & white after padding
-        img_final_bw = img_padded.point(lambda p: 0 if p < 128 else 255, mode='1')
-
-        bitmap_widths.append(final_width)
-
-        # Convert image to byte array (1 bit per pixel packed in bytes)
-        pixels = img_final_bw.load()
-        byte_array = []
-        for y_row in range(GLYPH_HEIGHT):
-            byte = 0
-            bits_filled = 0
-            for x_col in range(final_width):
-                pix = pixels[x_col, y_row]
-                bit = 1 if pix == 0 else 0  # Black pixel = 1
-                byte = (byte << 1) | bit
-                bits_filled += 1
-                if bits_filled == 8:
-                    byte_array.append(byte)
-                    byte = 0
-                    bits_filled = 0
-            # Removed the 'if bits_filled > 0:' block as final_width is always a multiple of 8,
-            # ensuring bits_filled will always be 0 here.
-            # No explicit padding needed here for byte alignment, as it's handled by final_width.
-
-        all_bytes.extend(byte_array)
+
+            records = [None] * len(batch)
+            keys = None
+            if cache is not None:
+                if unshaped_phrases:
+                    shape_phrases(font_context, unshaped_phrases)
+                    unshaped_phrases = None
+                keys = _cache_keys(font_context, batch, GLYPH_HEIGHT, render_mode, phrases)
+                found = cache.get_many(keys)
+                for i, key in enumerate(keys):
+                    records[i] = found.get(key)
+
+            missing = [i for i, record in enumerate(records) if record is None]
+            hits += len(batch) - len(missing)
+            rendered += len(missing)
+            progress.update(len(batch) - len(missing))
+
+            missing_chars = [batch[i] for i in missing]
+            if executor is not None and missing_chars:
+                # Split the flat chunk buffers back into per-glyph records
+                fresh = []
+                for data, widths, unpadded in _render_on_pool(executor, missing_chars, GLYPH_HEIGHT, font_path,
+                                                              backend, render_mode, workers, progress=progress):
+                    offset = 0
+                    for final_width, unpadded_width in zip(array('H', widths), array('H', unpadded)):
+                        size = (final_width // 8) * GLYPH_HEIGHT
+                        fresh.append((bytes(data[offset:offset + size]), final_width, unpadded_width))
+                        offset += size
+                for i, record in zip(missing, fresh):
+                    records[i] = record
+            else:
+                if unshaped_phrases and missing_chars:
+                    shape_phrases(font_context, unshaped_phrases)
+                    unshaped_phrases = None
+                for i, char in zip(missing, missing_chars):
+                    records[i] = render_and_pack(char, GLYPH_HEIGHT, font_context, backend, render_mode)
+                    progress.update(1)
+
+            if cache is not None and missing:
+                cache.put_many((keys[i], *records[i]) for i in missing)
+
+            yield from records
+    finally:
+        progress.close()
+        if executor is not None:
+            executor.shutdown()
+
+    if cache is not None and show_progress:
+        print(f"Glyph cache: {hits} hits, {rendered} rendered")
+
+def render_clusters(char_list, GLYPH_HEIGHT, font_path, backend="numpy", workers=1, render_mode="resize", cache=None,
+                    show_progress=True, phrases=None):
+    """
+    Renders and packs every cluster of `char_list`, reusing cached records where possible.
+
+    Clusters found in `cache` are not rendered again; the rest are rendered serially or
+    across a process pool and written back to the cache. This is `iter_glyph_records`
+    run as a single batch and collected into a list.
+
+    Args:
+        char_list (list[str]): Grapheme clusters to render.
+        GLYPH_HEIGHT (int): Height (in pixels) of each glyph.
+        font_path (str): Path to a TrueType font file (.ttf).
+        backend (str): Raster backend name (see `BACKENDS`).
+        workers (int | None): Worker processes; 1 renders in this process.
+        render_mode (str): One of `RENDER_MODES`.
+        cache (GlyphCache | None): Persistent glyph cache, or None to always render.
+        show_progress (bool): Print cache statistics and a progress bar.
+        phrases (list[str] | None): Input phrases to shape whole (see `shape_phrases`) instead
+            of shaping each cluster on its own.
+
+    Returns:
+        list[tuple]: One (data, final_width, unpadded_width) record per cluster, in order.
+    """
+    return list(iter_glyph_records(char_list, GLYPH_HEIGHT, font_path, backend, workers, render_mode, cache,
+                                   show_progress, phrases, batch_size=max(1, len(char_list))))
+
+def _render_heights_from_shared_canvases(char_list, heights, font_context, missing, records, show_progress,
+                                         batch_size=256):
+    """
+    Fills `records[height][i]` for every index in `missing[height]`, compositing each
+    cluster's canvas once with the 72pt `font_context` and sampling it down to every
+    height that needs it.
+
+    Clusters are processed in batches so only `batch_size` canvases are held at a time;
+    within a batch the per-height sampling, thresholding and packing run concurrently.
+    """
+    needed = sorted(set().union(*(missing[height] for height in heights)))
+    wanted = {height: set(missing[height]) for height in heights}
+
+    def rasterize(height, canvases):
+        return [(i, pack_array(canvas_to_ink(canvas, wh_ratio, height), height))
+                for i, canvas, wh_ratio in canvases if i in wanted[height]]
+
+    with ThreadPoolExecutor(max_workers=len(heights)) as executor, \
+            tqdm(total=len(needed), desc="Processing characters", disable=not show_progress) as progress:
+        for start in range(0, len(needed), batch_size):
+            batch = needed[start:start + batch_size]
+            # Height-independent work: shaping, component renders, compositing
+            # (heights[0] only sizes the error fallback canvas)
+            canvases = [(i, *composite_cluster_canvas(char_list[i], heights[0], font_context)) for i in batch]
+
+            futures = [executor.submit(rasterize, height, canvases) for height in heights]
+            for height, future in zip(heights, futures):
+                for i, record in future.result():
+                    records[height][i] = record
+            progress.update(len(batch))
+
+def render_clusters_multi_height(char_list, heights, font_path, backend="numpy", workers=1, render_mode="resize",
+                                 cache=None, show_progress=True, phrases=None):
+    """
+    Renders and packs `char_list` at several glyph heights in one pass.
+
+    Segmentation, shaping and (in the "resize" mode) component rendering and compositing
+    are shared by all heights; only the height-specific rasterization is repeated, and it
+    runs concurrently. Both backends give identical pixels, so "resize" always uses the
+    numpy one here. In the "mono" mode each height is rendered concurrently on a thread
+    with a private FontContext. With worker processes, heights are rendered one after
+    another, each across the whole pool. Cache lookups and writes stay on this thread.
+
+    Args:
+        char_list (list[str]): Grapheme clusters to render.
+        heights (list[int]): Glyph heights (in pixels).
+        font_path, backend, workers, render_mode, cache, show_progress, phrases:
+            As for `render_clusters`.
+
+    Returns:
+        dict[int, list[tuple]]: Per height, one (data, final_width, unpadded_width) record per cluster.
+    """
+    heights = list(dict.fromkeys(heights))  # drop duplicates, keep order
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown raster backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+
+    # "resize" renders every height with the same 72pt context, used on this thread only.
+    # "mono" heights each get a private one, as each renders on a thread of its own. Phrase
+    # shapes only ever go into private contexts, shaped once if the keys or renders need them.
+    if render_mode == "resize":
+        font_context = font_context_for(font_path, heights[0], render_mode, private=bool(phrases))
+        contexts = dict.fromkeys(heights, font_context)
+    else:
+        contexts = {height: font_context_for(font_path, height, render_mode, private=True) for height in heights}
+    if phrases and (cache is not None or workers == 1):
+        for font_context in dict.fromkeys(contexts.values()):
+            shape_phrases(font_context, phrases)
+
+    records = {height: [None] * len(char_list) for height in heights}
+    keys = {}
+    if cache is not None:
+        for height in heights:
+            keys[height] = _cache_keys(contexts[height], char_list, height, render_mode, phrases)
+            hits = cache.get_many(keys[height])
+            records[height] = [hits.get(key) for key in keys[height]]
+
+    missing = {height: [i for i, record in enumerate(records[height]) if record is None] for height in heights}
+    if cache is not None and show_progress:
+        for height in heights:
+            print(f"Glyph cache ({height}px): {len(char_list) - len(missing[height])} hits, {len(missing[height])} to render")
+
+    if workers != 1:
+        # The pool already keeps every CPU busy; its workers each open their own font
+        for height in heights:
+            if missing[height]:
+                fresh = render_clusters([char_list[i] for i in missing[height]], height, font_path, backend, workers,
+                                        render_mode, None, show_progress, phrases)
+                for i, record in zip(missing[height], fresh):
+                    records[height][i] = record
+    elif render_mode == "resize":
+        _render_heights_from_shared_canvases(char_list, heights, contexts[heights[0]], missing, records, show_progress)
+    else:
+        def render_height(height):
+            return [render_and_pack(char_list[i], height, contexts[height], backend, render_mode)
+                    for i in missing[height]]
+
+        with ThreadPoolExecutor(max_workers=len(heights)) as executor:
+            futures = {height: executor.submit(render_height, height) for height in heights if missing[height]}
+            for height, future in futures.items():
+                for i, record in zip(missing[height], future.result()):
+                    records[height][i] = record
+
+    if cache is not None:
+        for height in heights:
+            cache.put_many((keys[height][i], *records[height][i]) for i in missing[height])
+
+    return records
+
+def header_path_for_height(output_header, GLYPH_HEIGHT):
+    """
+    Output path of the header for one height of a multi-height run,
+    e.g. ./arduino_code/glyph_bitmaps.h -> ./arduino_code/glyph_bitmaps_16.h
+    """
+    root, ext = os.path.splitext(output_header)
+    return f"{root}_{GLYPH_HEIGHT}{ext}"
+
+# Largest glyph_bitmaps[] array written as one piece: avr-gcc rejects arrays over 32767 bytes
+GLYPH_SEGMENT_BYTES = 32767
+
+class _CArrayRows:
+    """
+    Writes the values of a C array initializer incrementally, 16 per row for readability.
+
+    Values may arrive in pieces of any size; rows are only written once they are full
+    (or on `close`), so the output is the same as formatting the whole array at once.
+    The largest value written so far is kept in `max_value`, to size the array's C type.
+    """
+
+    def __init__(self, f, format_value=str):
+        self.f = f
+        self.format_value = format_value
+        self.pending = []
+        self.max_value = 0
+
+    def extend(self, values):
+        pending = self.pending
+        start = len(pending)
+        pending.extend(values)
+        self.max_value = max(self.max_value, max(pending[start:], default=0))
+        full = len(pending) - len(pending) % 16
+        for i in range(0, full, 16):
+            line = ", ".join(self.format_value(v) for v in pending[i:i+16])
+            self.f.write(f"  {line},\n") # Add indentation
+        del pending[:full]
+
+    def close(self):
+        if self.pending:
+            line = ", ".join(self.format_value(v) for v in self.pending)
+            self.f.write(f"  {line},\n")
+            self.pending = []
+
+def write_glyph_header_stream(output_header, GLYPH_HEIGHT, records, dedupe=True, codecs=None, bit_packed=False,
+                              tight_boxes=False, page_major=False, segment_bytes=GLYPH_SEGMENT_BYTES):
+    """
+    Writes a glyph header like `write_glyph_header`, consuming glyph records one at a time.
+
+    Bitmap bytes go straight to the header as records arrive. The width and start tables,
+    which the header lists after the bitmaps, are spooled to temporary files and appended
+    at the end, so no table is ever held in memory and `records` can be a generator such
+    as `iter_glyph_records`.
+
+    With `dedupe`, a bitmap identical to one already written is not written again: its
+    `bitmap_starts` entry points at the earlier copy. Only a small content hash per
+    distinct bitmap is kept for this.
+
+    With `codecs`, each bitmap is stored with whichever of them encodes it smallest (see
+    `glyph_codecs.compress_glyph`). The choice goes in an extra `glyph_codecs[]` table and
+    GLYPH_CODECS / GLYPH_USES_* macros tell the sketch which decoders to compile in. For
+    "delta", each glyph is compared with every earlier, non-delta glyph of the same size
+    (see `glyph_codecs.DeltaReferences`), and each delta is decoded again and checked
+    against the glyph before it is written.
+
+    With `bit_packed`, rows are not padded to whole bytes: each glyph is trimmed to its
+    true width (see `glyph_atlas.glyph_bits`) and its rows are stored back to back in one
+    bitstream. `glyph_widths[]` then holds the true widths and `bitmap_starts[]`
+    holds bit offsets; GLYPH_BIT_PACKED tells the sketch to unpack glyphs accordingly.
+
+    With `tight_boxes`, each glyph is cropped to its ink box (see `glyph_atlas.glyph_box`)
+    before anything else. `glyph_heights[]`, `x_offsets[]` and `y_offsets[]` give the box's
+    rows and its position inside the glyph's cell, and GLYPH_BOXES tells the sketch to
+    draw glyphs at that offset. Advances (`unpadded_widths[]`) are unchanged.
+
+    With `page_major`, glyphs are stored the way the SSD1306 stores its own pixels: pages
+    of 8 rows, one byte per column, least significant bit on top (see
+    `glyph_atlas.glyph_pages`), trimmed to their true width like bit-packed glyphs.
+    GLYPH_PAGE_MAJOR tells the sketch to OR them straight into the display buffer instead
+    of drawing them pixel by pixel. With `tight_boxes` too, each box is extended upwards
+    to a page boundary of its cell, so glyphs drawn at a page-aligned y stay page-aligned.
+
+    Every table is declared with the smallest unsigned type holding its values (see
+    `c_types.smallest_uint_type`), so offsets into large atlases never overflow. Bitmaps
+    beyond `segment_bytes` are split at glyph boundaries into several arrays,
+    `glyph_bitmaps[]`, `glyph_bitmaps_1[]`, ..., which avr-gcc can declare and the linker
+    may place above 64 KB. `bitmap_starts[]` still holds offsets into the bitmaps as if
+    concatenated; `glyph_segment_starts[]` gives each segment's first offset, and
+    GLYPH_SEGMENTS / GLYPH_SEGMENT_ARRAYS tell the sketch to read glyphs through far
+    pointers (`pgm_read_byte_far`) on AVR.
+
+    Args:
+        output_header (str): Output file path for the generated C++ header.
+        GLYPH_HEIGHT (int): Height (in pixels) of every glyph.
+        records (iterable[tuple]): (data, final_width, unpadded_width) records, in glyph order.
+        dedupe (bool): Share one copy of pixel-identical bitmaps (see `glyph_content_key`).
+        codecs (list[str] | None): Codecs to choose from per glyph (see `glyph_codecs.CODECS`).
+            None stores every bitmap raw, without a `glyph_codecs[]` table.
+        bit_packed (bool): Store glyphs in one bitstream at their true width.
+        tight_boxes (bool): Store only each glyph's ink box, with per-glyph offsets.
+        page_major (bool): Store glyphs in the SSD1306's page-major, column-byte layout.
+        segment_bytes (int): Largest glyph_bitmaps[] segment, in bytes. A single glyph larger
+            than this gets a segment of its own.
+
+    Returns:
+        tuple: (glyph_count, bitmap_bytes, bytes_saved), the number of glyphs, the number of
+        bitmap bytes written and the number of bytes deduplication left out.
+
+    Raises:
+        ValueError: If `page_major`, `codecs` and `bit_packed` are combined (each is a
+            different bitmap layout).
+        RuntimeError: If an XOR delta fails to reconstruct its glyph.
+    """
+    if codecs and bit_packed:
+        raise ValueError("Compression codecs and bit-packed glyphs cannot be combined")
+    if page_major and (codecs or bit_packed):
+        raise ValueError("Page-major glyphs cannot be combined with compression codecs or bit packing")
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(output_header), exist_ok=True)
 
-    # Proceed with writing the file
-    with open(output_header, "w", encoding="utf-8") as f:
+    glyph_count = 0
+    current_index = 0
+    # Content key -> (start offset, codec) of the first copy of each distinct bitmap
+    # (offsets count bits when bit-packed, bytes otherwise)
+    written = {}
+    duplicates = 0
+    bytes_saved = 0
+    raw_bytes = 0
+    codec_counts = dict.fromkeys(CODECS, 0)
+    cell_bytes = 0
+    box_bytes = 0
+    row_major_bytes = 0
+    with open(output_header, "w", encoding="utf-8") as f, contextlib.ExitStack() as spools:
         guard = os.path.basename(output_header).upper().replace('.', '_').replace('-', '_') # Use os.path.basename and replace hyphens too
         f.write(f"#ifndef {guard}\n")
         f.write(f"#define {guard}\n\n")
@@ -237,55 +1073,528 @@ def generate_bitmaps_for_chars(char_list, GLYPH_HEIGHT = 30, font_path="./font_f
         f.write("#include <avr/pgmspace.h>\n\n")
         f.write("static const uint8_t glyph_bitmaps[] PROGMEM = {\n")
 
-        # Write bytes in rows of 16 for readability
-        for i in range(0, len(all_bytes), 16):
-            line_bytes = all_bytes[i:i+16]
-            line = ", ".join(f"0x{b:02X}" for b in line_bytes)
-            f.write(f"  {line},\n") # Add indentation
+        # Tables written after glyph_bitmaps[], in header order: (name, rows, spool).
+        # Each gets the smallest C type holding its values once they are all known.
+        tables = []
+        def spooled_table(name):
+            spool = spools.enter_context(tempfile.TemporaryFile("w+", encoding="utf-8"))
+            rows = _CArrayRows(spool)
+            tables.append((name, rows, spool))
+            return rows
 
-        f.write("};\n\n")
-        # Write glyph widths array
-        f.write("const uint16_t glyph_widths[] PROGMEM = {\n")
+        bitmap_rows = _CArrayRows(f, lambda b: f"0x{b:02X}")
+        width_rows = spooled_table("glyph_widths")
+        unpadded_rows = spooled_table("unpadded_widths")
+        start_rows = spooled_table("bitmap_starts")
+        # Bits not yet making up a whole byte of the bitstream
+        pending_bits = np.zeros(0, dtype=np.uint8)
+        codec_rows = spooled_table("glyph_codecs") if codecs else None
+        if tight_boxes:
+            height_rows = spooled_table("glyph_heights")
+            x_offset_rows = spooled_table("x_offsets")
+            y_offset_rows = spooled_table("y_offsets")
 
-        # Convert widths to strings and write in rows of 16
-        for i in range(0, len(bitmap_widths), 16):
-            line = ", ".join(str(width) for width in bitmap_widths[i:i+16])
-            f.write(f"  {line},\n")
+        # Earlier glyphs of the same size a glyph may be delta-coded against
+        references = DeltaReferences() if codecs and "delta" in codecs else None
 
-        f.write("};\n\n")
+        # Start (in bytes) of each glyph_bitmaps[] segment, and the bytes written to the current one
+        segment_starts = [0]
+        segment_size = 0
+
+        for byte_array, final_width, unpadded_width in records:
+            rows = GLYPH_HEIGHT
+            if tight_boxes:
+                box = glyph_box(byte_array, final_width, GLYPH_HEIGHT)
+                if page_major and box[3]:
+                    # Start the box on a page boundary of the cell
+                    x_offset, y_offset, width, height = box
+                    box = (x_offset, y_offset - y_offset % 8, width, height + y_offset % 8)
+                cell_bytes += len(byte_array)
+                byte_array, final_width = crop_glyph(byte_array, final_width, GLYPH_HEIGHT, box)
+                box_bytes += len(byte_array)
+                x_offset, y_offset, _, rows = box
+                height_rows.extend((rows,))
+                x_offset_rows.extend((x_offset,))
+                y_offset_rows.extend((y_offset,))
+
+            size = ((final_width + 7) // 8) * rows
+            if page_major:
+                row_size = size
+                byte_array, final_width = glyph_pages(byte_array, final_width, rows)
+                size = len(byte_array)
+            key = glyph_content_key(byte_array, final_width) if dedupe else None
 
-        # Write unpadded_widths array
-        f.write("const uint16_t unpadded_widths[] PROGMEM = {\n")
+            if key in written:
+                start, codec, final_width = written[key]
+                duplicates += 1
+                bytes_saved += size
+            else:
+                codec, payload = "raw", byte_array
+                if codecs:
+                    reference = references.closest(byte_array, final_width // 8) if references is not None else None
+                    codec, payload = compress_glyph(byte_array, final_width // 8, codecs, reference)
+                    if codec == "delta":
+                        # Check the delta against the glyph as rendered before relying on it
+                        if decode_glyph(codec, payload, size, final_width // 8, reference[1]) != bytes(byte_array):
+                            raise RuntimeError(f"The XOR delta of glyph {glyph_count} does not reconstruct it")
+                    elif references is not None:
+                        references.add(glyph_count, byte_array, final_width // 8)
+                if bit_packed:
+                    bits, final_width = glyph_bits(byte_array, final_width, rows)
+                    # Bytes the segment would end up with, including its trailing zero byte
+                    segment_end = segment_size + (len(pending_bits) + len(bits) + 7) // 8 + 1
+                else:
+                    segment_end = segment_size + len(payload)
+                if segment_size and segment_end > segment_bytes:
+                    # Close the segment and start the next one, so no glyph straddles two arrays
+                    if bit_packed:
+                        tail = np.packbits(pending_bits).tolist() + [0]
+                        bitmap_rows.extend(tail)
+                        segment_size += len(tail)
+                        pending_bits = np.zeros(0, dtype=np.uint8)
+                    bitmap_rows.close()
+                    segment_starts.append(segment_starts[-1] + segment_size)
+                    segment_size = 0
+                    current_index = segment_starts[-1] * 8 if bit_packed else segment_starts[-1]
+                    f.write("};\n\n")
+                    if len(segment_starts) == 2:
+                        # On AVR, keep later segments after the program, so the first segment and the
+                        # other tables stay in the low 64 KB that near pointers reach
+                        f.write("#if defined(__AVR_HAVE_ELPM__)\n")
+                        f.write("#define GLYPH_FAR_PROGMEM __attribute__((section(\".fini7\")))\n")
+                        f.write("#else\n")
+                        f.write("#define GLYPH_FAR_PROGMEM PROGMEM\n")
+                        f.write("#endif\n\n")
+                    f.write(f"static const uint8_t glyph_bitmaps_{len(segment_starts) - 1}[] GLYPH_FAR_PROGMEM = {{\n")
+                    bitmap_rows = _CArrayRows(f, lambda b: f"0x{b:02X}")
 
-        # Convert widths to strings and write in rows of 16
-        for i in range(0, len(unpadded_widths), 16):
-            line = ", ".join(str(width) for width in unpadded_widths[i:i+16])
-            f.write(f"  {line},\n")
+                # Index of this glyph's first byte (or bit) in glyph_bitmaps[]
+                start = current_index
+                if bit_packed:
+                    pending_bits = np.concatenate((pending_bits, bits))
+                    whole = len(pending_bits) - len(pending_bits) % 8
+                    bitmap_rows.extend(np.packbits(pending_bits[:whole]).tolist())
+                    pending_bits = pending_bits[whole:]
+                    current_index += len(bits)
+                    segment_size += whole // 8
+                else:
+                    bitmap_rows.extend(payload)
+                    current_index += len(payload)
+                    segment_size += len(payload)
+                raw_bytes += size
+                if page_major:
+                    row_major_bytes += row_size
+                codec_counts[codec] += 1
+                if dedupe:
+                    written[key] = (start, codec, final_width)
 
+            width_rows.extend((final_width,))
+            unpadded_rows.extend((unpadded_width,))
+            start_rows.extend((start,))
+            if codec_rows is not None:
+                codec_rows.extend((CODEC_IDS[codec],))
+            glyph_count += 1
+
+        if bit_packed:
+            # Flush the last partial byte, plus a zero byte so the sketch may always read
+            # the byte after the one a row ends in
+            tail = np.packbits(pending_bits).tolist() + [0]
+            bitmap_rows.extend(tail)
+            segment_size += len(tail)
+        bitmap_rows.close()
         f.write("};\n\n")
+        bitmap_bytes = segment_starts[-1] + segment_size
+
+        # Append the spooled tables in header order
+        for name, rows, spool in tables:
+            rows.close()
+            spool.seek(0)
+            ctype, _ = smallest_uint_type(rows.max_value)
+            f.write(f"const {ctype} {name}[] PROGMEM = {{\n")
+            shutil.copyfileobj(spool, f)
+            f.write("};\n\n")
+
+        if len(segment_starts) > 1:
+            # Where each segment starts in the concatenated bitmaps, and the segment arrays
+            # in order, for the sketch to turn a bitmap_starts[] offset into an address
+            ctype, _ = smallest_uint_type(segment_starts[-1])
+            f.write(f"const {ctype} glyph_segment_starts[] PROGMEM = {{\n")
+            rows = _CArrayRows(f)
+            rows.extend(segment_starts)
+            rows.close()
+            f.write("};\n\n")
+            arrays = ", ".join(f"address(glyph_bitmaps_{n})" if n else "address(glyph_bitmaps)"
+                               for n in range(len(segment_starts)))
+            f.write(f"#define GLYPH_SEGMENTS {len(segment_starts)}\n")
+            f.write(f"#define GLYPH_SEGMENT_ARRAYS(address) {arrays}\n\n")
 
-        # Generate an array of indexes into the bitmap
-        bitmap_start_indexes = []
-        current_index = 0
-        for i in range(len(bitmap_widths)):
-            bitmap_start_indexes.append(current_index)
-            current_index += ((bitmap_widths[i] + 7) // 8) * GLYPH_HEIGHT
+        if bit_packed:
+            f.write("#define GLYPH_BIT_PACKED 1\n\n")
+        if tight_boxes:
+            f.write("#define GLYPH_BOXES 1\n\n")
+        if page_major:
+            f.write("#define GLYPH_PAGE_MAJOR 1\n\n")
+
+        if codecs:
+            # Codec ids of glyph_codecs[], and which decoders the sketch needs
+            f.write("#define GLYPH_CODECS 1\n")
+            for codec, codec_id in CODEC_IDS.items():
+                f.write(f"#define GLYPH_CODEC_{codec.upper()} {codec_id}\n")
+            for codec, count in codec_counts.items():
+                if count and codec != "raw":
+                    f.write(f"#define GLYPH_USES_{codec.upper()} 1\n")
+            f.write("\n")
+
+        f.write(f"#endif // {guard}\n")
+
+    if tight_boxes:
+        print(f"Cropped glyphs to tight boxes: {box_bytes} bitmap bytes instead of {cell_bytes}"
+              f" (plus {3 * glyph_count} for the box tables)")
+    if dedupe:
+        print(f"Deduplicated {duplicates} of {glyph_count} glyph bitmaps, saving {bytes_saved} bytes"
+              f" ({bytes_saved / 1024:.2f} KB) of glyph_bitmaps[]")
+    if len(segment_starts) > 1:
+        print(f"Split glyph_bitmaps[] ({bitmap_bytes} bytes) into {len(segment_starts)} segments"
+              f" of at most {segment_bytes} bytes, read with far pointers on AVR")
+    if bit_packed:
+        print(f"Bit-packed glyph_bitmaps[] into {bitmap_bytes} bytes instead of {raw_bytes}"
+              f" (bitmap_starts[] holds bit offsets)")
+    if page_major:
+        print(f"Stored glyph_bitmaps[] page-major in {bitmap_bytes} bytes"
+              f" ({row_major_bytes} row-major, byte-aligned)")
+    if codecs:
+        usage = ", ".join(f"{codec} {count}" for codec, count in codec_counts.items())
+        print(f"Compressed glyph_bitmaps[] from {raw_bytes} to {bitmap_bytes} bytes"
+              f" (plus {glyph_count} for glyph_codecs[]); glyphs per codec: {usage}")
+    header_size_kb = os.path.getsize(output_header) / 1024
+    print(f"Bitmap header file size: {header_size_kb:.2f} KB")
 
-        # Write bitmap start indexes to a const uint16_t array
-        f.write("const uint16_t bitmap_starts[] PROGMEM = {\n")
-        for i in range(0, len(bitmap_start_indexes), 16):
-            line = ", ".join(str(idx) for idx in bitmap_start_indexes[i:i+16])
-            f.write(f"  {line},\n")
-            
+    return glyph_count, bitmap_bytes, bytes_saved
 
+def write_glyph_header(output_header, atlas, dedupe=True, **layout):
+    """
+    Writes a glyph atlas as a C++ header for the Arduino sketch.
+
+    Args:
+        output_header (str): Output file path for the generated C++ header.
+        atlas (GlyphAtlas): Packed glyph bitmaps and their width tables.
+        dedupe (bool): Store pixel-identical bitmaps once (see `write_glyph_header_stream`).
+            The offsets written match `atlas.starts` once `atlas.deduplicate()` has run
+            (and the default layout is used).
+        **layout: Storage options of `write_glyph_header_stream` (`codecs`, `bit_packed`,
+            `tight_boxes`, `page_major`, `segment_bytes`). A boxed atlas is always written with `tight_boxes`.
+    """
+    if atlas.rows is not None:
+        # The writer crops full cells itself, giving the same boxes
+        atlas = atlas.cells()
+        layout["tight_boxes"] = True
+    write_glyph_header_stream(output_header, atlas.glyph_height, atlas.records(), dedupe, **layout)
+
+def write_composed_header(output_header, composition):
+    """
+    Writes a compositional glyph header: component bitmaps plus per-glyph composition tables.
+
+    The header defines GLYPH_COMPOSED and holds `component_bitmaps[]` with
+    `component_widths[]`, `component_heights[]` and `component_starts[]`, the usual
+    `unpadded_widths[]`, and for each glyph `i` the entries `composition_starts[i]` up
+    to `composition_starts[i + 1]` of `composition_components[]`,
+    `composition_x_offsets[]` and `composition_y_offsets[]`. The sketch ORs those
+    components together at their offsets, clipped to the glyph's cell.
+
+    Args:
+        output_header (str): Output file path for the generated C++ header.
+        composition (GlyphComposition): Components and compositions, e.g. from `compose_clusters`.
+
+    Returns:
+        tuple: (glyph_count, component_count, flash_bytes), flash_bytes being the size of
+        all the header's tables.
+
+    Raises:
+        ValueError: If a component offset falls outside -128..127 (composition_x/y_offsets[]
+            are int8_t; the other tables get the smallest unsigned type holding their values).
+    """
+    component_count = len(composition.component_widths)
+    offsets = composition.x_offsets.tolist() + composition.y_offsets.tolist()
+    if offsets and not -128 <= min(offsets) <= max(offsets) <= 127:
+        raise ValueError("A component offset does not fit in composition_x/y_offsets[] (int8_t)")
+
+    # Ensure the directory exists
+    os.makedirs(os.path.dirname(output_header), exist_ok=True)
+
+    # (C type, name, values, bytes per value), in header order
+    tables = []
+    for name, values in (
+        ("component_widths", composition.component_widths),
+        ("component_heights", composition.component_rows),
+        ("component_starts", composition.component_starts),
+        ("unpadded_widths", composition.unpadded_widths),
+        ("composition_starts", composition.composition_starts),
+        ("composition_components", composition.composition_components),
+    ):
+        ctype, size = smallest_uint_type(max(values, default=0))
+        tables.append((ctype, name, values, size))
+    tables += [
+        ("int8_t", "composition_x_offsets", composition.x_offsets, 1),
+        ("int8_t", "composition_y_offsets", composition.y_offsets, 1),
+    ]
+
+    with open(output_header, "w", encoding="utf-8") as f:
+        guard = os.path.basename(output_header).upper().replace('.', '_').replace('-', '_')
+        f.write(f"#ifndef {guard}\n")
+        f.write(f"#define {guard}\n\n")
+        f.write(f"#define GLYPH_HEIGHT {composition.glyph_height}\n\n")
+        f.write("#include <avr/pgmspace.h>\n\n")
+
+        f.write("static const uint8_t component_bitmaps[] PROGMEM = {\n")
+        bitmap_rows = _CArrayRows(f, lambda b: f"0x{b:02X}")
+        bitmap_rows.extend(composition.component_data)
+        bitmap_rows.close()
         f.write("};\n\n")
 
+        for ctype, name, values, _ in tables:
+            f.write(f"const {ctype} {name}[] PROGMEM = {{\n")
+            rows = _CArrayRows(f)
+            rows.extend(values)
+            rows.close()
+            f.write("};\n\n")
+
+        f.write("#define GLYPH_COMPOSED 1\n\n")
         f.write(f"#endif // {guard}\n")
 
-    # Clean up temp font file
-    os.remove(tmp_font_path)
+    glyph_count = len(composition)
+    flash_bytes = len(composition.component_data) + sum(len(values) * size for _, _, values, size in tables)
+    # A precomposed header holds every glyph's bitmap plus glyph_widths[], bitmap_starts[] and unpadded_widths[]
+    precomposed_bytes = sum(((width + 7) // 8) * composition.glyph_height for width in composition.widths) + 6 * glyph_count
+    print(f"Composed {glyph_count} glyphs from {component_count} components ({composition.table_entries} placements):"
+          f" {flash_bytes} bytes of tables instead of {precomposed_bytes} precomposed")
+    header_size_kb = os.path.getsize(output_header) / 1024
+    print(f"Bitmap header file size: {header_size_kb:.2f} KB")
 
+    return glyph_count, component_count, flash_bytes
+
+def write_tiled_header(output_header, tiles):
+    """
+    Writes a tiled glyph header: an 8x8 tile dictionary plus each glyph's grid of tile ids.
+
+    The header defines GLYPH_TILES and holds `tile_bitmaps[]` (8 page-major bytes per tile,
+    tile 0 blank), `tile_map[]` with the tile ids of every glyph grid row by row,
+    `tile_map_starts[]`, and the usual `glyph_widths[]` (byte-aligned, i.e. tile columns
+    times 8) and `unpadded_widths[]`. The sketch ORs each non-blank tile of a glyph
+    straight into the display buffer.
+
+    Args:
+        output_header (str): Output file path for the generated C++ header.
+        tiles (GlyphTiles): The tiled glyphs, e.g. from `GlyphTiles.from_atlas`.
+
+    Returns:
+        tuple: (glyph_count, tile_count, flash_bytes), flash_bytes being the size of all the
+        header's tables.
+    """
+    # Ensure the directory exists
+    os.makedirs(os.path.dirname(output_header), exist_ok=True)
+
+    # (C type, name, values, bytes per value), in header order
+    tables = []
+    for name, values in (
+        ("tile_map", tiles.tile_map),
+        ("tile_map_starts", tiles.tile_map_starts),
+        ("glyph_widths", tiles.widths),
+        ("unpadded_widths", tiles.unpadded_widths),
+    ):
+        ctype, size = smallest_uint_type(max(values, default=0))
+        tables.append((ctype, name, values, size))
+
+    with open(output_header, "w", encoding="utf-8") as f:
+        guard = os.path.basename(output_header).upper().replace('.', '_').replace('-', '_')
+        f.write(f"#ifndef {guard}\n")
+        f.write(f"#define {guard}\n\n")
+        f.write(f"#define GLYPH_HEIGHT {tiles.glyph_height}\n\n")
+        f.write("#include <avr/pgmspace.h>\n\n")
+
+        f.write("static const uint8_t tile_bitmaps[] PROGMEM = {\n")
+        bitmap_rows = _CArrayRows(f, lambda b: f"0x{b:02X}")
+        bitmap_rows.extend(tiles.tile_data)
+        bitmap_rows.close()
+        f.write("};\n\n")
+
+        for ctype, name, values, _ in tables:
+            f.write(f"const {ctype} {name}[] PROGMEM = {{\n")
+            rows = _CArrayRows(f)
+            rows.extend(values)
+            rows.close()
+            f.write("};\n\n")
+
+        f.write("#define GLYPH_TILES 1\n\n")
+        f.write(f"#endif // {guard}\n")
+
+    glyph_count = len(tiles)
+    tile_bytes = len(tiles.tile_data) + sum(len(values) * size for _, name, values, size in tables
+                                            if name in ("tile_map", "tile_map_starts"))
+    flash_bytes = len(tiles.tile_data) + sum(len(values) * size for _, _, values, size in tables)
+    # Raw glyph_bitmaps[] holds every glyph's full cell, found through bitmap_starts[]
+    raw_bytes = sum(width // 8 for width in tiles.widths) * tiles.glyph_height
+    raw_starts_bytes = smallest_uint_type(raw_bytes)[1] * glyph_count
+    print(f"Tiled {glyph_count} glyphs into {tiles.tile_count} distinct 8x8 tiles: {tiles.hit_rate:.1%} of"
+          f" {tiles.tile_lookups} tiles were dictionary hits ({tiles.blank_tiles} of them blank)")
+    print(f"tile_bitmaps[] + tile_map[] + tile_map_starts[]: {tile_bytes} bytes instead of"
+          f" {raw_bytes + raw_starts_bytes} for raw glyph_bitmaps[] + bitmap_starts[]"
+          f" ({raw_bytes + raw_starts_bytes - tile_bytes} bytes saved)")
     header_size_kb = os.path.getsize(output_header) / 1024
     print(f"Bitmap header file size: {header_size_kb:.2f} KB")
 
-    return all_bytes, bitmap_widths, bitmap_start_indexes, unpadded_widths
\ No newline at end of file
+    return glyph_count, tiles.tile_count, flash_bytes
+
+def _merge_near_duplicates(atlas, max_distance, preview=None):
+    """Lets glyphs within `max_distance` pixels of a more frequent one share its bitmap."""
+    merges = atlas.near_duplicates(max_distance)
+    if preview is not None:
+        preview(atlas, merges)
+    merged = atlas.merge(merges)
+    worst = max((distance for _, near in merges for _, distance in near), default=0)
+    print(f"Merged {merged} near-duplicate glyphs into {len(merges)} others at height {atlas.glyph_height}"
+          f" (at most {max_distance} px apart, worst {worst} px)")
+
+def _write_atlas_file(output_header, atlas):
+    atlas_path = atlas_path_for_header(output_header)
+    atlas_size_kb = write_atlas_file(atlas_path, atlas) / 1024
+    print(f"Atlas file {atlas_path} size: {atlas_size_kb:.2f} KB")
+
+def _compose_and_write(char_list, GLYPH_HEIGHT, font_path, output_header, phrases, atlas_file):
+    composition = compose_clusters(char_list, GLYPH_HEIGHT, font_path, phrases)
+    write_composed_header(output_header, composition)
+    atlas = composition.atlas()
+    if atlas_file:
+        _write_atlas_file(output_header, atlas)
+    return atlas
+
+def generate_bitmaps_for_chars(char_list, GLYPH_HEIGHT = 30, font_path="./font_files/NotoSansLao-Regular.ttf", output_header="./arduino_code/glyph_bitmaps.h", backend="numpy", workers=1, render_mode="resize", cache=None, phrases=None, dedupe=True, codecs=None, bit_packed=False,
+                               tight_boxes=False, page_major=False, composed=False, tiled=False, atlas_file=True,
+                               merge_distance=None, merge_preview=None, return_atlas=True):
+    """
+    Generates GLYPH_WIDTH x GLYPH_HEIGHT black-and-white bitmap images for each grapheme cluster in `char_list`,
+    and exports the packed binary data as a C++ header file for use in embedded systems.
+
+    Args:
+        char_list (list[str]): List of grapheme clusters or strings (e.g., letters, syllables, or words).
+        GLYPH_HEIGHT (int | list[int]): Glyph height in pixels, or a list of heights. With a list,
+            one header is written per height (see `header_path_for_height`) and all
+            height-independent work is done once.
+        font_path (str): Path to a TrueType font file (.ttf) that supports the input characters.
+        output_header (str): Output file path for the generated C++ header.
+        backend (str): Raster backend, "numpy" (default) or "pil". Both give identical output.
+        workers (int | None): Worker processes used for rasterization. 1 (default) renders
+            serially in this process; None uses one worker per CPU. The output is identical
+            for any worker count.
+        render_mode (str): "resize" (default) renders at 72pt and scales down; "mono" renders
+            1-bit glyphs directly at GLYPH_HEIGHT with FT_LOAD_TARGET_MONO.
+        cache (GlyphCache | None): Persistent glyph cache. Clusters already rendered with the
+            same font file, height and render mode (and, with `phrases`, the same in-phrase
+            shaping) are read from it instead of re-rendered.
+        phrases (list[str] | None): The input strings `char_list` was built from. If given, each
+            phrase is shaped once with HarfBuzz and split by cluster id, instead of shaping every
+            cluster separately; clusters then keep their in-phrase contextual forms.
+        dedupe (bool): Store pixel-identical bitmaps once in `glyph_bitmaps[]`, with several
+            `bitmap_starts` entries pointing at the shared copy. Prints the bytes saved.
+        codecs (list[str] | None): Compression codecs ("raw", "rle", "lz", "delta"; see `glyph_codecs`)
+            to pick the smallest of per glyph. None (default) stores every bitmap raw.
+        bit_packed (bool): Store rows at each glyph's true width in one bitstream, with bit
+            offsets in `bitmap_starts` (see `write_glyph_header_stream`).
+        tight_boxes (bool): Store only each glyph's ink box, drawn at per-glyph x/y offsets.
+            The returned atlas is then boxed too (see `GlyphAtlas.tight_boxes`).
+        page_major (bool): Store glyphs in the SSD1306's page-major layout, so the sketch
+            can OR them straight into the display buffer (see `write_glyph_header_stream`).
+        composed (bool): Store base and mark glyphs once and compose clusters from them on the
+            device (see `write_composed_header`). Needs `render_mode="mono"`, and replaces the
+            other storage options.
+        tiled (bool): Cut glyphs into 8x8 tiles stored once each, with a grid of tile ids per
+            glyph (see `write_tiled_header`). Replaces the other storage options; with
+            `dedupe`, glyphs with identical grids share one.
+        atlas_file (bool): Also write the atlas as a binary atlas file next to each header
+            (see `glyph_atlas_file`), e.g. ./arduino_code/glyph_bitmaps.atlas.
+        merge_distance (int | None): Lossy: also let glyphs that differ from a more frequent
+            glyph of the same size by at most this many pixels share its bitmap (see
+            `GlyphAtlas.near_duplicates`). Needs `dedupe`. None (default) keeps every glyph exact.
+        merge_preview (callable | None): Called as `merge_preview(atlas, merges)` before the
+            merges are applied, e.g. `debug.preview_merges` to see every one of them.
+        return_atlas (bool): Build and return the GlyphAtlas. With False, and no atlas file,
+            merging or tiling either, records are piped from `iter_glyph_records` straight
+            into `write_glyph_header_stream` and never held all at once; None is returned.
+
+    Returns:
+        GlyphAtlas: Packed bitmaps, widths and start offsets of every glyph, looked up by
+        cluster. With a list of heights, a dict mapping each height to its atlas. For a
+        composed header, the composed glyphs (identical to their "mono" renderings).
+        None for a streamed header (see `return_atlas`).
+
+    Raises:
+        ValueError: If `composed` is combined with another render mode or storage option,
+            `tiled` with another storage option, or `merge_distance` is given without `dedupe`.
+
+    The generated bitmaps are:
+        - GLYPH_WIDTH x GLYPH_HEIGHT pixels
+        - 1-bit monochrome (packed: 8 pixels per byte)
+        - Stored consecutively in a C++ array (`glyph_bitmaps[]`) with `PROGMEM` for AVR targets.
+    """
+    if composed:
+        if render_mode != "mono":
+            raise ValueError("Composed glyphs need render_mode='mono': resized clusters are not the sum of their components")
+        if codecs or bit_packed or tight_boxes or page_major or tiled or merge_distance is not None:
+            raise ValueError("Composed glyphs cannot be combined with codecs, bit packing, tight boxes, page-major"
+                             " or tiled storage, or near-duplicate merging")
+        if isinstance(GLYPH_HEIGHT, (list, tuple)):
+            return {height: _compose_and_write(char_list, height, font_path, header_path_for_height(output_header, height),
+                                               phrases, atlas_file)
+                    for height in GLYPH_HEIGHT}
+        return _compose_and_write(char_list, GLYPH_HEIGHT, font_path, output_header, phrases, atlas_file)
+    if tiled and (codecs or bit_packed or tight_boxes or page_major):
+        raise ValueError("Tiled glyphs cannot be combined with codecs, bit packing, tight boxes or page-major storage")
+    if merge_distance is not None and not dedupe:
+        raise ValueError("Merging near-duplicate glyphs needs dedupe=True to share their bitmaps")
+
+    layout = dict(codecs=codecs, bit_packed=bit_packed, tight_boxes=tight_boxes, page_major=page_major)
+    # Only these steps need every glyph in memory at once
+    stream = not (return_atlas or atlas_file or tiled or merge_distance is not None)
+
+    if isinstance(GLYPH_HEIGHT, (list, tuple)):
+        records_by_height = render_clusters_multi_height(char_list, GLYPH_HEIGHT, font_path, backend, workers,
+                                                         render_mode, cache, phrases=phrases)
+        if stream:
+            for height, records in records_by_height.items():
+                write_glyph_header_stream(header_path_for_height(output_header, height), height, records, dedupe,
+                                          **layout)
+            return None
+        return {
+            height: _write_records(records, char_list, height, header_path_for_height(output_header, height), dedupe,
+                                   atlas_file, tiled=tiled, merge_distance=merge_distance,
+                                   merge_preview=merge_preview, **layout)
+            for height, records in records_by_height.items()
+        }
+
+    if stream:
+        records = iter_glyph_records(char_list, GLYPH_HEIGHT, font_path, backend, workers, render_mode, cache,
+                                     phrases=phrases)
+        write_glyph_header_stream(output_header, GLYPH_HEIGHT, records, dedupe, **layout)
+        return None
+
+    records = render_clusters(char_list, GLYPH_HEIGHT, font_path, backend, workers, render_mode, cache,
+                              phrases=phrases)
+    return _write_records(records, char_list, GLYPH_HEIGHT, output_header, dedupe, atlas_file, tiled=tiled,
+                          merge_distance=merge_distance, merge_preview=merge_preview, **layout)
+
+def _write_records(records, char_list, GLYPH_HEIGHT, output_header, dedupe, atlas_file, tiled=False,
+                   merge_distance=None, merge_preview=None, **layout):
+    atlas = GlyphAtlas.from_records(GLYPH_HEIGHT, records, char_list)
+    if merge_distance is not None:
+        _merge_near_duplicates(atlas, merge_distance, merge_preview)
+    if dedupe:
+        # Share bitmaps in memory too, so atlas.starts match the header's bitmap_starts[]
+        atlas.deduplicate()
+    if tiled:
+        write_tiled_header(output_header, GlyphTiles.from_atlas(atlas, dedupe))
+    else:
+        write_glyph_header(output_header, atlas, dedupe, **layout)
+    if layout.get("tight_boxes"):
+        atlas = atlas.tight_boxes()
+    if atlas_file:
+        _write_atlas_file(output_header, atlas)
+    return atlas
@@ -0,0 +1,575 @@
+"""
+Compact In-Memory Glyph Atlas.
+
+The generator used to hand back four parallel Python lists (bitmap bytes, padded
+widths, start offsets and unpadded widths), which cost a full Python int object per
+byte and per table entry. `GlyphAtlas` keeps the same data in one `bytearray` and
+three typed `array`s, mirroring the `glyph_bitmaps[]`, `glyph_widths[]`,
+`unpadded_widths[]` and `bitmap_starts[]` tables of the generated header, and gives
+zero-copy access to each glyph's bytes plus lookup by grapheme cluster.
+
+Different clusters often render to the same pixels (codepoint-order variants,
+invisible characters, marks that vanish at small heights). `deduplicate` stores such
+bitmaps once and points every one of their glyphs at the shared copy. At small heights
+many more clusters differ by only a stray pixel or two; `near_duplicates` finds those
+(see `hamming_distances`) and `merge` lets them share one bitmap too, trading a little
+fidelity for flash.
+
+Glyphs normally fill a full GLYPH_HEIGHT-row cell. `tight_boxes` crops each one to its
+ink box instead, recording the box's offset inside the cell, so blank rows (a consonant
+without marks leaves many) are neither stored nor drawn.
+
+The atlas itself is always row-major. `glyph_bits` and `glyph_pages` convert single
+glyphs to the bit-continuous and SSD1306 page-major header layouts, and
+`from_bit_packed` / `from_page_major` read those layouts back.
+"""
+
+import hashlib
+from array import array
+
+import numpy as np
+
+
+def glyph_content_key(byte_array, final_width):
+    """
+    Content hash of a packed glyph: equal keys mean pixel-identical bitmaps.
+
+    The width is part of the key so two glyphs whose bytes match but whose rows
+    are split differently are never merged.
+    """
+    return final_width, hashlib.blake2b(byte_array, digest_size=16).digest()
+
+
+# Most distances `GlyphAtlas.near_duplicates` computes at once (a 16 MB float32 block)
+DISTANCE_BLOCK_ELEMENTS = 1 << 22
+
+
+def _unpacked_bits(bitmaps):
+    """Unpacked float32 bits of packed bitmaps, and the ink (set pixel) count of each."""
+    bits = np.unpackbits(bitmaps, axis=1).astype(np.float32)
+    return bits, bits.sum(axis=1)
+
+
+def _bit_distances(bits, ink, other_bits, other_ink):
+    # float32 holds these integer sums exactly (bitmaps have far fewer than 2**24 pixels)
+    return np.rint(ink[:, None] + other_ink[None, :] - 2 * (bits @ other_bits.T)).astype(np.int64)
+
+
+def hamming_distances(bitmaps, others=None):
+    """
+    Pixel distances between packed bitmaps of the same size.
+
+    The distance between two bitmaps is the number of pixels in which they differ,
+    computed for all pairs at once as |a| + |b| - 2 a.b over their unpacked bits.
+
+    Args:
+        bitmaps (numpy.ndarray): (n, size) uint8 array, one packed bitmap per row.
+        others (numpy.ndarray | None): (m, size) uint8 array to measure against;
+            `bitmaps` itself if None.
+
+    Returns:
+        numpy.ndarray: (n, m) int array of distances.
+    """
+    bits, ink = _unpacked_bits(bitmaps)
+    if others is None:
+        return _bit_distances(bits, ink, bits, ink)
+    return _bit_distances(bits, ink, *_unpacked_bits(others))
+
+
+def glyph_bits(byte_array, final_width, glyph_height):
+    """
+    Unpacks a packed glyph and trims it to its true width for bit-continuous storage.
+
+    The true width is the width up to the rightmost inked column, so the columns dropped
+    are only byte-alignment padding (and blank columns).
+
+    Args:
+        byte_array (bytes-like): Packed rows of the glyph.
+        final_width (int): Byte-aligned width of the glyph.
+        glyph_height (int): Height (in pixels) of the glyph.
+
+    Returns:
+        tuple: (bits, bit_width), the glyph's rows at `bit_width` pixels each, concatenated
+        as a flat uint8 array of 0/1, and that width.
+    """
+    rows = np.frombuffer(byte_array, dtype=np.uint8).reshape(glyph_height, final_width // 8)
+    pixels = np.unpackbits(rows, axis=1)
+    inked_columns = np.flatnonzero(pixels.any(axis=0))
+    bit_width = int(inked_columns[-1]) + 1 if inked_columns.size else 0
+    return pixels[:, :bit_width].ravel(), bit_width
+
+
+def glyph_pages(byte_array, final_width, rows):
+    """
+    Repacks a packed glyph into the SSD1306's own page-major layout.
+
+    The display's memory is split into pages of 8 rows, each byte being one column of a
+    page with the least significant bit on top. A glyph stored that way can be ORed
+    straight into the display buffer. Like `glyph_bits`, the glyph is trimmed to its
+    true width; its last page is padded with blank rows.
+
+    Args:
+        byte_array (bytes-like): Packed rows of the glyph.
+        final_width (int): Byte-aligned width of the glyph.
+        rows (int): Number of rows of the glyph.
+
+    Returns:
+        tuple: (page_bytes, width), ceil(rows / 8) pages of `width` column bytes each,
+        page after page, and that width.
+    """
+    pixels = np.unpackbits(np.frombuffer(byte_array, dtype=np.uint8).reshape(rows, final_width // 8), axis=1)
+    inked_columns = np.flatnonzero(pixels.any(axis=0))
+    width = int(inked_columns[-1]) + 1 if inked_columns.size else 0
+    pages = (rows + 7) // 8
+    padded = np.zeros((pages * 8, width), dtype=np.uint8)
+    padded[:rows] = pixels[:, :width]
+    # (page, row, column) -> (page, column, row), then pack each column's 8 rows LSB first
+    columns = padded.reshape(pages, 8, width).transpose(0, 2, 1)
+    return np.packbits(columns, axis=2, bitorder="little").tobytes(), width
+
+
+def glyph_box(byte_array, final_width, rows):
+    """
+    Tight ink box of a packed glyph.
+
+    Args:
+        byte_array (bytes-like): Packed rows of the glyph.
+        final_width (int): Byte-aligned width of the glyph.
+        rows (int): Number of rows of the glyph.
+
+    Returns:
+        tuple: (x_offset, y_offset, width, height) of the smallest rectangle holding every
+        inked pixel, or (0, 0, 0, 0) for a blank glyph.
+    """
+    pixels = np.unpackbits(np.frombuffer(byte_array, dtype=np.uint8).reshape(rows, final_width // 8), axis=1)
+    inked_rows = np.flatnonzero(pixels.any(axis=1))
+    if not inked_rows.size:
+        return 0, 0, 0, 0
+    inked_columns = np.flatnonzero(pixels.any(axis=0))
+    x_offset, y_offset = int(inked_columns[0]), int(inked_rows[0])
+    return x_offset, y_offset, int(inked_columns[-1]) + 1 - x_offset, int(inked_rows[-1]) + 1 - y_offset
+
+
+def crop_glyph(byte_array, final_width, rows, box):
+    """
+    Cuts a box out of a packed glyph.
+
+    Args:
+        byte_array (bytes-like): Packed rows of the glyph.
+        final_width (int): Byte-aligned width of the glyph.
+        rows (int): Number of rows of the glyph.
+        box (tuple): (x_offset, y_offset, width, height), e.g. from `glyph_box`.
+
+    Returns:
+        tuple: (byte_array, final_width) of the box, packed the same way (rows padded to whole bytes).
+    """
+    x_offset, y_offset, width, height = box
+    pixels = np.unpackbits(np.frombuffer(byte_array, dtype=np.uint8).reshape(rows, final_width // 8), axis=1)
+    cropped = pixels[y_offset:y_offset + height, x_offset:x_offset + width]
+    return np.packbits(cropped, axis=1).tobytes(), ((width + 7) // 8) * 8
+
+
+class GlyphAtlas:
+    """
+    Packed glyph bitmaps of one height and their metadata tables.
+
+    Glyph `i` occupies `(widths[i] // 8) * glyph_height` bytes of `data` starting at
+    `starts[i]`: rows top to bottom, `widths[i] // 8` bytes per row, MSB = leftmost pixel.
+    After `deduplicate`, several glyphs may share the same start.
+
+    A boxed atlas (see `tight_boxes`) stores glyph `i` as `rows[i]` rows drawn at
+    (`x_offsets[i]`, `y_offsets[i]`) inside its GLYPH_HEIGHT-row cell.
+
+    Attributes:
+        glyph_height (int): Height (in pixels) of every glyph.
+        data (bytearray): Packed bitmaps of all glyphs, consecutively (read-only bytes-like
+            for an atlas wrapping a file, see `from_tables`).
+        widths (array): Byte-aligned width of each glyph ('H').
+        unpadded_widths (array): Visual advance of each glyph ('H').
+        starts (array): Start offset (in bytes) of each glyph in `data` ('I').
+        clusters (list[str | None]): Grapheme cluster of each glyph, if known.
+        rows (array | None): Stored rows of each glyph ('B'), for a boxed atlas.
+        x_offsets (array | None): Column of each glyph's box inside its cell ('B'), for a boxed atlas.
+        y_offsets (array | None): Row of each glyph's box inside its cell ('B'), for a boxed atlas.
+    """
+
+    __slots__ = ("glyph_height", "data", "widths", "unpadded_widths", "starts", "clusters",
+                 "rows", "x_offsets", "y_offsets", "_index")
+
+    def __init__(self, glyph_height, boxed=False):
+        self.glyph_height = glyph_height
+        self.data = bytearray()
+        self.widths = array('H')
+        self.unpadded_widths = array('H')
+        self.starts = array('I')
+        self.clusters = []
+        self.rows = array('B') if boxed else None
+        self.x_offsets = array('B') if boxed else None
+        self.y_offsets = array('B') if boxed else None
+        # Grapheme cluster -> glyph index
+        self._index = {}
+
+    @classmethod
+    def from_records(cls, glyph_height, records, clusters=None):
+        """
+        Builds an atlas from glyph records.
+
+        Args:
+            glyph_height (int): Height (in pixels) of every glyph.
+            records (iterable[tuple]): (data, final_width, unpadded_width) records, in
+                glyph order, e.g. from `generate_bitmaps.iter_glyph_records`.
+            clusters (iterable[str] | None): Grapheme cluster of each record, for lookup by cluster.
+
+        Returns:
+            GlyphAtlas: The filled atlas.
+        """
+        atlas = cls(glyph_height)
+        if clusters is None:
+            for byte_array, final_width, unpadded_width in records:
+                atlas.append(byte_array, final_width, unpadded_width)
+        else:
+            for cluster, (byte_array, final_width, unpadded_width) in zip(clusters, records):
+                atlas.append(byte_array, final_width, unpadded_width, cluster)
+        return atlas
+
+    @classmethod
+    def from_tables(cls, glyph_height, data, widths, unpadded_widths, starts, clusters=None, boxes=None):
+        """
+        Wraps existing tables in an atlas without copying the bitmap data.
+
+        Args:
+            glyph_height (int): Height (in pixels) of every glyph.
+            data (bytes-like): Packed bitmaps, e.g. a `memoryview` of a memory-mapped file.
+                The atlas is read-only unless this is a `bytearray`.
+            widths (iterable[int]): Byte-aligned width of each glyph.
+            unpadded_widths (iterable[int]): Visual advance of each glyph.
+            starts (iterable[int]): Start offset of each glyph in `data`.
+            clusters (list[str | None] | None): Grapheme cluster of each glyph.
+            boxes (list[tuple] | None): (x_offset, y_offset, rows) of each glyph, for a boxed atlas.
+
+        Returns:
+            GlyphAtlas: The atlas, sharing `data`.
+        """
+        atlas = cls(glyph_height, boxed=boxes is not None)
+        atlas.data = data
+        atlas.widths.extend(widths)
+        atlas.unpadded_widths.extend(unpadded_widths)
+        atlas.starts.extend(starts)
+        if boxes is not None:
+            for x_offset, y_offset, rows in boxes:
+                atlas.x_offsets.append(x_offset)
+                atlas.y_offsets.append(y_offset)
+                atlas.rows.append(rows)
+        atlas.clusters = list(clusters) if clusters is not None else [None] * len(atlas.widths)
+        for index, cluster in enumerate(atlas.clusters):
+            if cluster is not None:
+                atlas._index.setdefault(cluster, index)
+        return atlas
+
+    def append(self, byte_array, final_width, unpadded_width, cluster=None, box=None):
+        """
+        Adds one glyph at the end of the atlas.
+
+        Args:
+            byte_array (bytes-like): Packed bitmap, `(final_width // 8) * rows` bytes.
+            final_width (int): Byte-aligned width of the glyph.
+            unpadded_width (int): Visual advance of the glyph.
+            cluster (str | None): Grapheme cluster the glyph renders.
+            box (tuple | None): (x_offset, y_offset, rows) of the glyph in its cell; required
+                for a boxed atlas, not allowed otherwise.
+
+        Returns:
+            int: Index of the new glyph.
+
+        Raises:
+            BufferError: If a `memoryview` from `glyph()` is still alive (the data
+                buffer cannot grow while it is exported).
+        """
+        if (box is None) != (self.rows is None):
+            raise ValueError("A box must be given for every glyph of a boxed atlas, and only then")
+
+        index = len(self.widths)
+        if box is not None:
+            x_offset, y_offset, rows = box
+            self.x_offsets.append(x_offset)
+            self.y_offsets.append(y_offset)
+            self.rows.append(rows)
+        self.starts.append(len(self.data))
+        self.data.extend(byte_array)
+        self.widths.append(final_width)
+        self.unpadded_widths.append(unpadded_width)
+        self.clusters.append(cluster)
+        if cluster is not None:
+            self._index.setdefault(cluster, index)
+        return index
+
+    @classmethod
+    def from_bit_packed(cls, glyph_height, data, bit_widths, bit_starts, unpadded_widths, clusters=None, boxes=None):
+        """
+        Unpacks a bit-continuous atlas (as written with `bit_packed=True`) to byte-aligned rows.
+
+        In that layout glyph `i` is `glyph_height` rows (or its box's rows) of `bit_widths[i]`
+        bits, stored back to back (MSB first) from bit `bit_starts[i]` of `data`.
+
+        Args:
+            glyph_height (int): Height (in pixels) of every glyph.
+            data (bytes-like): The bitstream (`glyph_bitmaps[]`).
+            bit_widths (list[int]): True width of each glyph (`glyph_widths[]`).
+            bit_starts (list[int]): Start of each glyph in bits (`bitmap_starts[]`).
+            unpadded_widths (list[int]): Visual advance of each glyph.
+            clusters (list[str] | None): Grapheme cluster of each glyph.
+            boxes (list[tuple] | None): (x_offset, y_offset, rows) of each glyph, for a header
+                written with tight boxes; the atlas returned is then boxed.
+
+        Returns:
+            GlyphAtlas: The same glyphs, byte-aligned, e.g. for `debug.display_bitmap_row`.
+        """
+        atlas = cls(glyph_height, boxed=boxes is not None)
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+        clusters = clusters if clusters is not None else [None] * len(bit_widths)
+        boxes = boxes if boxes is not None else [None] * len(bit_widths)
+        for bit_start, bit_width, unpadded_width, cluster, box in zip(bit_starts, bit_widths, unpadded_widths,
+                                                                      clusters, boxes):
+            rows = glyph_height if box is None else box[2]
+            final_width = ((bit_width + 7) // 8) * 8
+            pixels = np.zeros((rows, final_width), dtype=np.uint8)
+            pixels[:, :bit_width] = bits[bit_start:bit_start + bit_width * rows].reshape(rows, bit_width)
+            atlas.append(np.packbits(pixels, axis=1).tobytes(), final_width, unpadded_width, cluster, box)
+        return atlas
+
+    @classmethod
+    def from_page_major(cls, glyph_height, data, page_widths, starts, unpadded_widths, clusters=None, boxes=None):
+        """
+        Converts a page-major atlas (as written with `page_major=True`) back to byte-aligned rows.
+
+        In that layout glyph `i` is ceil(rows / 8) pages of `page_widths[i]` column bytes
+        (least significant bit on top) from byte `starts[i]` of `data`, where rows is
+        `glyph_height` or its box's rows (see `glyph_pages`).
+
+        Args:
+            glyph_height (int): Height (in pixels) of every glyph.
+            data (bytes-like): The page-major bitmaps (`glyph_bitmaps[]`).
+            page_widths (list[int]): True width of each glyph (`glyph_widths[]`).
+            starts (list[int]): Start of each glyph in bytes (`bitmap_starts[]`).
+            unpadded_widths (list[int]): Visual advance of each glyph.
+            clusters (list[str] | None): Grapheme cluster of each glyph.
+            boxes (list[tuple] | None): (x_offset, y_offset, rows) of each glyph, for a header
+                written with tight boxes; the atlas returned is then boxed.
+
+        Returns:
+            GlyphAtlas: The same glyphs, row-major, e.g. for `debug.display_bitmap_row`.
+        """
+        atlas = cls(glyph_height, boxed=boxes is not None)
+        data = np.frombuffer(data, dtype=np.uint8)
+        clusters = clusters if clusters is not None else [None] * len(page_widths)
+        boxes = boxes if boxes is not None else [None] * len(page_widths)
+        for start, width, unpadded_width, cluster, box in zip(starts, page_widths, unpadded_widths, clusters, boxes):
+            rows = glyph_height if box is None else box[2]
+            pages = (rows + 7) // 8
+            columns = data[start:start + pages * width].reshape(pages, width, 1)
+            # (page, column, row) -> (page, row, column) -> rows
+            pixels = np.unpackbits(columns, axis=2, bitorder="little").transpose(0, 2, 1).reshape(pages * 8, width)
+            final_width = ((width + 7) // 8) * 8
+            cell = np.zeros((rows, final_width), dtype=np.uint8)
+            cell[:, :width] = pixels[:rows]
+            atlas.append(np.packbits(cell, axis=1).tobytes(), final_width, unpadded_width, cluster, box)
+        return atlas
+
+    def tight_boxes(self):
+        """
+        Returns a boxed copy of the atlas with every glyph cropped to its ink box.
+
+        Widths become the byte-aligned width of the box; advances and clusters are kept,
+        and pixel-identical boxes are stored once (see `deduplicate`).
+
+        Raises:
+            ValueError: If the atlas is already boxed.
+        """
+        if self.rows is not None:
+            raise ValueError("The atlas is already cropped to tight boxes")
+
+        boxed = GlyphAtlas(self.glyph_height, boxed=True)
+        for index in range(len(self.widths)):
+            with self.glyph(index) as view:
+                box = glyph_box(view, self.widths[index], self.glyph_height)
+                byte_array, final_width = crop_glyph(view, self.widths[index], self.glyph_height, box)
+            x_offset, y_offset, _, height = box
+            boxed.append(byte_array, final_width, self.unpadded_widths[index], self.clusters[index],
+                         (x_offset, y_offset, height))
+        boxed.deduplicate()
+        return boxed
+
+    def cells(self):
+        """
+        Returns a copy of a boxed atlas with every glyph expanded back to its full cell.
+
+        An atlas that is not boxed is returned as-is.
+        """
+        if self.rows is None:
+            return self
+
+        atlas = GlyphAtlas(self.glyph_height)
+        for index in range(len(self.widths)):
+            x_offset, y_offset, rows = self.x_offsets[index], self.y_offsets[index], self.rows[index]
+            width = self.widths[index]
+            final_width = ((x_offset + width + 7) // 8) * 8
+            pixels = np.zeros((self.glyph_height, final_width), dtype=np.uint8)
+            if width and rows:
+                with self.glyph(index) as view:
+                    box = np.unpackbits(np.frombuffer(view, dtype=np.uint8).reshape(rows, width // 8), axis=1)
+                pixels[y_offset:y_offset + rows, x_offset:x_offset + width] = box
+            atlas.append(np.packbits(pixels, axis=1).tobytes(), final_width, self.unpadded_widths[index],
+                         self.clusters[index])
+        return atlas
+
+    def glyph_rows(self, index):
+        """Number of rows stored for glyph `index` (GLYPH_HEIGHT unless the atlas is boxed)."""
+        return self.glyph_height if self.rows is None else self.rows[index]
+
+    def deduplicate(self):
+        """
+        Stores pixel-identical bitmaps once, pointing the starts of every copy at the first.
+
+        Glyph indices, widths and clusters are unchanged; only `data` and `starts` shrink.
+
+        Returns:
+            tuple: (duplicates, bytes_saved), the number of glyphs now sharing an earlier
+            glyph's bitmap and the number of bytes removed from `data`.
+        """
+        data = bytearray()
+        starts = array('I')
+        seen = {}
+        duplicates = 0
+        for index in range(len(self.widths)):
+            with self.glyph(index) as view:
+                key = glyph_content_key(view, self.widths[index])
+                start = seen.get(key)
+                if start is None:
+                    start = seen[key] = len(data)
+                    data.extend(view)
+                else:
+                    duplicates += 1
+            starts.append(start)
+
+        bytes_saved = len(self.data) - len(data)
+        self.data = data
+        self.starts = starts
+        return duplicates, bytes_saved
+
+    def near_duplicates(self, max_distance):
+        """
+        Groups glyphs whose bitmaps differ by at most `max_distance` pixels.
+
+        Only glyphs of the same size (and, in a boxed atlas, the same box position) are
+        compared. Distances (see `hamming_distances`) are computed for a block of glyphs
+        against the later glyphs of their group at a time, so memory stays bounded by
+        `DISTANCE_BLOCK_ELEMENTS` however large a group is. Going through the
+        glyphs in index order, each glyph not yet grouped is kept and takes every later,
+        ungrouped glyph within `max_distance` of it, so every merged glyph stays within
+        `max_distance` of the bitmap it is drawn with. With clusters numbered by frequency
+        (see `preprocess_strings.build_char_and_index_lists`), the commoner glyph is kept.
+
+        Args:
+            max_distance (int): Largest number of differing pixels to merge. 0 only groups
+                pixel-identical glyphs.
+
+        Returns:
+            list[tuple]: (kept index, [(merged index, distance), ...]) for every kept glyph
+            that has near-duplicates, in index order. The atlas is not changed (see `merge`).
+        """
+        groups = {}
+        for index in range(len(self.widths)):
+            shape = (self.widths[index], self.glyph_rows(index))
+            if self.rows is not None:
+                shape += (self.x_offsets[index], self.y_offsets[index])
+            groups.setdefault(shape, []).append(index)
+
+        merges = []
+        for indices in groups.values():
+            if len(indices) < 2 or not len(self.glyph(indices[0])):
+                continue
+            bits, ink = _unpacked_bits(
+                np.array([np.frombuffer(self.glyph(index), dtype=np.uint8) for index in indices]))
+            count = len(indices)
+            merged = np.zeros(count, dtype=bool)
+            block = max(1, DISTANCE_BLOCK_ELEMENTS // count)
+            for first in range(0, count, block):
+                last = min(first + block, count)
+                # Distances from this block's glyphs to every glyph from `first` on
+                distances = _bit_distances(bits[first:last], ink[first:last], bits[first:], ink[first:])
+                for i in range(first, last):
+                    if merged[i]:
+                        continue
+                    row = distances[i - first]
+                    near = np.flatnonzero(~merged[first:] & (row <= max_distance)) + first
+                    near = near[near > i]
+                    if near.size:
+                        merged[near] = True
+                        merges.append((indices[i], [(indices[j], int(row[j - first])) for j in near]))
+        merges.sort()
+        return merges
+
+    def merge(self, merges):
+        """
+        Points every merged glyph at the bitmap of the glyph it was merged into.
+
+        Glyph indices, widths, advances and clusters are unchanged. Run `deduplicate`
+        afterwards to drop the bitmaps no glyph uses any more.
+
+        Args:
+            merges (list[tuple]): (kept index, [(merged index, distance), ...]) entries, as
+                returned by `near_duplicates`.
+
+        Returns:
+            int: Number of glyphs merged.
+        """
+        merged = 0
+        for kept, near in merges:
+            for index, _ in near:
+                self.starts[index] = self.starts[kept]
+                merged += 1
+        return merged
+
+    def __len__(self):
+        return len(self.widths)
+
+    def __contains__(self, cluster):
+        return cluster in self._index
+
+    def glyph(self, index):
+        """
+        Returns the packed bytes of glyph `index` as a zero-copy `memoryview` into `data`.
+
+        Release the view (or let it go out of scope) before appending more glyphs.
+        """
+        start = self.starts[index]
+        return memoryview(self.data)[start:start + (self.widths[index] // 8) * self.glyph_rows(index)]
+
+    def index_of(self, cluster):
+        """
+        Returns the glyph index of a grapheme cluster.
+
+        Raises:
+            KeyError: If the cluster is not in the atlas.
+        """
+        return self._index[cluster]
+
+    def lookup(self, cluster):
+        """
+        Returns (view, final_width, unpadded_width) for a grapheme cluster.
+
+        Raises:
+            KeyError: If the cluster is not in the atlas.
+        """
+        index = self._index[cluster]
+        return self.glyph(index), self.widths[index], self.unpadded_widths[index]
+
+    def records(self):
+        """Yields (view, final_width, unpadded_width) for every glyph, in order."""
+        for index in range(len(self.widths)):
+            yield self.glyph(index), self.widths[index], self.unpadded_widths[index]
+
+    @property
+    def nbytes(self):
+        """Total size of the packed bitmaps in bytes."""
+        return len(self.data)
@@ -0,0 +1,155 @@
+"""
+Binary Atlas File: a Versioned Container for a GlyphAtlas.
+
+The generated C headers are meant for the compiler, not for tools: reading them back
+means parsing C source, and a display driven from an SD card or SPI flash cannot stream
+glyphs out of them. An atlas file holds the same glyphs in a fixed binary layout,
+little-endian throughout:
+
+    offset 0              header (64 bytes, see `_HEADER`)
+    index_offset          glyph index: one 12-byte entry per glyph (see `_INDEX_ENTRY`)
+    clusters_offset       grapheme cluster of each glyph, UTF-8, NUL-separated (optional)
+    data_offset           packed bitmaps, starting on a `DATA_ALIGNMENT` boundary
+
+Bitmaps are packed exactly like `GlyphAtlas.data` (rows top to bottom, byte-aligned,
+MSB = leftmost pixel) whatever storage options the header was written with, and
+deduplicated glyphs share one copy. Index entries hold the glyph's start offset inside
+the bitmap data, so a reader can seek straight to any glyph, and page-aligned data can
+be read in whole flash pages or SD card sectors.
+
+`read_atlas_file` memory-maps a file and returns a `GlyphAtlas` whose glyph views point
+into the mapping, so nothing is copied or re-rendered to inspect an atlas.
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from lao_messages_app_variable_width.glyph_atlas import GlyphAtlas
+
+ATLAS_FILE_MAGIC = b"LAOATLAS"
+# Bump whenever the layout changes; readers refuse versions they do not know
+ATLAS_FILE_VERSION = 1
+# Bitmap data starts on a multiple of this (a memory page, and a multiple of flash pages / SD sectors)
+DATA_ALIGNMENT = 4096
+
+# Header flags
+FLAG_BOXED = 0x1       # index rows/x_offset/y_offset give each glyph's box inside its cell
+FLAG_CLUSTERS = 0x2    # the file holds the grapheme cluster of each glyph
+
+# magic, version, header size, glyph height, flags, glyph count,
+# index offset, clusters offset, clusters size, data offset, data size
+_HEADER = struct.Struct("<8sHHHHIIIIII")
+_HEADER_SIZE = 64
+
+# start (within the bitmap data), byte-aligned width, unpadded width, rows, x offset, y offset, reserved
+_INDEX_ENTRY = np.dtype([("start", "<u4"), ("width", "<u2"), ("unpadded_width", "<u2"),
+                         ("rows", "u1"), ("x_offset", "u1"), ("y_offset", "u1"), ("reserved", "u1")])
+
+
+def atlas_path_for_header(output_header):
+    """
+    Path of the atlas file written alongside a header,
+    e.g. ./arduino_code/glyph_bitmaps.h -> ./arduino_code/glyph_bitmaps.atlas
+    """
+    return os.path.splitext(output_header)[0] + ".atlas"
+
+
+def write_atlas_file(path, atlas):
+    """
+    Writes an atlas to a binary atlas file.
+
+    Args:
+        path (str): Output file path.
+        atlas (GlyphAtlas): Glyphs to write, full cells or boxed. Clusters are stored when
+            every glyph has one.
+
+    Returns:
+        int: Size of the written file in bytes.
+
+    Raises:
+        ValueError: If the glyph height or a boxed glyph's rows do not fit the format.
+    """
+    glyph_count = len(atlas)
+    if atlas.glyph_height > 255:
+        raise ValueError(f"Glyph height {atlas.glyph_height} does not fit in an atlas file (at most 255)")
+
+    index = np.zeros(glyph_count, dtype=_INDEX_ENTRY)
+    index["start"] = atlas.starts
+    index["width"] = atlas.widths
+    index["unpadded_width"] = atlas.unpadded_widths
+    flags = 0
+    if atlas.rows is not None:
+        flags |= FLAG_BOXED
+        index["rows"] = atlas.rows
+        index["x_offset"] = atlas.x_offsets
+        index["y_offset"] = atlas.y_offsets
+    else:
+        index["rows"] = atlas.glyph_height
+
+    clusters = b""
+    if glyph_count and all(cluster is not None for cluster in atlas.clusters):
+        flags |= FLAG_CLUSTERS
+        clusters = "\0".join(atlas.clusters).encode("utf-8")
+
+    index_offset = _HEADER_SIZE
+    clusters_offset = index_offset + index.nbytes
+    data_offset = -(-(clusters_offset + len(clusters)) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+    header = _HEADER.pack(ATLAS_FILE_MAGIC, ATLAS_FILE_VERSION, _HEADER_SIZE, atlas.glyph_height, flags,
+                          glyph_count, index_offset, clusters_offset, len(clusters), data_offset, len(atlas.data))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        f.write(index.tobytes())
+        f.write(clusters)
+        f.write(b"\0" * (data_offset - f.tell()))
+        f.write(atlas.data)
+        return f.tell()
+
+
+def read_atlas_file(path):
+    """
+    Memory-maps an atlas file and returns its glyphs as a read-only `GlyphAtlas`.
+
+    Glyph views (`GlyphAtlas.glyph`, `lookup`, `records`) are zero-copy slices of the
+    mapping, which stays open for as long as the atlas or any view is alive. Only the
+    small index tables are copied.
+
+    Args:
+        path (str): Atlas file written by `write_atlas_file`.
+
+    Returns:
+        GlyphAtlas: The glyphs, boxed if the file is.
+
+    Raises:
+        ValueError: If the file is not an atlas file, has an unsupported version or is truncated.
+    """
+    with open(path, "rb") as f:
+        # The mapping keeps its own handle, so the file can be closed straight away
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapping) < _HEADER.size or mapping[:len(ATLAS_FILE_MAGIC)] != ATLAS_FILE_MAGIC:
+        raise ValueError(f"{path} is not a glyph atlas file")
+    (_, version, _, glyph_height, flags, glyph_count, index_offset, clusters_offset, clusters_size,
+     data_offset, data_size) = _HEADER.unpack_from(mapping)
+    if version != ATLAS_FILE_VERSION:
+        raise ValueError(f"{path} is atlas file version {version}; this reader supports version {ATLAS_FILE_VERSION}")
+    if data_offset + data_size > len(mapping) or index_offset + glyph_count * _INDEX_ENTRY.itemsize > len(mapping):
+        raise ValueError(f"{path} is truncated")
+
+    index = np.frombuffer(mapping, dtype=_INDEX_ENTRY, count=glyph_count, offset=index_offset)
+    clusters = None
+    if flags & FLAG_CLUSTERS:
+        clusters = bytes(mapping[clusters_offset:clusters_offset + clusters_size]).decode("utf-8").split("\0")
+    boxes = None
+    if flags & FLAG_BOXED:
+        boxes = zip(index["x_offset"].tolist(), index["y_offset"].tolist(), index["rows"].tolist())
+
+    data = memoryview(mapping)[data_offset:data_offset + data_size]
+    return GlyphAtlas.from_tables(glyph_height, data, index["width"].tolist(), index["unpadded_width"].tolist(),
+                                  index["start"].tolist(), clusters, boxes)
@@ -0,0 +1,174 @@
+"""
+Persistent On-Disk Cache of Packed Glyph Records.
+
+Rendering a grapheme cluster is deterministic for a given font file, cluster,
+glyph height and render settings, so its packed bitmap can be reused across runs
+of `main.py` and `visualize.py`. Records are stored in a SQLite database keyed by a
+hash of those inputs (content addressed), with a size cap enforced by evicting the
+least recently used records.
+
+SQLite takes care of locking, so several builds may share one cache directory.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = "./.glyph_cache/glyphs.sqlite3"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+# Bump whenever the rendering pipeline changes its output, so stale records are never hit
+CACHE_VERSION = 2
+
+# Approximate per-row cost on top of the bitmap bytes (key, widths, timestamps)
+RECORD_OVERHEAD = 96
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def make_cache_key(font_hash, cluster, GLYPH_HEIGHT, render_params):
+    """
+    Builds the content-addressed key of one glyph record.
+
+    Args:
+        font_hash (str): SHA-256 of the font file (`FontContext.font_hash`).
+        cluster (str): Grapheme cluster.
+        GLYPH_HEIGHT (int): Height (in pixels) of the glyph.
+        render_params (str): Any other setting that changes the rendered pixels.
+
+    Returns:
+        str: Hex digest identifying the record.
+    """
+    key_source = "\x00".join((str(CACHE_VERSION), font_hash, cluster, str(GLYPH_HEIGHT), render_params))
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+class GlyphCache:
+    """
+    Size-capped LRU cache of packed glyph records, stored in SQLite.
+
+    A record is (data, final_width, unpadded_width) exactly as returned by
+    `generate_bitmaps.render_and_pack`.
+
+    Args:
+        path (str): Database file; its directory is created if needed.
+        max_bytes (int): Approximate size cap; least recently used records are
+            evicted once the stored records exceed it.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE.
+        # The timeout makes concurrent builds wait for each other's locks instead of failing.
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS glyphs ("
+            " key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " width INTEGER NOT NULL,"
+            " unpadded_width INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS glyphs_last_used ON glyphs (last_used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the database connection."""
+        self._conn.close()
+
+    def get_many(self, keys):
+        """
+        Looks up several records and marks the hits as recently used.
+
+        Args:
+            keys (list[str]): Keys from `make_cache_key`.
+
+        Returns:
+            dict[str, tuple]: key -> (data, final_width, unpadded_width) for every hit.
+        """
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[i:i + _LOOKUP_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, data, width, unpadded_width FROM glyphs WHERE key IN ({placeholders})", batch)
+            for key, data, width, unpadded_width in rows:
+                found[key] = (bytes(data), width, unpadded_width)
+
+        if found:
+            now = time.time()
+            self._write(lambda: self._conn.executemany(
+                "UPDATE glyphs SET last_used = ? WHERE key = ?", [(now, key) for key in found]))
+        return found
+
+    def get(self, key):
+        """Returns the record for `key`, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, records):
+        """
+        Stores several records, then evicts old ones if the cache is over its size cap.
+
+        Args:
+            records (iterable[tuple]): (key, data, final_width, unpadded_width) tuples.
+        """
+        now = time.time()
+        rows = [(key, bytes(data), width, unpadded_width, len(data) + RECORD_OVERHEAD, now)
+                for key, data, width, unpadded_width in records]
+        if not rows:
+            return
+
+        def insert_and_evict():
+            self._conn.executemany("INSERT OR REPLACE INTO glyphs VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._evict()
+
+        self._write(insert_and_evict)
+
+    def put(self, key, data, final_width, unpadded_width):
+        """Stores a single record."""
+        self.put_many([(key, data, final_width, unpadded_width)])
+
+    def total_bytes(self):
+        """Returns the approximate size of all stored records."""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM glyphs").fetchone()[0]
+
+    def _evict(self):
+        # Must run inside a write transaction
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM glyphs ORDER BY last_used"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM glyphs WHERE key = ?", victims)
+
+    def _write(self, operation):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue on
+        # the busy timeout rather than failing with a deadlock halfway through.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            operation()
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
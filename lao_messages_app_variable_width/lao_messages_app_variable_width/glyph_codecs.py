@@ -0,0 +1,339 @@
+"""
+Per-Glyph Compression Codecs for glyph_bitmaps[].
+
+Each glyph can be stored with whichever of these codecs gives the smallest result;
+the choice is recorded per glyph in `glyph_codecs[]` of the generated header and the
+Arduino sketch decodes it into its RAM glyph buffer before drawing:
+
+- "raw": The packed rows as-is (copied with memcpy_P).
+- "rle": Every row is XORed with the row above it, which turns vertical strokes into
+  zero bytes, then the bytes are run-length encoded.
+- "lz":  LZ77 with a 256-byte window over the raw rows; matches may overlap, so a
+  repeated row costs two bytes.
+- "delta": A sparse XOR delta against an earlier glyph of the same size, e.g. a base
+  consonant for the same consonant with a tone mark. Only bytes that differ are stored.
+  The reference is never delta-coded itself, so the sketch decodes it (one level deep)
+  into the glyph buffer and then flips the differing bytes.
+
+Both compressed formats share one control-byte layout, chosen so the decoders are a
+few lines of C that never need more RAM than the glyph buffer itself:
+
+    control < 128   literal run: the next control + 1 bytes are copied
+    control >= 128  "rle": the next byte is repeated control - 126 times (2..129)
+                    "lz":  the next byte is distance - 1; control - 125 bytes (3..130)
+                           are copied from `distance` bytes back in the output
+
+Decoders stop once the glyph's `(glyph_width / 8) * GLYPH_HEIGHT` bytes are produced, so
+no compressed size needs storing.
+
+"delta" has its own layout: the reference's glyph index (2 bytes, big-endian), a count of
+(skip, value) pairs (1 byte), then the pairs. Each pair XORs `value` into the byte `skip`
+bytes past the one after the previous pair; a (255, 0) pair just skips 256 bytes.
+"""
+
+import numpy as np
+
+# Codec name -> id stored in glyph_codecs[] (mirrored by GLYPH_CODEC_* in the header)
+CODEC_IDS = {"raw": 0, "rle": 1, "lz": 2, "delta": 3}
+CODECS = tuple(CODEC_IDS)
+
+_MAX_LITERAL = 128
+_MAX_RUN = 129
+_MIN_MATCH = 3
+_MAX_MATCH = 130
+_WINDOW = 256
+_MAX_DELTA_PAIRS = 255
+# The reference's glyph index is stored in two bytes
+_MAX_DELTA_REFERENCE = 0xFFFF
+_MAX_SKIP = 255
+
+# Set bits of every byte value, to count differing pixels
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+
+def _flush_literals(out, literals):
+    for i in range(0, len(literals), _MAX_LITERAL):
+        chunk = literals[i:i + _MAX_LITERAL]
+        out.append(len(chunk) - 1)
+        out.extend(chunk)
+    literals.clear()
+
+
+def _row_delta(data, bytes_per_row):
+    delta = bytearray(data)
+    for i in range(len(delta) - 1, bytes_per_row - 1, -1):
+        delta[i] ^= data[i - bytes_per_row]
+    return delta
+
+
+def encode_rle(data, bytes_per_row):
+    """Row-delta then run-length encodes one packed glyph (see module docstring)."""
+    delta = _row_delta(data, bytes_per_row)
+    out = bytearray()
+    literals = bytearray()
+    i = 0
+    n = len(delta)
+    while i < n:
+        run = 1
+        while i + run < n and run < _MAX_RUN and delta[i + run] == delta[i]:
+            run += 1
+        # A run of two only pays off when it doesn't split a literal run
+        if run >= 3 or (run == 2 and not literals):
+            _flush_literals(out, literals)
+            out.append(run + 126)
+            out.append(delta[i])
+            i += run
+        else:
+            literals.append(delta[i])
+            i += 1
+    _flush_literals(out, literals)
+    return bytes(out)
+
+
+def encode_lz(data, bytes_per_row):
+    """LZ77-encodes one packed glyph with a 256-byte window (see module docstring)."""
+    out = bytearray()
+    literals = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        best_length = 0
+        best_distance = 0
+        longest = min(_MAX_MATCH, n - i)
+        for distance in range(1, min(i, _WINDOW) + 1):
+            length = 0
+            # Overlapping matches are fine: the decoder copies byte by byte
+            while length < longest and data[i + length - distance] == data[i + length]:
+                length += 1
+            if length > best_length:
+                best_length = length
+                best_distance = distance
+                if length == longest:
+                    break
+
+        if best_length >= _MIN_MATCH:
+            _flush_literals(out, literals)
+            out.append(best_length + 125)
+            out.append(best_distance - 1)
+            i += best_length
+        else:
+            literals.append(data[i])
+            i += 1
+    _flush_literals(out, literals)
+    return bytes(out)
+
+
+def decode_rle(payload, size, bytes_per_row):
+    """Inverse of `encode_rle`; mirrors decodeRowDeltaRle() in the Arduino sketch."""
+    out = bytearray()
+    src = 0
+    while len(out) < size:
+        control = payload[src]
+        if control < 128:
+            out.extend(payload[src + 1:src + 2 + control])
+            src += control + 2
+        else:
+            out.extend(payload[src + 1:src + 2] * (control - 126))
+            src += 2
+    for i in range(bytes_per_row, size):
+        out[i] ^= out[i - bytes_per_row]
+    return bytes(out)
+
+
+def decode_lz(payload, size, bytes_per_row):
+    """Inverse of `encode_lz`; mirrors decodeLz() in the Arduino sketch."""
+    out = bytearray()
+    src = 0
+    while len(out) < size:
+        control = payload[src]
+        if control < 128:
+            out.extend(payload[src + 1:src + 2 + control])
+            src += control + 2
+        else:
+            distance = payload[src + 1] + 1
+            for _ in range(control - 125):
+                out.append(out[-distance])
+            src += 2
+    return bytes(out)
+
+
+def encode_delta(data, reference_index, reference):
+    """
+    Sparse XOR-delta encodes one packed glyph against a reference glyph (see module docstring).
+
+    Args:
+        data (bytes-like): Packed rows of the glyph.
+        reference_index (int): Glyph index of the reference, stored in the payload.
+        reference (bytes-like): Packed rows of the reference, the same size as `data`.
+
+    Returns:
+        bytes | None: The encoded glyph, or None if the delta needs more than 255 pairs or
+        the reference index does not fit in two bytes.
+    """
+    if reference_index > _MAX_DELTA_REFERENCE:
+        return None
+    out = bytearray((reference_index >> 8, reference_index & 0xFF, 0))
+    pairs = 0
+    position = 0
+    for offset in np.flatnonzero(np.frombuffer(data, dtype=np.uint8) != np.frombuffer(reference, dtype=np.uint8)):
+        skip = int(offset) - position
+        while skip > _MAX_SKIP:
+            out += bytes((_MAX_SKIP, 0))
+            pairs += 1
+            skip -= _MAX_SKIP + 1
+        out += bytes((skip, data[offset] ^ reference[offset]))
+        pairs += 1
+        position = int(offset) + 1
+        if pairs > _MAX_DELTA_PAIRS:
+            return None
+    out[2] = pairs
+    return bytes(out)
+
+
+def delta_reference(payload):
+    """Glyph index of the reference a "delta" payload is encoded against."""
+    return (payload[0] << 8) | payload[1]
+
+
+def decode_delta(payload, size, reference):
+    """Inverse of `encode_delta`, given the decoded reference; mirrors applyXorDelta() in the sketch."""
+    out = bytearray(reference[:size])
+    position = 0
+    for i in range(payload[2]):
+        position += payload[3 + 2 * i]
+        out[position] ^= payload[4 + 2 * i]
+        position += 1
+    return bytes(out)
+
+
+class DeltaReferences:
+    """
+    Glyphs later glyphs may be delta-coded against, with a vectorized search for the closest.
+
+    Only glyphs of the same packed size and row width can be compared. Glyphs that are
+    delta-coded themselves should not be added, so a delta never needs another delta.
+    """
+
+    def __init__(self):
+        # (bytes_per_row, size) -> [glyph indices, (n, size) uint8 matrix of their bytes, n]
+        self._groups = {}
+
+    def add(self, glyph_index, data, bytes_per_row):
+        """Makes glyph `glyph_index` (packed rows `data`) available as a reference."""
+        key = (bytes_per_row, len(data))
+        group = self._groups.setdefault(key, [[], np.zeros((16, len(data)), dtype=np.uint8), 0])
+        indices, matrix, count = group
+        if count == len(matrix):
+            # Grow by doubling, so adding n glyphs copies O(n) rows
+            matrix = np.concatenate((matrix, np.zeros_like(matrix)))
+            group[1] = matrix
+        matrix[count] = np.frombuffer(data, dtype=np.uint8)
+        indices.append(glyph_index)
+        group[2] = count + 1
+
+    def closest(self, data, bytes_per_row):
+        """
+        The reference with the fewest pixels differing from `data`.
+
+        Returns:
+            tuple | None: (glyph index, packed rows) of the reference, or None if no glyph of
+            the same size has been added.
+        """
+        group = self._groups.get((bytes_per_row, len(data)))
+        if group is None or not len(data):
+            return None
+        indices, matrix, count = group
+        differences = _POPCOUNT[matrix[:count] ^ np.frombuffer(data, dtype=np.uint8)].sum(axis=1)
+        best = int(np.argmin(differences))
+        return indices[best], matrix[best].tobytes()
+
+
+_ENCODERS = {
+    "raw": lambda data, bytes_per_row: bytes(data),
+    "rle": encode_rle,
+    "lz": encode_lz,
+}
+
+_DECODERS = {
+    "raw": lambda payload, size, bytes_per_row: bytes(payload[:size]),
+    "rle": decode_rle,
+    "lz": decode_lz,
+}
+
+
+def encode_glyph(codec, data, bytes_per_row):
+    """
+    Encodes one packed glyph.
+
+    Args:
+        codec (str): One of `CODECS`.
+        data (bytes-like): Packed rows of the glyph.
+        bytes_per_row (int): Bytes per row (byte-aligned width / 8).
+
+    Returns:
+        bytes: The encoded glyph.
+
+    Raises:
+        ValueError: For an unknown codec, or "delta" (see `encode_delta`).
+    """
+    if codec == "delta":
+        raise ValueError("The 'delta' codec needs a reference glyph, see encode_delta")
+    try:
+        encode = _ENCODERS[codec]
+    except KeyError:
+        raise ValueError(f"Unknown glyph codec '{codec}', expected one of: {', '.join(CODECS)}")
+    return encode(data, bytes_per_row)
+
+
+def decode_glyph(codec, payload, size, bytes_per_row, reference=None):
+    """
+    Decodes one glyph back to its `size` packed bytes.
+
+    Args:
+        codec (str): One of `CODECS`.
+        payload (bytes-like): Encoded glyph; may run on into following glyphs.
+        size (int): Packed size of the glyph in bytes.
+        bytes_per_row (int): Bytes per row (byte-aligned width / 8).
+        reference (bytes-like | None): For "delta", the decoded reference glyph (the glyph
+            whose index `delta_reference` reads from the payload).
+
+    Returns:
+        bytes: The packed rows of the glyph.
+    """
+    if codec == "delta":
+        return decode_delta(payload, size, reference)
+    return _DECODERS[codec](payload, size, bytes_per_row)
+
+
+def compress_glyph(data, bytes_per_row, codecs=CODECS, reference=None):
+    """
+    Encodes a glyph with each of `codecs` and keeps the smallest result.
+
+    Ties go to the codec listed first, so list cheaper decoders first ("raw" is
+    always considered, as the fallback).
+
+    Args:
+        data (bytes-like): Packed rows of the glyph.
+        bytes_per_row (int): Bytes per row (byte-aligned width / 8).
+        codecs (iterable[str]): Codecs to try.
+        reference (tuple | None): (glyph index, packed rows) of the glyph to try "delta"
+            against, e.g. from `DeltaReferences.closest`. "delta" is skipped without one.
+
+    Returns:
+        tuple: (codec, payload).
+    """
+    best_codec = "raw"
+    best_payload = bytes(data)
+    for codec in codecs:
+        if codec == "delta":
+            if reference is None:
+                continue
+            payload = encode_delta(data, *reference)
+            if payload is None:
+                continue
+        else:
+            payload = encode_glyph(codec, data, bytes_per_row)
+        if len(payload) < len(best_payload):
+            best_codec = codec
+            best_payload = payload
+    return best_codec, best_payload
@@ -0,0 +1,192 @@
+"""
+Compositional Glyph Encoding: Bases and Marks Stored Once.
+
+A precomposed atlas stores one bitmap per grapheme cluster, so covering every Lao
+consonant x vowel x tone mark combination costs flash for every combination.
+`GlyphComposition` instead stores each component glyph (consonant, vowel, tone mark)
+once, plus a small per-cluster table of which components to draw and at which pixel
+offset inside the cluster's cell. The sketch ORs the components together when drawing,
+so flash grows with the number of components rather than the number of combinations.
+
+Offsets are taken from the same HarfBuzz positions the "mono" render mode uses (see
+`generate_bitmaps.place_mono_glyphs`), and components are clipped to the cell rows the
+same way, so a composed cluster is pixel-identical to its "mono" rendering.
+"""
+
+import math
+from array import array
+
+import numpy as np
+
+from lao_messages_app_variable_width.glyph_atlas import GlyphAtlas, glyph_content_key
+
+# The combinations enumerated by Experimentation/my-font-tools-project/generate_all_lao_combos.py
+LAO_BASES = "ກຂຄງຈຊຍຏຑຒດຕຖທນບປຜຝພຟມຢຣລວສຫອຮຯ"
+LAO_VOWELS_ABOVE_BELOW = "ະັາຳິີຶືຸູ"
+LAO_VOWELS_SIDE = "ເແໂໃໄ"
+LAO_TONES = "່້໊໋"
+
+
+def lao_combination_clusters():
+    """
+    Every base consonant alone and combined with an above/below vowel and/or a tone mark,
+    plus the standalone side vowels: a full-coverage cluster set for composition.
+
+    Returns:
+        list[str]: The clusters, in the order of generate_all_lao_combos.py.
+    """
+    clusters = list(LAO_BASES)
+    clusters += [base + vowel for base in LAO_BASES for vowel in LAO_VOWELS_ABOVE_BELOW]
+    clusters += [base + tone for base in LAO_BASES for tone in LAO_TONES]
+    clusters += [base + vowel + tone for base in LAO_BASES for vowel in LAO_VOWELS_ABOVE_BELOW for tone in LAO_TONES]
+    clusters += list(LAO_VOWELS_SIDE)
+    return clusters
+
+
+class GlyphComposition:
+    """
+    Component bitmaps of one height and the tables composing grapheme clusters from them.
+
+    Component `c` occupies `(component_widths[c] // 8) * component_rows[c]` bytes of
+    `component_data` from `component_starts[c]`, packed like `GlyphAtlas` glyphs.
+    Cluster `i` is drawn by ORing components `composition_components[j]` at
+    (`x_offsets[j]`, `y_offsets[j]`) inside its GLYPH_HEIGHT-row cell, for j from
+    `composition_starts[i]` to `composition_starts[i + 1]`; rows falling outside the
+    cell are clipped.
+
+    Attributes:
+        glyph_height (int): Height (in pixels) of every cluster's cell.
+        component_data (bytearray): Packed bitmaps of all components, consecutively.
+        component_widths (array): Byte-aligned width of each component ('H').
+        component_rows (array): Rows of each component ('H').
+        component_starts (array): Start offset (in bytes) of each component ('I').
+        widths (array): Ink width of each cluster ('H').
+        unpadded_widths (array): Visual advance of each cluster ('H').
+        composition_starts (array): First composition entry of each cluster, plus an end entry ('I').
+        composition_components (array): Component id of each composition entry ('H').
+        x_offsets (array): Column of each entry's component inside the cell ('h').
+        y_offsets (array): Row of each entry's component inside the cell ('h').
+        clusters (list[str | None]): Grapheme cluster of each composed glyph.
+    """
+
+    __slots__ = ("glyph_height", "component_data", "component_widths", "component_rows", "component_starts",
+                 "widths", "unpadded_widths", "composition_starts", "composition_components", "x_offsets",
+                 "y_offsets", "clusters", "_component_ids", "_component_keys")
+
+    def __init__(self, glyph_height):
+        self.glyph_height = glyph_height
+        self.component_data = bytearray()
+        self.component_widths = array('H')
+        self.component_rows = array('H')
+        self.component_starts = array('I')
+        self.widths = array('H')
+        self.unpadded_widths = array('H')
+        self.composition_starts = array('I', [0])
+        self.composition_components = array('H')
+        self.x_offsets = array('h')
+        self.y_offsets = array('h')
+        self.clusters = []
+        # Font glyph index -> component id, and content key -> component id
+        self._component_ids = {}
+        self._component_keys = {}
+
+    def add_component(self, glyph_index, glyph_ink):
+        """
+        Stores a component glyph once and returns its id.
+
+        Args:
+            glyph_index (int): Font glyph id; later calls with the same id reuse the component.
+            glyph_ink (numpy.ndarray): (rows, width) boolean array of the glyph, True = ink.
+
+        Returns:
+            int: Component id. Pixel-identical glyphs share one component.
+        """
+        component = self._component_ids.get(glyph_index)
+        if component is not None:
+            return component
+
+        byte_array = np.packbits(glyph_ink, axis=1).tobytes()
+        final_width = ((glyph_ink.shape[1] + 7) // 8) * 8
+        key = (glyph_ink.shape[0], glyph_content_key(byte_array, final_width))
+        component = self._component_keys.get(key)
+        if component is None:
+            component = len(self.component_widths)
+            self.component_starts.append(len(self.component_data))
+            self.component_data += byte_array
+            self.component_widths.append(final_width)
+            self.component_rows.append(glyph_ink.shape[0])
+            self._component_keys[key] = component
+        self._component_ids[glyph_index] = component
+        return component
+
+    def append(self, placements, width, cluster=None):
+        """
+        Adds a composed cluster.
+
+        Args:
+            placements (list[tuple]): (component id, x_offset, y_offset) per component, drawn in order.
+            width (int): Ink width of the cluster, as its "mono" rendering is cropped.
+            cluster (str | None): Grapheme cluster the glyph renders.
+
+        Returns:
+            int: Index of the new glyph.
+        """
+        for component, x_offset, y_offset in placements:
+            self.composition_components.append(component)
+            self.x_offsets.append(x_offset)
+            self.y_offsets.append(y_offset)
+        self.composition_starts.append(len(self.composition_components))
+        self.widths.append(width)
+        # Same advance as `generate_bitmaps.pack_array` gives the precomposed glyph
+        self.unpadded_widths.append(width + math.ceil(self.glyph_height * 1/30))
+        self.clusters.append(cluster)
+        return len(self.widths) - 1
+
+    def __len__(self):
+        return len(self.widths)
+
+    def component(self, component):
+        """Returns a component as a (rows, byte-aligned width) uint8 array of 0/1."""
+        start = self.component_starts[component]
+        rows = self.component_rows[component]
+        bytes_per_row = self.component_widths[component] // 8
+        packed = np.frombuffer(self.component_data, dtype=np.uint8, count=rows * bytes_per_row, offset=start)
+        return np.unpackbits(packed.reshape(rows, bytes_per_row), axis=1)
+
+    def placements(self, index):
+        """Returns the (component id, x_offset, y_offset) entries of glyph `index`."""
+        entries = range(self.composition_starts[index], self.composition_starts[index + 1])
+        return [(self.composition_components[j], self.x_offsets[j], self.y_offsets[j]) for j in entries]
+
+    def compose(self, index):
+        """
+        Composes glyph `index` the way the sketch does.
+
+        Returns:
+            numpy.ndarray: Boolean array of shape (glyph_height, ink width), True = ink.
+        """
+        width = self.widths[index]
+        canvas = np.zeros((self.glyph_height, width), dtype=bool)
+        for component, x_offset, y_offset in self.placements(index):
+            pixels = self.component(component).astype(bool)
+            # Clip to the cell; columns past the ink width are blank padding
+            top, bottom = max(0, y_offset), min(self.glyph_height, y_offset + pixels.shape[0])
+            left, right = max(0, x_offset), min(width, x_offset + pixels.shape[1])
+            if top < bottom and left < right:
+                canvas[top:bottom, left:right] |= pixels[top - y_offset:bottom - y_offset, left - x_offset:right - x_offset]
+        return canvas
+
+    def records(self):
+        """Yields (byte_array, final_width, unpadded_width) of every composed glyph, packed as usual."""
+        for index in range(len(self.widths)):
+            final_width = ((self.widths[index] + 7) // 8) * 8
+            yield np.packbits(self.compose(index), axis=1).tobytes(), final_width, self.unpadded_widths[index]
+
+    def atlas(self):
+        """Returns the composed glyphs as a precomposed `GlyphAtlas`, e.g. for `debug` or a flash comparison."""
+        return GlyphAtlas.from_records(self.glyph_height, self.records(), self.clusters)
+
+    @property
+    def table_entries(self):
+        """Number of composition entries (component, x, y) over all glyphs."""
+        return len(self.composition_components)
@@ -0,0 +1,188 @@
+"""
+Tiled Glyph Encoding: an 8x8 Tile Dictionary Shared by All Glyphs.
+
+Whole-glyph deduplication only helps when two clusters render pixel-identically, but
+most redundancy in a Lao atlas is smaller than that: clusters built on the same
+consonant share most of their strokes, tone marks repeat over many bases, and a large
+part of every cell is blank. `GlyphTiles` cuts every glyph's cell into 8x8 tiles, stores
+each distinct tile once, and stores each glyph as a grid of tile ids.
+
+Tiles are 8x8 because that is one SSD1306 page high and one byte wide: each tile is
+stored page-major (8 column bytes, least significant bit on top, see
+`glyph_atlas.glyph_pages`) so the sketch can OR it straight into the display buffer.
+Tile 0 is always the blank tile, which the sketch skips without reading it.
+"""
+
+from array import array
+
+import numpy as np
+
+from lao_messages_app_variable_width.glyph_atlas import GlyphAtlas
+
+TILE_SIZE = 8
+BLANK_TILE = 0
+
+
+class GlyphTiles:
+    """
+    A tile dictionary and the tile grid of every glyph of one height.
+
+    Glyph `i` covers `widths[i] // 8` tile columns and `ceil(glyph_height / 8)` tile rows;
+    its tile ids are stored row by row in `tile_map`, from `tile_map_starts[i]`. Glyphs
+    with identical grids share one copy of it. Tile `t` occupies bytes `8 * t` to
+    `8 * t + 7` of `tile_data`.
+
+    Attributes:
+        glyph_height (int): Height (in pixels) of every glyph's cell.
+        tile_data (bytearray): Page-major bytes of every distinct tile, tile 0 being blank.
+        tile_map (array): Tile ids of all glyph grids ('I').
+        tile_map_starts (array): First `tile_map` entry of each glyph ('I').
+        widths (array): Byte-aligned width of each glyph ('H').
+        unpadded_widths (array): Visual advance of each glyph ('H').
+        clusters (list[str | None]): Grapheme cluster of each glyph.
+        tile_lookups (int): Tiles cut from glyphs so far.
+        tile_hits (int): Tiles that were already in the dictionary.
+        blank_tiles (int): Tiles that were blank (and are never drawn).
+    """
+
+    __slots__ = ("glyph_height", "tile_data", "tile_map", "tile_map_starts", "widths", "unpadded_widths",
+                 "clusters", "tile_lookups", "tile_hits", "blank_tiles", "_tile_ids", "_grid_starts")
+
+    def __init__(self, glyph_height):
+        self.glyph_height = glyph_height
+        self.tile_data = bytearray(TILE_SIZE)
+        self.tile_map = array('I')
+        self.tile_map_starts = array('I')
+        self.widths = array('H')
+        self.unpadded_widths = array('H')
+        self.clusters = []
+        self.tile_lookups = 0
+        self.tile_hits = 0
+        self.blank_tiles = 0
+        # Tile bytes -> tile id, and tile grid -> its start in tile_map
+        self._tile_ids = {bytes(TILE_SIZE): BLANK_TILE}
+        self._grid_starts = {}
+
+    @classmethod
+    def from_atlas(cls, atlas, dedupe=True):
+        """
+        Tiles every glyph of an atlas.
+
+        Args:
+            atlas (GlyphAtlas): Glyphs to tile; a boxed atlas is tiled from its full cells.
+            dedupe (bool): Share one tile grid between glyphs whose grids are identical.
+
+        Returns:
+            GlyphTiles: The tiled glyphs.
+        """
+        if atlas.rows is not None:
+            atlas = atlas.cells()
+        tiles = cls(atlas.glyph_height)
+        for (byte_array, final_width, unpadded_width), cluster in zip(atlas.records(), atlas.clusters):
+            tiles.append(byte_array, final_width, unpadded_width, cluster, dedupe)
+        return tiles
+
+    @property
+    def tile_rows(self):
+        """Tile rows of every glyph."""
+        return -(-self.glyph_height // TILE_SIZE)
+
+    def append(self, byte_array, final_width, unpadded_width, cluster=None, dedupe=True):
+        """
+        Cuts a glyph into tiles, adding new tiles to the dictionary.
+
+        Args:
+            byte_array (bytes-like): Packed rows of the glyph's full cell.
+            final_width (int): Byte-aligned width of the glyph.
+            unpadded_width (int): Visual advance of the glyph.
+            cluster (str | None): Grapheme cluster the glyph renders.
+            dedupe (bool): Reuse an identical tile grid already in `tile_map`.
+
+        Returns:
+            int: Index of the new glyph.
+        """
+        tile_columns = final_width // TILE_SIZE
+        pixels = np.zeros((self.tile_rows * TILE_SIZE, final_width), dtype=np.uint8)
+        if tile_columns:
+            packed = np.frombuffer(byte_array, dtype=np.uint8).reshape(self.glyph_height, tile_columns)
+            pixels[:self.glyph_height] = np.unpackbits(packed, axis=1)
+        # (tile row, row, tile column, column) -> (tile row, tile column, column, row), then
+        # pack each tile column's 8 rows LSB first, as glyph_pages does
+        blocks = pixels.reshape(self.tile_rows, TILE_SIZE, tile_columns, TILE_SIZE).transpose(0, 2, 3, 1)
+        packed_tiles = np.packbits(blocks, axis=3, bitorder="little").reshape(-1, TILE_SIZE)
+
+        grid = []
+        for tile in packed_tiles:
+            key = tile.tobytes()
+            tile_id = self._tile_ids.get(key)
+            self.tile_lookups += 1
+            if tile_id is None:
+                tile_id = len(self.tile_data) // TILE_SIZE
+                self.tile_data += key
+                self._tile_ids[key] = tile_id
+            else:
+                self.tile_hits += 1
+                self.blank_tiles += tile_id == BLANK_TILE
+            grid.append(tile_id)
+
+        grid = tuple(grid)
+        start = self._grid_starts.get(grid) if dedupe else None
+        if start is None:
+            start = len(self.tile_map)
+            self.tile_map.extend(grid)
+            if dedupe:
+                self._grid_starts[grid] = start
+        self.tile_map_starts.append(start)
+        self.widths.append(final_width)
+        self.unpadded_widths.append(unpadded_width)
+        self.clusters.append(cluster)
+        return len(self.widths) - 1
+
+    def __len__(self):
+        return len(self.widths)
+
+    @property
+    def tile_count(self):
+        """Number of distinct tiles, the blank tile included."""
+        return len(self.tile_data) // TILE_SIZE
+
+    @property
+    def hit_rate(self):
+        """Share of the tiles cut from glyphs that were already in the dictionary."""
+        return self.tile_hits / self.tile_lookups if self.tile_lookups else 0.0
+
+    def tile(self, tile_id):
+        """Returns a tile as an (8, 8) uint8 array of 0/1, rows top to bottom."""
+        columns = np.frombuffer(self.tile_data, dtype=np.uint8, count=TILE_SIZE, offset=tile_id * TILE_SIZE)
+        return np.unpackbits(columns[:, None], axis=1, bitorder="little").T
+
+    def glyph_tiles(self, index):
+        """Returns the tile ids of glyph `index`, as a (tile rows, tile columns) list of lists."""
+        tile_columns = self.widths[index] // TILE_SIZE
+        start = self.tile_map_starts[index]
+        return [list(self.tile_map[start + row * tile_columns:start + (row + 1) * tile_columns])
+                for row in range(self.tile_rows)]
+
+    def glyph(self, index):
+        """
+        Reassembles glyph `index` from its tiles.
+
+        Returns:
+            numpy.ndarray: (glyph_height, byte-aligned width) uint8 array of 0/1.
+        """
+        width = self.widths[index]
+        pixels = np.zeros((self.tile_rows * TILE_SIZE, width), dtype=np.uint8)
+        for tile_row, tile_ids in enumerate(self.glyph_tiles(index)):
+            for tile_column, tile_id in enumerate(tile_ids):
+                pixels[tile_row * TILE_SIZE:(tile_row + 1) * TILE_SIZE,
+                       tile_column * TILE_SIZE:(tile_column + 1) * TILE_SIZE] = self.tile(tile_id)
+        return pixels[:self.glyph_height]
+
+    def records(self):
+        """Yields (byte_array, final_width, unpadded_width) of every glyph, packed as usual."""
+        for index in range(len(self.widths)):
+            yield np.packbits(self.glyph(index), axis=1).tobytes(), self.widths[index], self.unpadded_widths[index]
+
+    def atlas(self):
+        """Returns the tiled glyphs as a `GlyphAtlas`, e.g. for `debug` or to check the round trip."""
+        return GlyphAtlas.from_records(self.glyph_height, self.records(), self.clusters)
@@ -0,0 +1,90 @@
+"""
+Table-Driven Grapheme Segmentation for Lao Text.
+
+`grapheme.graphemes` runs the full Unicode segmentation state machine in pure Python,
+one character at a time, and on large phrase catalogues it dominates preprocessing.
+Lao text only ever needs a small part of it. In the Lao block (U+0E80-U+0EFF) every
+character is either an ordinary character, which starts a new cluster, or a mark
+(Extend: vowels above/below and tone marks; SpacingMark: ຳ), which never does; printable
+ASCII (spaces, digits, Latin letters, punctuation) is all ordinary too. So a string made
+only of those characters breaks before every ordinary character and nowhere else.
+
+`segment_clusters` checks for such strings with a character-class table and splits them
+with one precompiled regular expression, caching the result per distinct word. Any other
+string (other scripts, emoji, control characters, joiners) goes to `grapheme.graphemes`,
+so the result is always identical to it.
+
+The class table is built once, at import, from the `grapheme` package's own property
+data, so the fast path agrees with the fallback even for characters whose property
+changed between Unicode versions (e.g. U+0ECE).
+"""
+
+import re
+from functools import lru_cache
+
+import grapheme
+from grapheme.grapheme_property_group import GraphemePropertyGroup, get_group
+
+# Code point ranges the fast path handles: printable ASCII and the Lao block
+FAST_PATH_RANGES = ((0x20, 0x7E), (0x0E80, 0x0EFF))
+
+# Distinct words whose clusters are cached
+WORD_CACHE_SIZE = 1 << 16
+
+
+def _build_class_table():
+    """
+    Classifies every fast-path code point.
+
+    Returns:
+        dict: Code point -> 0 for an ordinary character (starts a cluster) or 1 for a
+        mark (Extend or SpacingMark: joins the cluster before it). Code points with any
+        other grapheme property are left out, so strings containing them take the fallback.
+    """
+    classes = {}
+    for first, last in FAST_PATH_RANGES:
+        for code_point in range(first, last + 1):
+            group = get_group(chr(code_point))
+            if group == GraphemePropertyGroup.OTHER:
+                classes[code_point] = 0
+            elif group in (GraphemePropertyGroup.EXTEND, GraphemePropertyGroup.SPACING_MARK):
+                classes[code_point] = 1
+    return classes
+
+
+def _char_class(code_points):
+    """Regular expression character class matching the given code points."""
+    return "[" + "".join(re.escape(chr(code_point)) for code_point in code_points) + "]"
+
+
+LAO_CHAR_CLASSES = _build_class_table()
+
+_FAST_PATH_STRING = re.compile(_char_class(LAO_CHAR_CLASSES) + "*")
+_MARKS = _char_class(code_point for code_point, is_mark in LAO_CHAR_CLASSES.items() if is_mark)
+# A cluster is an ordinary character and the marks after it, or marks at the very start
+_CLUSTER = re.compile(f"{_MARKS}+|.{_MARKS}*", re.DOTALL)
+# Clusters never span the break before a space, so a string splits into words at them
+_WORD = re.compile(" *[^ ]+| +")
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _word_clusters(word):
+    return tuple(_CLUSTER.findall(word))
+
+
+def segment_clusters(s):
+    """
+    Splits a string into grapheme clusters, exactly as `grapheme.graphemes` does.
+
+    Args:
+        s (str): Input string.
+
+    Returns:
+        list[str]: List of grapheme clusters.
+    """
+    if not _FAST_PATH_STRING.fullmatch(s):
+        return list(grapheme.graphemes(s))
+    clusters = []
+    for word in _WORD.findall(s):
+        clusters.extend(_word_clusters(word))
+    return clusters
@@ -1,40 +1,78 @@
 import lao_messages_app_variable_width.generate_bitmaps as bitmap_gen
 import lao_messages_app_variable_width.preprocess_strings as process_str
-from lao_messages_app_variable_width.debug import display_bitmap_row, print_char_and_index_lists
+from lao_messages_app_variable_width.debug import display_bitmap_row, preview_merges, print_char_and_index_lists
+from lao_messages_app_variable_width.glyph_cache import GlyphCache
+from lao_messages_app_variable_width.glyph_codecs import CODECS
 import os
 
 def main():
 
     input_csv_path = './input_files/input_strings.csv'
+    # A large catalogue can be kept compressed instead, e.g. input_strings.csv.gz
+    existing_csv_path = next((path for path in (input_csv_path, input_csv_path + '.gz', input_csv_path + '.xz',
+                                                input_csv_path + '.bz2') if os.path.exists(path)), None)
 
-    if os.path.exists(input_csv_path):
-        response = input("An existing input_strings.csv was found. Overwrite it? (y/N): ").strip().lower()
+    if existing_csv_path:
+        response = input(f"An existing {os.path.basename(existing_csv_path)} was found. Overwrite it? (y/N): ").strip().lower()
         if response == 'y':
             print("Overwriting input strings...")
-            input_list = process_str.get_input_strings()
-            process_str.save_strings_to_csv(input_list, input_csv_path)
+            input_strings = process_str.get_input_strings()
+            process_str.save_strings_to_csv(input_strings, input_csv_path)
         else:
             print("Loading input strings from existing CSV...")
-            input_list = process_str.get_input_strings_from_csv(input_csv_path)
+            # Streamed row by row, so catalogues of any size load in constant memory
+            input_strings = process_str.iter_input_strings_from_csv(existing_csv_path)
     else:
         print("No input_strings.csv found, generating input strings...")
-        input_list = process_str.get_input_strings()
-        process_str.save_strings_to_csv(input_list, input_csv_path)
+        input_strings = process_str.get_input_strings()
+        process_str.save_strings_to_csv(input_strings, input_csv_path)
     
     print("Identifying unique characters...")
-    char_list, index_list = process_str.build_char_and_index_lists(input_list)
+    # The most common clusters get the lowest ids, so they fit one-byte codes in all_phrases[]
+    char_list, index_list = process_str.build_char_and_index_lists(input_strings, by_frequency=True)
 
     print_char_and_index_lists(char_list, index_list)
 
     print("Generating bitmaps for characters...")
     while True:
         try:
-            GLYPH_HEIGHT = int(input("Enter chosen glyph height in pixels... (30 recommended) "))
+            # Several comma-separated heights produce one header per height in a single pass
+            GLYPH_HEIGHTS = [int(h) for h in input("Enter chosen glyph height in pixels, or several separated by commas... (30 recommended) ").split(",")]
             break
         except ValueError:
-            print("Please enter a valid integer.")
+            print("Please enter valid integers, e.g. 30 or 16,30.")
 
-    bytes_list, bitmap_widths, bitmap_start_indexes, unpadded_widths = bitmap_gen.generate_bitmaps_for_chars(char_list, GLYPH_HEIGHT, output_header="./arduino_code/glyph_bitmaps.h")
+    # Compression makes glyph_bitmaps[] smaller at the cost of decoding each glyph on the device
+    response = input("Compress glyph bitmaps to save flash? (y/N): ").strip().lower()
+    codecs = CODECS if response in ["y", "yes"] else None
+
+    # Lossy: glyphs that differ from a more common one by a few pixels can share its bitmap
+    merge_distance = None
+    while True:
+        response = input("Merge near-identical glyphs? Enter the most pixels they may differ by, or leave empty to keep every glyph exact: ").strip()
+        if response == "":
+            break
+        try:
+            merge_distance = int(response)
+            break
+        except ValueError:
+            print("Please enter a whole number of pixels, e.g. 2.")
+
+    # Clusters rendered by earlier runs are reused from the on-disk glyph cache
+    with GlyphCache() as cache:
+        if len(GLYPH_HEIGHTS) == 1:
+            GLYPH_HEIGHT = GLYPH_HEIGHTS[0]
+            atlas = bitmap_gen.generate_bitmaps_for_chars(char_list, GLYPH_HEIGHT, output_header="./arduino_code/glyph_bitmaps.h", cache=cache, codecs=codecs,
+                                                          merge_distance=merge_distance, merge_preview=preview_merges)
+        else:
+            atlases = bitmap_gen.generate_bitmaps_for_chars(char_list, GLYPH_HEIGHTS, output_header="./arduino_code/glyph_bitmaps.h", cache=cache, codecs=codecs,
+                                                            merge_distance=merge_distance, merge_preview=preview_merges)
+            for height in atlases:
+                print(f"{height}px glyphs written to {bitmap_gen.header_path_for_height('./arduino_code/glyph_bitmaps.h', height)}")
+            print("Rename the header for your display to glyph_bitmaps.h before uploading the sketch.")
+            # The debug display below shows the first height
+            GLYPH_HEIGHT = GLYPH_HEIGHTS[0]
+            atlas = atlases[GLYPH_HEIGHT]
 
     print("Writing index list to header file...")
     process_str.write_index_list_to_header(index_list, filename="./arduino_code/phrases_to_display.h")
@@ -42,7 +80,7 @@ def main():
     user_input = input("Would you like to display the whole bitmap for debugging? (y/N): ").strip().lower()
     if user_input in ["y", "yes"]:
         print("Displaying the whole bitmap...")
-        display_bitmap_row(bytes_list, GLYPH_HEIGHT, bitmap_widths, bitmap_start_indexes, unpadded_widths)  # Adjust width as needed
+        display_bitmap_row(atlas)
 
 
 
@@ -0,0 +1,219 @@
+"""
+Phrase Index: the Cluster Indices of Every Phrase in Two Flat Arrays.
+
+A list of Python int lists costs tens of bytes per cluster and one list object per
+phrase. `PhraseIndex` keeps the same data in compressed sparse row (CSR) layout, the
+way the sketch's `all_phrases[]` / `phrase_starts[]` tables do:
+
+    indices   cluster indices of all phrases, back to back ('I', 4 bytes each)
+    offsets   start of each phrase in `indices`, plus the total at the end ('I')
+
+Phrase `i` is `indices[offsets[i]:offsets[i + 1]]`, so its start and length are O(1)
+lookups and its indices a zero-copy slice. The arrays can be saved to and loaded from a
+small binary file (see `PhraseIndex.save`) in a single read, and `encoded` produces the
+bytes of `all_phrases[]` for the whole index at once.
+"""
+
+import os
+import struct
+from array import array
+
+import numpy as np
+
+PHRASE_INDEX_MAGIC = b"LAOPHRSE"
+# Bump whenever the layout changes; readers refuse versions they do not know
+PHRASE_INDEX_VERSION = 1
+
+# magic, version, reserved, phrase count, index count; followed by the offsets and the
+# indices, both little-endian uint32
+_HEADER = struct.Struct("<8sHHII")
+
+
+class PhraseIndex:
+    """
+    Cluster indices of a list of phrases, in CSR layout.
+
+    Behaves like a read-only list of phrases: `len()`, indexing and iteration give each
+    phrase as a `memoryview` of its cluster indices. Views point into `indices`, so
+    release them before appending more phrases.
+
+    Attributes:
+        indices (array): Cluster indices of all phrases, concatenated ('I').
+        offsets (array): Start of each phrase in `indices`, plus the total at the end ('I').
+    """
+
+    __slots__ = ("indices", "offsets")
+
+    def __init__(self, indices=None, offsets=None):
+        self.indices = array('I') if indices is None else indices
+        self.offsets = array('I', [0]) if offsets is None else offsets
+
+    @classmethod
+    def from_lists(cls, index_list):
+        """
+        Builds an index from per-phrase sequences of cluster indices.
+
+        Args:
+            index_list (Iterable[Sequence[int]]): Cluster indices of each phrase.
+
+        Returns:
+            PhraseIndex: The same phrases in CSR layout.
+        """
+        phrase_index = cls()
+        for phrase in index_list:
+            phrase_index.append(phrase)
+        return phrase_index
+
+    def append(self, phrase):
+        """Appends a phrase given as a sequence of cluster indices."""
+        self.indices.extend(phrase)
+        self.offsets.append(len(self.indices))
+
+    def end_phrase(self):
+        """Ends the current phrase after its indices were appended to `indices` directly."""
+        self.offsets.append(len(self.indices))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, phrase):
+        """Returns the cluster indices of a phrase as a zero-copy `memoryview`."""
+        if phrase < 0:
+            phrase += len(self)
+        if not 0 <= phrase < len(self):
+            raise IndexError("phrase index out of range")
+        return memoryview(self.indices)[self.offsets[phrase]:self.offsets[phrase + 1]]
+
+    def __iter__(self):
+        view = memoryview(self.indices)
+        offsets = self.offsets
+        for phrase in range(len(self)):
+            yield view[offsets[phrase]:offsets[phrase + 1]]
+
+    def start(self, phrase):
+        """Position of a phrase's first cluster index in `indices`."""
+        return self.offsets[phrase]
+
+    def length(self, phrase):
+        """Number of clusters in a phrase."""
+        return self.offsets[phrase + 1] - self.offsets[phrase]
+
+    def lengths(self):
+        """Returns the number of clusters in every phrase, as a uint32 numpy array."""
+        return np.diff(np.frombuffer(self.offsets, dtype=self.offsets.typecode))
+
+    @property
+    def num_clusters(self):
+        """Number of distinct cluster ids the phrases can refer to (largest index + 1)."""
+        if not len(self.indices):
+            return 0
+        return int(np.frombuffer(self.indices, dtype=self.indices.typecode).max()) + 1
+
+    def renumber(self, new_index):
+        """
+        Replaces every cluster index `i` by `new_index[i]`, in place.
+
+        Args:
+            new_index (numpy.ndarray): New number of each cluster, indexed by its old number.
+        """
+        flat = np.frombuffer(self.indices, dtype=self.indices.typecode)
+        flat[:] = np.asarray(new_index)[flat]
+
+    def tolist(self):
+        """Returns the phrases as a list of int lists."""
+        return [phrase.tolist() for phrase in self]
+
+    def encoded(self, escape_first):
+        """
+        Encodes every phrase as one- and escape-prefixed two-byte codes, all at once.
+
+        Produces the same bytes as `preprocess_strings.encode_glyph_indices` applied to
+        each phrase in turn: an index below `escape_first` is one byte, any other index
+        `i` is `escape_first + (i - escape_first) // 256` then `(i - escape_first) % 256`.
+
+        Args:
+            escape_first (int): Value from `preprocess_strings.escape_first_for`.
+
+        Returns:
+            tuple:
+                codes (numpy.ndarray): Encoded bytes of all phrases, concatenated (uint8).
+                code_offsets (numpy.ndarray): Start of each phrase in `codes`, plus the
+                    total at the end (int64); these are the `phrase_starts[]`.
+        """
+        flat = np.frombuffer(self.indices, dtype=self.indices.typecode).astype(np.int64)
+        escaped = flat >= escape_first
+        # Escape bytes and low bytes must both fit in the uint8 codes
+        assert not escaped.any() or escape_first + ((int(flat.max()) - escape_first) >> 8) <= 0xFF, \
+            "glyph indices too large for escape_first; use preprocess_strings.escape_first_for"
+        # Position of each index's first code byte
+        code_ends = np.cumsum(1 + escaped)
+        positions = code_ends - 1 - escaped
+        codes = np.empty(int(code_ends[-1]) if len(flat) else 0, dtype=np.uint8)
+        codes[positions[~escaped]] = flat[~escaped]
+        excess = flat[escaped] - escape_first
+        codes[positions[escaped]] = escape_first + (excess >> 8)
+        codes[positions[escaped] + 1] = excess & 0xFF
+
+        code_offsets = np.concatenate(([0], code_ends))[np.frombuffer(self.offsets, dtype=self.offsets.typecode)]
+        return codes, code_offsets
+
+    @property
+    def nbytes(self):
+        """Size of the two arrays in bytes."""
+        return self.indices.itemsize * len(self.indices) + self.offsets.itemsize * len(self.offsets)
+
+    def save(self, path):
+        """
+        Writes the index to a binary file: a 20-byte header (see `_HEADER`), then the
+        offsets and the indices as little-endian uint32.
+
+        Args:
+            path (str): Output file path.
+
+        Returns:
+            int: Size of the written file in bytes.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(PHRASE_INDEX_MAGIC, PHRASE_INDEX_VERSION, 0, len(self), len(self.indices)))
+            for table in (self.offsets, self.indices):
+                f.write(np.frombuffer(table, dtype=table.typecode).astype("<u4", copy=False).tobytes())
+            return f.tell()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by `save`.
+
+        Args:
+            path (str): File to read.
+
+        Returns:
+            PhraseIndex: The saved phrases, ready for appending more.
+
+        Raises:
+            ValueError: If the file is not a phrase index, has an unsupported version or is truncated.
+        """
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or header[:len(PHRASE_INDEX_MAGIC)] != PHRASE_INDEX_MAGIC:
+                raise ValueError(f"{path} is not a phrase index file")
+            _, version, _, phrase_count, index_count = _HEADER.unpack(header)
+            if version != PHRASE_INDEX_VERSION:
+                raise ValueError(f"{path} is phrase index version {version}; this reader supports version"
+                                 f" {PHRASE_INDEX_VERSION}")
+            tables = []
+            for count in (phrase_count + 1, index_count):
+                data = f.read(4 * count)
+                if len(data) < 4 * count:
+                    raise ValueError(f"{path} is truncated")
+                table = array('I')
+                table.frombytes(np.frombuffer(data, dtype="<u4").astype(table.typecode, copy=False).tobytes())
+                tables.append(table)
+        offsets, indices = tables
+        return cls(indices, offsets)
+
+    def __repr__(self):
+        return f"PhraseIndex({len(self)} phrases, {len(self.indices)} cluster indices)"
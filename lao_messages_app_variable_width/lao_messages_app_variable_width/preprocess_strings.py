@@ -1,53 +1,113 @@
 """
 Utilities for processing Unicode strings into grapheme clusters,
 generating index mappings, and exporting them for embedded C++ use.
+
+Large phrase catalogues (plain, or gzip/xz/bz2 compressed) can be streamed: rows are
+read lazily with `iter_input_strings_from_csv` and `build_char_and_index_lists` stores
+their cluster indices in a `PhraseIndex` instead of one Python list per phrase.
 """
 
+import bz2
 import csv
-import grapheme
+import gzip
+import lzma
+import math
 import os
 
+import numpy as np
+
+from lao_messages_app_variable_width.c_types import smallest_uint_type
+from lao_messages_app_variable_width.lao_segmenter import segment_clusters
+from lao_messages_app_variable_width.phrase_index import PhraseIndex
+
+# Most glyph indices all_phrases[] can encode: escape bytes 1-255 select 255 pages of 256
+# two-byte codes, leaving only index 0 as a one-byte code (see `escape_first_for`)
+MAX_PHRASE_CLUSTERS = 1 + 255 * 256
+
+# Leading bytes of each compressed format `open_input_text` reads, and how to open it
+COMPRESSED_FORMATS = (
+    (b"\x1f\x8b", gzip.open),      # gzip
+    (b"\xfd7zXZ\x00", lzma.open),  # xz
+    (b"BZh", bz2.open),            # bzip2
+)
+
 def decompose_string_to_clusters(s):
     """
     Splits a string into Unicode grapheme clusters (what a human sees as one character),
     using the ICU-standard grapheme segmentation.
 
+    Lao and ASCII text is segmented by the table-driven `lao_segmenter`; anything else
+    falls back to the `grapheme` package. Both give identical clusters.
+
     Args:
         s (str): Input string.
 
     Returns:
         list[str]: List of grapheme clusters.
     """
-    return list(grapheme.graphemes(s))
+    return segment_clusters(s)
 
-def get_input_strings_from_csv(file_path):
+def open_input_text(file_path):
     """
-    Reads a CSV file and extracts one sentence per line.
-    
-    Each line in the CSV is treated as a separate input string (sentence).
-    If a line contains multiple comma-separated values (e.g., multiple columns),
-    they are joined into a single string using spaces.
+    Opens a plain or compressed UTF-8 text file for reading.
+
+    Gzip, xz and bzip2 files are recognised by their first bytes (see
+    `COMPRESSED_FORMATS`), whatever their extension, and are decompressed lazily as
+    the file is read.
 
     Args:
-        file_path (str): Path to the .csv file.
+        file_path (str): Path to the file.
 
     Returns:
-        List[str]: A list of strings, one per line from the CSV.
+        io.TextIOBase: Text stream opened with newline='' (as the csv module expects).
     """
-    input_list = []
+    with open(file_path, 'rb') as f:
+        magic = f.read(6)
+    for prefix, opener in COMPRESSED_FORMATS:
+        if magic.startswith(prefix):
+            return opener(file_path, 'rt', encoding='utf-8', newline='')
+    return open(file_path, 'r', encoding='utf-8', newline='')
+
+def iter_input_strings_from_csv(file_path):
+    """
+    Lazily reads a plain or compressed CSV file, one sentence per line.
+
+    Each line in the CSV is treated as a separate input string (sentence).
+    If a line contains multiple comma-separated values (e.g., multiple columns),
+    they are joined into a single string using spaces. Only one row is held in
+    memory at a time, so catalogues of any size can be streamed.
 
-    # Open the file with UTF-8 encoding to support Unicode characters (e.g., Lao script)
-    with open(file_path, 'r', encoding='utf-8') as f:
+    Args:
+        file_path (str): Path to the .csv file, optionally gzip, xz or bzip2 compressed
+            (e.g. input_strings.csv.gz).
+
+    Yields:
+        str: One string per non-empty line of the CSV.
+    """
+    # UTF-8 supports Unicode characters (e.g., Lao script)
+    with open_input_text(file_path) as f:
         reader = csv.reader(f)  # Use the built-in CSV reader
 
         for row in reader:
             if row:
                 # Combine all values in the row into one string
                 # This is useful if a row has multiple columns
-                sentence = ' '.join(row).strip()
-                input_list.append(sentence)
+                yield ' '.join(row).strip()
 
-    return input_list
+def get_input_strings_from_csv(file_path):
+    """
+    Reads a CSV file and extracts one sentence per line.
+
+    See `iter_input_strings_from_csv`, which this collects into a list; compressed
+    files are read the same way.
+
+    Args:
+        file_path (str): Path to the .csv file.
+
+    Returns:
+        List[str]: A list of strings, one per line from the CSV.
+    """
+    return list(iter_input_strings_from_csv(file_path))
 
 def get_input_strings():
     """
@@ -82,7 +142,7 @@ def save_strings_to_csv(input_list, file_path):
             writer.writerow([string])  # Write each string as a single-column row
 
 
-def build_char_and_index_lists(input_list):
+def build_char_and_index_lists(input_list, by_frequency=False):
     """
     Builds a list of unique grapheme clusters and indexes input strings based on them.
 
@@ -91,29 +151,47 @@ def build_char_and_index_lists(input_list):
       - Adds any new cluster to a master list.
       - Maps each cluster in the string to its index in the master list.
 
+    Strings are consumed one at a time, so `input_list` can be a stream such as
+    `iter_input_strings_from_csv`, and the indices go straight into a `PhraseIndex`
+    (4 bytes per cluster occurrence and per phrase, with no per-phrase Python objects).
+
+    With `by_frequency`, clusters are then renumbered by how often they occur in the
+    input (ties keep their first-seen order), so the most common clusters get the
+    smallest indices, which `write_index_list_to_header` stores in one byte.
+
+    Args:
+        input_list (Iterable[str]): Input strings; read only once.
+        by_frequency (bool): Number clusters by descending frequency instead of first appearance.
+
     Returns:
         tuple:
             char_list (list[str]): List of grapheme clustered characters.
-            index_list (list[list[int]]): List of index lists, each mapping a string to cluster indices.
+            index_list (PhraseIndex): Cluster indices of each string.
     """
     all_clusters = []          # List of unique grapheme clusters
-    index_list = []            # List of index lists for each input string
+    index_list = PhraseIndex() # Cluster indices of every input string
     cluster_to_index = {}      # Mapping from cluster to its unique index
 
+    indices = index_list.indices
     for s in input_list:
-        clusters = decompose_string_to_clusters(s)
-
-        indices = []           # Indices for current string
-
-        for cluster in clusters:
-            if cluster not in cluster_to_index:
+        for cluster in decompose_string_to_clusters(s):
+            index = cluster_to_index.get(cluster)
+            if index is None:
                 # New cluster: assign a new index and add to master list
-                cluster_to_index[cluster] = len(all_clusters)
+                index = cluster_to_index[cluster] = len(all_clusters)
                 all_clusters.append(cluster)
-            # Append index of this cluster to string's index list
-            indices.append(cluster_to_index[cluster])
-
-        index_list.append(indices)
+            # Append index of this cluster to string's indices
+            indices.append(index)
+        index_list.end_phrase()
+
+    if by_frequency and all_clusters:
+        counts = np.bincount(np.frombuffer(indices, dtype=indices.typecode), minlength=len(all_clusters))
+        # A stable sort keeps equally frequent clusters in first-seen order
+        order = np.argsort(-counts, kind="stable")
+        new_index = np.empty(len(order), dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+        index_list.renumber(new_index)
+        all_clusters = [all_clusters[old] for old in order]
 
     # Convert each cluster string (e.g. 'é') into a list of its characters ['e', '́']
     # char_list = [[c for c in cluster] for cluster in all_clusters]
@@ -121,56 +199,132 @@ def build_char_and_index_lists(input_list):
 
     return char_list, index_list
 
-def write_index_list_to_header(index_list, filename="./arduino_code/phrases_to_display.h"):
+def escape_first_for(num_clusters):
+    """
+    First escape byte value needed to encode glyph indices below `num_clusters`.
+
+    Indices below the returned value are stored as one byte. Each byte value from there
+    up to 255 is an escape prefix for a page of 256 two-byte codes, and only as many
+    are reserved as the vocabulary needs.
+
+    Returns:
+        int: 256 when every index fits in one byte (no escapes), otherwise 256 - pages.
+
+    Raises:
+        ValueError: If `num_clusters` exceeds `MAX_PHRASE_CLUSTERS`.
+    """
+    if num_clusters <= 256:
+        return 256
+    if num_clusters > MAX_PHRASE_CLUSTERS:
+        raise ValueError(f"{num_clusters} clusters cannot be encoded in all_phrases[]: at most"
+                         f" {MAX_PHRASE_CLUSTERS} fit (one one-byte code and 255 escape pages)")
+    # (256 - pages) one-byte codes plus 256 two-byte codes per page must cover every cluster
+    return 256 - math.ceil((num_clusters - 256) / 255)
+
+def encode_glyph_indices(indices, escape_first):
+    """
+    Encodes a phrase's glyph indices as one- and escape-prefixed two-byte codes.
+
+    An index below `escape_first` is one byte. Any other index `i` is the escape byte
+    `escape_first + (i - escape_first) // 256` followed by `(i - escape_first) % 256`.
+
+    Args:
+        indices (list[int]): Glyph indices of a phrase.
+        escape_first (int): Value from `escape_first_for`.
+
+    Returns:
+        list[int]: The encoded bytes.
+    """
+    codes = []
+    for index in indices:
+        if index < escape_first:
+            codes.append(index)
+        else:
+            page, low = divmod(index - escape_first, 256)
+            codes.extend((escape_first + page, low))
+    return codes
+
+def decode_glyph_indices(codes, escape_first):
+    """Inverse of `encode_glyph_indices`; mirrors readGlyphIndex() in the Arduino sketch."""
+    indices = []
+    codes = iter(codes)
+    for code in codes:
+        if code < escape_first:
+            indices.append(code)
+        else:
+            indices.append(escape_first + (code - escape_first) * 256 + next(codes))
+    return indices
+
+def write_index_list_to_header(index_list, filename="./arduino_code/phrases_to_display.h", num_clusters=None):
     """
     Writes the index list to a C++ header file.
 
+    Glyph indices are stored in `all_phrases[]` as variable-length codes (see
+    `encode_glyph_indices`): one byte each while there are at most 256 clusters, and
+    beyond that one byte for the lowest indices and an escape-prefixed two bytes for
+    the rest. PHRASE_ESCAPE_FIRST tells the sketch where the escapes start; it is only
+    defined when escapes are used. Number clusters by frequency (see
+    `build_char_and_index_lists`) so most codes are one byte. `phrase_starts[]` are byte
+    offsets into `all_phrases[]` and `phrase_lengths[]` count glyphs; both, and
+    `num_phrases`, are declared with the smallest unsigned type holding their values.
+
     Args:
-        index_list (list[list[int]]): List of index lists for each input string.
+        index_list (PhraseIndex | list[list[int]]): Index list for each input string; a
+            `PhraseIndex` is encoded in one go, without per-phrase lists.
         filename (str): Output header file name (default: "phrases_to_display.h")
+        num_clusters (int | None): Number of clusters (len(char_list)). If None, taken
+            from the largest index in `index_list`.
     """
 
-    # Flatten the list of indices
-    all_indices = [idx for phrase in index_list for idx in phrase]
-
-    # Compute start indices and lengths
-    starts = []
-    lengths = []
-    current_start = 0
-    for phrase in index_list:
-        starts.append(current_start)
-        lengths.append(len(phrase))
-        current_start += len(phrase)
+    if not isinstance(index_list, PhraseIndex):
+        index_list = PhraseIndex.from_lists(index_list)
+    if num_clusters is None:
+        num_clusters = index_list.num_clusters
+    escape_first = escape_first_for(num_clusters)
 
+    # all_phrases bytes, with each phrase's start (and the total) in code_offsets
+    codes, code_offsets = index_list.encoded(escape_first)
+    starts = code_offsets[:-1]
+    lengths = index_list.lengths()
     num_phrases = len(index_list)
 
     with open(filename, "w") as f:
         f.write("#ifndef PHRASES_TO_DISPLAY_H\n")
         f.write("#define PHRASES_TO_DISPLAY_H\n\n")
 
+        if escape_first < 256:
+            # Codes from here up are escape prefixes of two-byte glyph indices
+            f.write(f"#define PHRASE_ESCAPE_FIRST {escape_first}\n\n")
+
         # Write all_phrases
         f.write("const uint8_t all_phrases[] PROGMEM = {\n")
-        for phrase in index_list:
+        code_list = codes.tolist()
+        for phrase_number, (start, end) in enumerate(zip(code_offsets.tolist(), code_offsets[1:].tolist()), start=1):
             f.write("    ")
-            f.write(", ".join(str(i) for i in phrase))
-            f.write(",    // phrase {}\n".format(index_list.index(phrase) + 1))
+            f.write(", ".join(str(i) for i in code_list[start:end]))
+            f.write(",    // phrase {}\n".format(phrase_number))
         f.write("};\n\n")
 
-        # Write phrase_starts
-        f.write("const uint8_t phrase_starts[] PROGMEM = {")
-        f.write(", ".join(str(s) for s in starts))
+        # Write phrase_starts (each table gets the smallest type holding its values)
+        f.write(f"const {smallest_uint_type(int(starts.max(initial=0)))[0]} phrase_starts[] PROGMEM = {{")
+        f.write(", ".join(str(s) for s in starts.tolist()))
         f.write("};     // starting index of each phrase\n")
 
         # Write phrase_lengths
-        f.write("const uint8_t phrase_lengths[] PROGMEM = {")
-        f.write(", ".join(str(l) for l in lengths))
+        f.write(f"const {smallest_uint_type(int(lengths.max(initial=0)))[0]} phrase_lengths[] PROGMEM = {{")
+        f.write(", ".join(str(l) for l in lengths.tolist()))
         f.write("};    // length of each phrase\n")
 
         # Write num_phrases
-        f.write(f"const uint8_t num_phrases = {num_phrases};\n\n")
+        f.write(f"const {smallest_uint_type(num_phrases)[0]} num_phrases = {num_phrases};\n\n")
 
         f.write("#endif\n")
 
+    if escape_first < 256:
+        glyph_count = len(index_list.indices)
+        escaped = len(codes) - glyph_count
+        print(f"{num_clusters} clusters: {escaped} of {glyph_count} glyph indices in all_phrases[] use two-byte codes"
+              f" ({len(codes)} bytes instead of {2 * glyph_count} as uint16_t)")
     header_size_kb = os.path.getsize(filename) / 1024
     print(f"Index header file size: {header_size_kb:.2f} KB")
 
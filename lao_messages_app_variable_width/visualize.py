@@ -7,149 +7,49 @@ Renders characters as ASCII art using block characters to preview how they'll ap
 import argparse
 import sys
 import os
-from PIL import Image
-import freetype
-import uharfbuzz as hb
-import tempfile
 import math
-import grapheme
+import numpy as np
+from PIL import Image
 
-def generate_char_bitmap(char, glyph_height=30, font_path="./font_files/NotoSansLao-Regular.ttf"):
+from lao_messages_app_variable_width.generate_bitmaps import (
+    RENDER_MODES, font_context_for, render_cluster_bitmap, render_cluster_mono, render_clusters)
+from lao_messages_app_variable_width.glyph_atlas_file import read_atlas_file
+from lao_messages_app_variable_width.glyph_cache import GlyphCache
+from lao_messages_app_variable_width.lao_segmenter import segment_clusters
+
+def generate_char_bitmap(char, glyph_height=30, font_path="./font_files/NotoSansLao-Regular.ttf", render_mode="resize"):
     """
     Generate a bitmap for a single character using the same logic as the main application.
     Returns a PIL Image in 1-bit mode.
+
+    The font is opened once per process through the shared FontContext, so previewing
+    a long string does not reload the font for every grapheme cluster.
     """
     try:
-        with open(font_path, "rb") as f:
-            font_data = f.read()
+        font_context = font_context_for(font_path, glyph_height, render_mode)
     except FileNotFoundError:
         print(f"Error: Font file not found at {font_path}", file=sys.stderr)
         sys.exit(1)
 
-    # Initialize HarfBuzz
-    hb_blob = hb.Blob(font_data)
-    hb_face = hb.Face(hb_blob)
-    hb_font = hb.Font(hb_face)
-
-    # Initialize FreeType with temporary font file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".ttf") as tmp_font_file:
-        tmp_font_file.write(font_data)
-        tmp_font_path = tmp_font_file.name
-
-    face = freetype.Face(tmp_font_path)
-    face.set_char_size(72 * 64)
-
-    try:
-        # Shape text using HarfBuzz
-        buf = hb.Buffer()
-        buf.add_str(char)
-        buf.guess_segment_properties()
-        hb.shape(hb_font, buf)
-
-        infos = buf.glyph_infos
-        positions = buf.glyph_positions
-
-        # Find base consonant (first glyph typically)
-        base_idx = 0
-        base_glyph = infos[base_idx].codepoint
-    
-        # Load base glyph metrics
-        try:
-            face.load_glyph(base_glyph, freetype.FT_LOAD_DEFAULT)
-            base_width = face.glyph.metrics.horiAdvance // 64
-            image_width = base_width
-            image_height = 100
-            wh_ratio = image_width / image_height
-            image = Image.new("L", (image_width, image_height), 255)
-            x = 0
-            y = 80  # Empirical baseline position
-        except (ValueError, Exception) as e:
-            # Fallback for problematic glyphs
-            base_width = glyph_height
-            wh_ratio = 1.0
-            image = Image.new("L", (glyph_height * 2, glyph_height * 2), 255)
-            x = 0
-            y = glyph_height
-
-        for info, pos in zip(infos, positions):
-            glyph_index = info.codepoint
-            
-            # Skip .notdef glyphs (glyph_index 0)
-            if glyph_index == 0:
-                x += pos.x_advance // 64
-                continue
-
-            try:
-                face.load_glyph(glyph_index, freetype.FT_LOAD_RENDER | freetype.FT_LOAD_TARGET_NORMAL)
-            except (ValueError, Exception) as e:
-                x += pos.x_advance // 64
-                continue
-
-            bitmap = face.glyph.bitmap
-            w, h = bitmap.width, bitmap.rows
-
-            if w > 0 and h > 0:
-                glyph_img = Image.frombytes('L', (w, h), bytes(bitmap.buffer))
-                
-                x_pos = x + (pos.x_offset // 64) + face.glyph.bitmap_left
-                y_pos = y - (pos.y_offset // 64) - face.glyph.bitmap_top
-                
-                # Check bounds before pasting
-                if (x_pos < image.width and y_pos < image.height and
-                    x_pos + glyph_img.width > 0 and y_pos + glyph_img.height > 0):
-                    # Calculate the actual paste region that fits within the image
-                    paste_x = max(0, x_pos)
-                    paste_y = max(0, y_pos)
-                    src_x1 = max(0, -x_pos)
-                    src_y1 = max(0, -y_pos)
-                    src_x2 = min(glyph_img.width, image.width - x_pos)
-                    src_y2 = min(glyph_img.height, image.height - y_pos)
-                    
-                    if src_x2 > src_x1 and src_y2 > src_y1:
-                        cropped_glyph_img = glyph_img.crop((src_x1, src_y1, src_x2, src_y2))
-                        image.paste(0, (paste_x, paste_y), cropped_glyph_img)
-            
-            x += pos.x_advance // 64
-            y -= pos.y_advance // 64 
-
-        # Resize to target height
-        resized_width = int(glyph_height * wh_ratio)
-        img_resized = image.resize((resized_width, glyph_height), Image.Resampling.NEAREST)
+    if render_mode == "mono":
+        # Ink array -> 1-bit image (0 = black, 255 = white), like the resize path returns
+        ink = render_cluster_mono(char, glyph_height, font_context)
+        return Image.fromarray(np.where(ink, 0, 255).astype(np.uint8)).convert('1')
 
-        # Convert to 1-bit black & white
-        img_bw = img_resized.point(lambda p: 0 if p < 128 else 255, mode='1')
+    return render_cluster_bitmap(char, glyph_height, font_context)
 
-        # Manual horizontal cropping to remove whitespace
-        first_pixel_col = -1
-        for x_col in range(img_bw.width):
-            for y_row in range(img_bw.height):
-                if img_bw.getpixel((x_col, y_row)) == 0:  # Found a black pixel
-                    first_pixel_col = x_col
-                    break
-            if first_pixel_col != -1:
-                break
 
-        last_pixel_col = -1
-        for x_col in range(img_bw.width - 1, -1, -1):
-            for y_row in range(img_bw.height):
-                if img_bw.getpixel((x_col, y_row)) == 0:  # Found a black pixel
-                    last_pixel_col = x_col
-                    break
-            if last_pixel_col != -1:
-                break
-        
-        if first_pixel_col != -1 and last_pixel_col != -1:
-            # Crop horizontally using the discovered bounds
-            cropped_img_bw = img_bw.crop((first_pixel_col, 0, last_pixel_col + 1, img_bw.height))
-        else:
-            # Handle case of entirely white image (e.g., space character)
-            cropped_img_bw = Image.new('1', (glyph_height // 4, glyph_height), 255)
-
-        return cropped_img_bw
-
-    finally:
-        # Clean up temp font file
-        os.remove(tmp_font_path)
+def record_to_image(record, glyph_height):
+    """
+    Convert a packed glyph record (data, byte-aligned width, unpadded width) back to the
+    cropped 1-bit PIL Image that `generate_char_bitmap` returns.
+    """
+    data, final_width, unpadded_width = record
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(glyph_height, final_width // 8)
+    # The unpadded width is the cropped ink width plus the inter-glyph spacing
+    cropped_width = unpadded_width - math.ceil(glyph_height * 1/30)
+    ink = np.unpackbits(rows, axis=1)[:, :cropped_width]
+    return Image.fromarray(np.where(ink, 0, 255).astype(np.uint8)).convert('1')
 
 
 def bitmap_to_ascii(bitmap_image):
@@ -175,17 +75,26 @@ def bitmap_to_ascii(bitmap_image):
     return lines
 
 
-def visualize_text(text, font_height=30, font_path="./font_files/NotoSansLao-Regular.ttf", spacing=0):
+def visualize_text(text, font_height=30, font_path="./font_files/NotoSansLao-Regular.ttf", spacing=0, render_mode="resize",
+                   cache=None, atlas=None):
     """
     Visualize a string of text as ASCII art in the terminal.
+
+    If a GlyphCache is given, clusters already rendered by the generator (or an earlier
+    preview) are read from it instead of being rendered again. If a GlyphAtlas is given
+    (e.g. from `read_atlas_file`), the glyphs are taken from it as generated, at its
+    height, and nothing is rendered.
     """
     # Break text into grapheme clusters (individual characters)
-    chars = list(grapheme.graphemes(text))
+    chars = segment_clusters(text)
     
     if not chars:
         print("No characters to display")
         return
     
+    if atlas is not None:
+        font_height = atlas.glyph_height
+
     print(f"Visualizing '{text}' at {font_height}px height:")
     print("=" * 50)
     
@@ -193,8 +102,19 @@ def visualize_text(text, font_height=30, font_path="./font_files/NotoSansLao-Reg
     char_bitmaps = []
     char_ascii_lines = []
     
-    for char in chars:
-        bitmap = generate_char_bitmap(char, font_height, font_path)
+    if atlas is not None:
+        missing = [char for char in chars if char not in atlas]
+        if missing:
+            raise KeyError(f"Not in the atlas: {' '.join(missing)}")
+        atlas = atlas.cells()
+        bitmaps = [record_to_image(atlas.lookup(char), font_height) for char in chars]
+    elif cache is not None:
+        records = render_clusters(chars, font_height, font_path, render_mode=render_mode, cache=cache, show_progress=False)
+        bitmaps = [record_to_image(record, font_height) for record in records]
+    else:
+        bitmaps = [generate_char_bitmap(char, font_height, font_path, render_mode) for char in chars]
+
+    for bitmap in bitmaps:
         ascii_lines = bitmap_to_ascii(bitmap)
         char_bitmaps.append(bitmap)
         char_ascii_lines.append(ascii_lines)
@@ -239,6 +159,7 @@ Examples:
   python visualize.py --font-height 10 --text "ພົດຈະນານຸກົມ"
   python visualize.py --font-height 30 --text "ສະບາຍດີ" --spacing 2
   python visualize.py -s 20 -t "ລາວ" -p 1
+  python visualize.py --atlas ./arduino_code/glyph_bitmaps.atlas -t "ສະບາຍດີ"
         """
     )
     
@@ -270,6 +191,26 @@ Examples:
         help="Number of spaces between characters in combined view (default: 0)"
     )
     
+    parser.add_argument(
+        "--render-mode", "-m",
+        choices=RENDER_MODES,
+        default="resize",
+        help="resize: render large and scale down (default); mono: render 1-bit glyphs directly at the font height"
+    )
+    
+    parser.add_argument(
+        "--atlas", "-a",
+        type=str,
+        default=None,
+        help="Show the glyphs of a generated atlas file (e.g. ./arduino_code/glyph_bitmaps.atlas) instead of rendering"
+    )
+    
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always render glyphs instead of using the on-disk glyph cache"
+    )
+    
     args = parser.parse_args()
     
     # Validate font height
@@ -284,7 +225,9 @@ Examples:
         sys.exit(1)
     
     try:
-        visualize_text(args.text, args.font_height, args.font_path, args.spacing)
+        atlas = read_atlas_file(args.atlas) if args.atlas else None
+        cache = None if args.no_cache or atlas is not None else GlyphCache()
+        visualize_text(args.text, args.font_height, args.font_path, args.spacing, args.render_mode, cache, atlas)
     except KeyboardInterrupt:
         print("\nVisualization interrupted by user")
         sys.exit(0)